@@ -16,6 +16,7 @@ import ast
 import json
 import re
 from dataclasses import dataclass, field
+from functools import lru_cache
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
@@ -482,6 +483,16 @@ Keep test names concise and descriptive. Generate 2-4 tests per function."""
 
     def _build_requirements_prompt(self, title: str, criteria: List[dict]) -> str:
         """Build prompt for generating tests from requirements."""
+        key = tuple(
+            (c["requirement_id"], c["requirement_title"], c["criterion"])
+            for c in criteria
+        )
+        return self._render_requirements_prompt(title, key)
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _render_requirements_prompt(title: str, criteria: tuple) -> str:
+        """Render the requirements prompt (memoized on hashable criteria)."""
         lines = [
             f"Generate pytest test skeletons for feature: '{title}'",
             "",
@@ -489,9 +500,9 @@ Keep test names concise and descriptive. Generate 2-4 tests per function."""
             ""
         ]
 
-        for i, c in enumerate(criteria, 1):
-            lines.append(f"{i}. [{c['requirement_id']}] {c['requirement_title']}")
-            lines.append(f"   Criterion: {c['criterion']}")
+        for i, (req_id, req_title, criterion) in enumerate(criteria, 1):
+            lines.append(f"{i}. [{req_id}] {req_title}")
+            lines.append(f"   Criterion: {criterion}")
             lines.append("")
 
         lines.extend([
@@ -504,15 +515,26 @@ Keep test names concise and descriptive. Generate 2-4 tests per function."""
 
     def _build_signatures_prompt(self, functions: List[dict]) -> str:
         """Build prompt for generating tests from function signatures."""
+        key = tuple(
+            (
+                func.get("name", "unknown"),
+                tuple(func.get("args", [])),
+                func.get("returns", "unknown")
+            )
+            for func in functions
+        )
+        return self._render_signatures_prompt(key)
+
+    @staticmethod
+    @lru_cache(maxsize=128)
+    def _render_signatures_prompt(functions: tuple) -> str:
+        """Render the signatures prompt (memoized on hashable signatures)."""
         lines = [
             "Generate pytest test skeletons for the following functions:",
             ""
         ]
 
-        for func in functions:
-            name = func.get("name", "unknown")
-            args = func.get("args", [])
-            returns = func.get("returns", "unknown")
+        for name, args, returns in functions:
             lines.append(f"- {name}({', '.join(args)}) -> {returns}")
 
         lines.extend([
@@ -10,27 +10,111 @@ Provides the critical human-in-the-loop component for compliance:
 All agents must: PROPOSE → human APPROVES → then EXECUTE
 """
 
+import asyncio
 import difflib
+import hashlib
+import itertools
 import json
+import mmap
+import os
+import queue
+import re
+import subprocess
 import sys
-from dataclasses import dataclass, field
+import tempfile
+import threading
+import time
+import weakref
+from array import array
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass, field, asdict
 from datetime import datetime, timezone
-from enum import Enum
+from enum import IntEnum
 from pathlib import Path
-from typing import Any, Callable, Optional, List, Dict
-
-from .audit import AuditLogger, AuditAction
-
-
-class ApprovalStatus(Enum):
+from typing import Any, Callable, Optional, List, Dict, Iterator, Tuple, Union
+
+from .audit import AuditLogger, AuditAction, AsyncAuditWriter, LOG_FILE_MODE
+
+try:
+    import orjson
+except ImportError:  # Optional: faster proposal serialization
+    orjson = None
+
+
+# Diff lines shown per proposal before truncating
+MAX_DIFF_LINES = 500
+
+# Proposal "content" longer than this is summarized when displayed
+MAX_INLINE_CONTENT = 4096
+
+# On-disk originals larger than this are diffed through mmap as bytes
+MMAP_THRESHOLD = 64 * 1024
+
+# ANSI colors keyed on a diff line's first character
+_DIFF_COLORS = {
+    "+": "\033[92m",  # Green
+    "-": "\033[91m",  # Red
+    "@": "\033[96m",  # Cyan
+}
+_RESET = "\033[0m"
+
+# Shell command fragments that make an action irreversible
+_IRREVERSIBLE_RE = re.compile(r"rm |delete|drop|truncate|format", re.IGNORECASE)
+
+# File content, or a thunk that produces it when first displayed
+ContentSource = Union[str, Callable[[], str], None]
+
+# CLI prompt text, built once and filled with str.format_map per request
+_RULE = "=" * 70
+_DIVIDER = "-" * 70
+_BANNER = f"\n{_RULE}\nAPPROVAL REQUIRED\n{_RULE}\n"
+_TEMPLATE = (
+    "Request ID: {request_id}\n"
+    "Agent: {agent_id}\n"
+    "Action: {action_type}\n"
+    "Risk Level: {risk_level}\n"
+    "Reversible: {reversible}\n"
+    f"{_DIVIDER}\n"
+    "Description: {description}\n"
+    "{context}"
+)
+_OPTIONS = (
+    f"\n{_DIVIDER}\n"
+    "Options:\n"
+    "  [a] Approve - Execute as proposed\n"
+    "  [r] Reject  - Do not execute\n"
+    "  [m] Modify  - Edit the proposal before executing\n"
+    "  [v] View    - Show more details\n"
+    f"{_DIVIDER}\n"
+)
+_BATCH_BANNER = (
+    f"\n{_RULE}\nBATCH APPROVAL REQUIRED ({{count}} requests)\n{_RULE}\n"
+    f"Batch ID: {{batch_id}}\n{_DIVIDER}\n"
+)
+_BATCH_ITEM = "  [{index}] {agent_id} {action_type} ({risk_level}){irreversible}: {description}\n"
+_BATCH_OPTIONS = (
+    f"{_DIVIDER}\n"
+    "Enter indices to approve (e.g. 1,3-5), 'all', 'none',\n"
+    "or 'd' to show the proposed changes first.\n"
+    f"{_DIVIDER}\n"
+)
+
+
+class ApprovalStatus(IntEnum):
     """Status of an approval request."""
-    PENDING = "pending"
-    APPROVED = "approved"
-    REJECTED = "rejected"
-    MODIFIED = "modified"
+    PENDING = 0
+    APPROVED = 1
+    REJECTED = 2
+    MODIFIED = 3
 
+    @property
+    def label(self) -> str:
+        """Lowercase name used in audit logs and snapshots."""
+        return self.name.lower()
 
-@dataclass
+
+@dataclass(slots=True)
 class ApprovalRequest:
     """
     A request for human approval.
@@ -46,17 +130,60 @@ class ApprovalRequest:
     risk_level: str = "medium"  # low, medium, high
     reversible: bool = True  # Can this action be undone?
 
-    # For file edits - show diff
-    original_content: Optional[str] = None
-    proposed_content: Optional[str] = None
+    # For file edits - show diff (may be deferred until displayed)
+    original_content: ContentSource = None
+    proposed_content: ContentSource = None
+    content_path: Optional[str] = None  # Read the original from here if not given
 
     # Metadata
     timestamp: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
     status: ApprovalStatus = ApprovalStatus.PENDING
     reviewer_notes: Optional[str] = None
+    skip_queue: bool = False  # Bypass batching/concurrency limits (low-risk only)
+    decision_key: Optional[str] = None  # Decision-cache key (if cacheable)
+    _proposal_json: Optional[str] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @property
+    def proposal_json(self) -> str:
+        """
+        Proposal serialized for display (computed once per request).
 
-
-@dataclass
+        Large file content is replaced by a length + SHA-256 summary,
+        since the diff view already shows the change.
+        """
+        if self._proposal_json is None:
+            self._proposal_json = self._serialize_proposal()
+        return self._proposal_json
+
+    def _serialize_proposal(self) -> str:
+        """Serialize the proposal, eliding large file content."""
+        proposal = self.proposal
+        content = proposal.get("content") if isinstance(proposal, dict) else None
+        if isinstance(content, str) and len(content) > MAX_INLINE_CONTENT:
+            digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+            proposal = dict(proposal)
+            proposal["content"] = f"[file content: {len(content)} chars, SHA-256 {digest}...]"
+        return _pjson(proposal)
+
+    def get_original_content(self) -> Optional[str]:
+        """Original content, materialized on first use if deferred."""
+        if callable(self.original_content):
+            self.original_content = self.original_content()
+        if self.original_content is None and self.content_path:
+            # Re-read on demand rather than keeping a copy of the file
+            return _read_text(self.content_path)
+        return self.original_content
+
+    def get_proposed_content(self) -> Optional[str]:
+        """Proposed content, materialized on first use if deferred."""
+        if callable(self.proposed_content):
+            self.proposed_content = self.proposed_content()
+        return self.proposed_content
+
+
+@dataclass(slots=True)
 class ApprovalResponse:
     """
     Human's response to an approval request.
@@ -68,6 +195,19 @@ class ApprovalResponse:
     timestamp: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
 
 
+@dataclass
+class ApprovalBatch:
+    """
+    A group of related approval requests reviewed together.
+
+    The reviewer sees all requests on one screen and the decision is
+    recorded as one audit entry per outcome instead of one per request.
+    """
+    batch_id: str
+    requests: List[ApprovalRequest]
+    timestamp: str = field(default_factory=lambda: datetime.now(timezone.utc).isoformat())
+
+
 class ApprovalGate:
     """
     Human approval gate for agent actions.
@@ -96,13 +236,31 @@ class ApprovalGate:
         elif response.status == ApprovalStatus.MODIFIED:
             # Execute with modifications
             modified_content = response.modified_proposal
+
+    Non-blocking usage (decision arrives later, e.g. from a webhook):
+        request_id = gate.submit_approval(request)
+        ...
+        gate.resolve_approval(request_id, response)  # any thread
+        ...
+        response = await gate.wait_approval(request_id)
     """
 
     def __init__(
         self,
         audit_logger: AuditLogger,
         auto_approve: bool = False,
-        approval_callback: Optional[Callable[[ApprovalRequest], ApprovalResponse]] = None
+        approval_callback: Optional[Callable[[ApprovalRequest], ApprovalResponse]] = None,
+        pending_dir: Optional[str] = None,
+        batch_approval_callback: Optional[
+            Callable[[ApprovalBatch], List[ApprovalResponse]]
+        ] = None,
+        batch_window_ms: int = 0,
+        max_batch_size: int = 128,
+        max_concurrent: int = 4,
+        decision_cache_ttl: float = 0.0,
+        decision_cache_size: int = 256,
+        cacheable_actions: Optional[List[str]] = None,
+        audit_async: bool = False
     ):
         """
         Initialize approval gate.
@@ -112,38 +270,110 @@ class ApprovalGate:
             auto_approve: If True, auto-approve all requests (ONLY for testing!)
             approval_callback: Custom callback for getting approval
                               (defaults to CLI prompts)
+            pending_dir: Directory for pending request snapshots
+                         (defaults to "pending" next to the audit log)
+            batch_approval_callback: Custom callback for approving a batch,
+                                     returning one response per request
+                                     (defaults to approval_callback once per
+                                     request, or CLI prompts if neither is set)
+            batch_window_ms: If > 0, coalesce requests arriving within this
+                             window into one batch review (0 disables)
+            max_batch_size: Flush a coalesced batch early at this size
+            max_concurrent: Max approval callbacks in flight on the async
+                            path (CLI prompts are always serialized)
+            decision_cache_ttl: Seconds an approval of an identical proposal
+                                auto-approves repeats (0 disables)
+            decision_cache_size: Max cached decisions (LRU eviction)
+            cacheable_actions: Action types eligible for the decision cache
+                               (defaults to edit_file and run_shell)
+            audit_async: If True, write APPROVAL_REQUESTED entries from a
+                         background thread; decisions are always written
+                         synchronously, after any queued entries
         """
         self.audit = audit_logger
         self.auto_approve = auto_approve
         self.approval_callback = approval_callback or self._cli_approval
+        self._cli_mode = approval_callback is None
+        # A programmatic approval_callback must never fall back to input()
+        if batch_approval_callback is None and not self._cli_mode:
+            batch_approval_callback = self._approve_each
+        self.batch_approval_callback = batch_approval_callback or self._cli_batch_approval
+        self._cli_batch_mode = batch_approval_callback is None
+        self.pending_dir = (
+            Path(pending_dir) if pending_dir
+            else self.audit.log_path.parent / "pending"
+        )
         self._pending_requests: Dict[str, ApprovalRequest] = {}
-        self._request_counter = 0
-
-    def _generate_request_id(self) -> str:
+        self._pending_futures: Dict[str, asyncio.Future] = {}
+        self._resolved: Dict[str, ApprovalResponse] = {}
+        self._lock = threading.Lock()
+        self._request_counter = itertools.count(1)
+        self._id_prefix = (-1, "")  # (epoch second, formatted timestamp)
+
+        # Time-window batching of incoming requests
+        self.batch_window_ms = batch_window_ms
+        self.max_batch_size = max_batch_size
+        self._incoming: queue.Queue = queue.Queue()
+        self._batch_futures: Dict[str, Future] = {}
+        self._batch_timer: Optional[threading.Timer] = None
+
+        # Bounded concurrency: N programmatic callbacks, one CLI prompt.
+        # Semaphores bind to one event loop, so each loop gets its own pair.
+        self.max_concurrent = max_concurrent
+        self._loop_sems: weakref.WeakKeyDictionary = weakref.WeakKeyDictionary()
+        self._cli_lock = threading.Lock()
+
+        # Memoized approvals: decision_key -> (prior request_id, approved_at)
+        self.decision_cache_ttl = decision_cache_ttl
+        self.decision_cache_size = decision_cache_size
+        self.cacheable_actions = set(cacheable_actions or ["edit_file", "run_shell"])
+        self._decision_cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+
+        # Editor scratch space for CLI modifications (created on first use)
+        self._scratch_dir = None
+
+        # Off-thread audit writes for request events
+        self._audit_writer = AsyncAuditWriter(audit_logger) if audit_async else None
+
+    def _generate_request_id(self, prefix: str = "req") -> str:
         """Generate unique request ID."""
-        self._request_counter += 1
-        timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        return f"req_{timestamp}_{self._request_counter:04d}"
+        counter = next(self._request_counter)
+
+        # Reformat the UTC timestamp at most once per second
+        now = int(time.time())
+        second, timestamp = self._id_prefix
+        if now != second:
+            timestamp = time.strftime("%Y%m%d_%H%M%S", time.gmtime(now))
+            self._id_prefix = (now, timestamp)
+
+        return f"{prefix}_{timestamp}_{counter:04d}"
 
     def request_file_edit(
         self,
         agent_id: str,
         file_path: str,
-        original: str,
+        original: ContentSource,
         proposed: str,
         description: str,
-        context: Optional[str] = None
+        context: Optional[str] = None,
+        skip_queue: bool = False
     ) -> ApprovalRequest:
         """
         Request approval for a file edit.
 
+        The original content is only needed to show a diff, so it may be
+        passed as a callable, or as None to read file_path on display
+        (memory-mapped when large); auto-approved requests never load it.
+
         Args:
             agent_id: Agent requesting the edit
             file_path: Path to file being edited
-            original: Original file content
+            original: Original file content, a callable returning it,
+                      or None to read it from file_path when displayed
             proposed: Proposed new content
             description: Human-readable description
             context: Additional context
+            skip_queue: Bypass request batching and concurrency limits
 
         Returns:
             ApprovalRequest object
@@ -156,25 +386,20 @@ class ApprovalGate:
             proposal={"file_path": file_path, "content": proposed},
             context=context,
             original_content=original,
+            content_path=file_path if original is None else None,
             proposed_content=proposed,
             risk_level="medium",
-            reversible=True
+            reversible=True,
+            skip_queue=skip_queue
         )
 
-        self._pending_requests[request.request_id] = request
-
-        # Log approval request
-        self.audit.log(
-            action=AuditAction.APPROVAL_REQUESTED,
-            agent_id=agent_id,
-            input_data={
-                "request_id": request.request_id,
-                "action_type": "edit_file",
-                "file_path": file_path,
-                "description": description
-            },
-            reasoning=context
-        )
+        # Log (or queue) approval request
+        self._register_request(request, {
+            "request_id": request.request_id,
+            "action_type": "edit_file",
+            "file_path": file_path,
+            "description": description
+        })
 
         return request
 
@@ -184,7 +409,8 @@ class ApprovalGate:
         command: str,
         description: str,
         context: Optional[str] = None,
-        risk_level: str = "medium"
+        risk_level: str = "medium",
+        skip_queue: bool = False
     ) -> ApprovalRequest:
         """
         Request approval for a shell command.
@@ -195,13 +421,13 @@ class ApprovalGate:
             description: Human-readable description
             context: Additional context
             risk_level: low, medium, or high
+            skip_queue: Bypass request batching and concurrency limits
 
         Returns:
             ApprovalRequest object
         """
         # Determine reversibility
-        irreversible_patterns = ["rm ", "delete", "drop", "truncate", "format"]
-        reversible = not any(p in command.lower() for p in irreversible_patterns)
+        reversible = _IRREVERSIBLE_RE.search(command) is None
 
         request = ApprovalRequest(
             request_id=self._generate_request_id(),
@@ -211,24 +437,18 @@ class ApprovalGate:
             proposal={"command": command},
             context=context,
             risk_level=risk_level,
-            reversible=reversible
+            reversible=reversible,
+            skip_queue=skip_queue
         )
 
-        self._pending_requests[request.request_id] = request
-
-        # Log approval request
-        self.audit.log(
-            action=AuditAction.APPROVAL_REQUESTED,
-            agent_id=agent_id,
-            input_data={
-                "request_id": request.request_id,
-                "action_type": "run_shell",
-                "command": command,
-                "description": description,
-                "risk_level": risk_level
-            },
-            reasoning=context
-        )
+        # Log (or queue) approval request
+        self._register_request(request, {
+            "request_id": request.request_id,
+            "action_type": "run_shell",
+            "command": command,
+            "description": description,
+            "risk_level": risk_level
+        })
 
         return request
 
@@ -240,7 +460,8 @@ class ApprovalGate:
         description: str,
         context: Optional[str] = None,
         risk_level: str = "medium",
-        reversible: bool = True
+        reversible: bool = True,
+        skip_queue: bool = False
     ) -> ApprovalRequest:
         """
         Request approval for any action.
@@ -253,6 +474,7 @@ class ApprovalGate:
             context: Additional context
             risk_level: low, medium, or high
             reversible: Whether action can be undone
+            skip_queue: Bypass request batching and concurrency limits
 
         Returns:
             ApprovalRequest object
@@ -265,36 +487,124 @@ class ApprovalGate:
             proposal=proposal,
             context=context,
             risk_level=risk_level,
-            reversible=reversible
+            reversible=reversible,
+            skip_queue=skip_queue
         )
 
-        self._pending_requests[request.request_id] = request
+        # Log (or queue) approval request
+        self._register_request(request, {
+            "request_id": request.request_id,
+            "action_type": action_type,
+            "description": description,
+            "risk_level": risk_level
+        })
+
+        return request
+
+    def _register_request(self, request: ApprovalRequest, input_data: dict) -> None:
+        """Track a new request and log (or queue) its APPROVAL_REQUESTED event."""
+        with self._lock:
+            self._pending_requests[request.request_id] = request
+
+        if self._is_cacheable(request):
+            request.decision_key = _decision_key(request)
+
+        if self.batch_window_ms > 0 and not request.skip_queue:
+            self._enqueue(request, input_data)
+            return
 
         # Log approval request
-        self.audit.log(
+        self._log_requested(
             action=AuditAction.APPROVAL_REQUESTED,
-            agent_id=agent_id,
-            input_data={
-                "request_id": request.request_id,
-                "action_type": action_type,
-                "description": description,
-                "risk_level": risk_level
-            },
-            reasoning=context
+            agent_id=request.agent_id,
+            input_data=input_data,
+            reasoning=request.context
         )
 
-        return request
+    def _enqueue(self, request: ApprovalRequest, input_data: dict) -> None:
+        """Queue a request for the next coalesced batch."""
+        with self._lock:
+            future = Future()
+            self._batch_futures[request.request_id] = future
+            self._incoming.put((request, input_data, future))
+
+            # A full queue is flushed at once, but still on the timer
+            # thread, so request_* never waits on the batch review
+            full = self._incoming.qsize() >= self.max_batch_size
+            if full or self._batch_timer is None:
+                if self._batch_timer is not None:
+                    self._batch_timer.cancel()
+                self._batch_timer = threading.Timer(
+                    0 if full else self.batch_window_ms / 1000,
+                    self.flush_incoming
+                )
+                self._batch_timer.daemon = True
+                self._batch_timer.start()
+
+    def flush_incoming(self) -> None:
+        """
+        Review all queued requests as one batch.
+
+        Called on a timer thread when the batch window elapses or the
+        queue reaches max_batch_size; may also be called directly.
+        """
+        with self._lock:
+            if self._batch_timer is not None:
+                self._batch_timer.cancel()
+                self._batch_timer = None
+            items = []
+            while True:
+                try:
+                    items.append(self._incoming.get_nowait())
+                except queue.Empty:
+                    break
+
+        if not items:
+            return
+
+        requests = [request for request, _, _ in items]
+        futures = [future for _, _, future in items]
+        batch = self.request_batch(requests)
+
+        try:
+            # One audit entry for the whole batch
+            self._log_requested(
+                action=AuditAction.APPROVAL_REQUESTED,
+                agent_id=",".join(sorted({r.agent_id for r in requests})),
+                input_data={
+                    "batch_id": batch.batch_id,
+                    "requests": [data for _, data, _ in items]
+                },
+                reasoning="; ".join(r.context for r in requests if r.context) or None
+            )
+            responses = self.await_batch_approval(batch)
+        except BaseException as e:
+            for future in futures:
+                future.set_exception(e)
+            raise
+
+        for future, response in zip(futures, responses):
+            future.set_result(response)
 
     def await_approval(self, request: ApprovalRequest) -> ApprovalResponse:
         """
         Wait for human approval of a request.
 
+        Blocks the calling thread on the approval callback. Use
+        submit_approval/wait_approval for the non-blocking flow.
+        With batch_window_ms set, blocks until the request's batch
+        has been reviewed.
+
         Args:
             request: The approval request
 
         Returns:
             ApprovalResponse with human's decision
         """
+        batch_future = self._batch_futures.pop(request.request_id, None)
+        if batch_future is not None:
+            return batch_future.result()
+
         if self.auto_approve:
             response = ApprovalResponse(
                 request_id=request.request_id,
@@ -302,8 +612,213 @@ class ApprovalGate:
                 notes="Auto-approved (testing mode)"
             )
         else:
-            response = self.approval_callback(request)
+            response = self._cached_response(request)
+            if response is None:
+                response = self._call_approval_callback(request)
+
+        self._record_decision(request, response)
+        return response
+
+    async def await_approval_async(self, request: ApprovalRequest) -> ApprovalResponse:
+        """
+        Await human approval without blocking the event loop.
+
+        Callbacks run through a bounded pool: at most max_concurrent
+        programmatic callbacks at once, and CLI prompts one at a time.
+        Requests created with skip_queue=True bypass the pool limit
+        (but never the CLI serialization).
+
+        Args:
+            request: The approval request
+
+        Returns:
+            ApprovalResponse with human's decision
+        """
+        batch_future = self._batch_futures.pop(request.request_id, None)
+        if batch_future is not None:
+            return await asyncio.wrap_future(batch_future)
+
+        if self.auto_approve:
+            response = ApprovalResponse(
+                request_id=request.request_id,
+                status=ApprovalStatus.APPROVED,
+                notes="Auto-approved (testing mode)"
+            )
+        else:
+            response = self._cached_response(request)
+            if response is None:
+                response = await self._run(request)
+
+        self._record_decision(request, response)
+        return response
+
+    async def _run(self, request: ApprovalRequest) -> ApprovalResponse:
+        """Run the approval callback under the appropriate semaphore."""
+        if request.skip_queue and not self._cli_mode:
+            return await self._invoke_callback(request)
+
+        loop = asyncio.get_running_loop()
+        with self._lock:
+            sems = self._loop_sems.get(loop)
+            if sems is None:
+                sems = (asyncio.Semaphore(self.max_concurrent), asyncio.Semaphore(1))
+                self._loop_sems[loop] = sems
+        sem = sems[1] if self._cli_mode else sems[0]
+
+        async with sem:
+            return await self._invoke_callback(request)
+
+    async def _invoke_callback(self, request: ApprovalRequest) -> ApprovalResponse:
+        """Await a coroutine callback, or run a blocking one in a thread."""
+        if asyncio.iscoroutinefunction(self.approval_callback):
+            return await self.approval_callback(request)
+        return await asyncio.to_thread(self._call_approval_callback, request)
+
+    def _call_approval_callback(self, request: ApprovalRequest) -> ApprovalResponse:
+        """Invoke the approval callback, serializing CLI prompts across threads."""
+        if self._cli_mode:
+            with self._cli_lock:
+                return self.approval_callback(request)
+        return self.approval_callback(request)
+
+    def request_batch(self, requests: List[ApprovalRequest]) -> ApprovalBatch:
+        """
+        Group already-created requests for a single review.
+
+        Args:
+            requests: Requests returned by the request_* methods
+
+        Returns:
+            ApprovalBatch to pass to await_batch_approval
+        """
+        return ApprovalBatch(
+            batch_id=self._generate_request_id(prefix="batch"),
+            requests=list(requests)
+        )
+
+    def await_batch_approval(self, batch: ApprovalBatch) -> List[ApprovalResponse]:
+        """
+        Wait for human approval of a whole batch.
+
+        Args:
+            batch: The batch to review
+
+        Returns:
+            One ApprovalResponse per request, in batch order
+        """
+        if self.auto_approve:
+            responses = [
+                ApprovalResponse(
+                    request_id=request.request_id,
+                    status=ApprovalStatus.APPROVED,
+                    notes="Auto-approved (testing mode)"
+                )
+                for request in batch.requests
+            ]
+        elif self._cli_batch_mode:
+            with self._cli_lock:
+                responses = self.batch_approval_callback(batch)
+        else:
+            responses = self.batch_approval_callback(batch)
+
+        if len(responses) != len(batch.requests):
+            raise ValueError(
+                f"Batch {batch.batch_id}: expected {len(batch.requests)} "
+                f"responses, got {len(responses)}"
+            )
+
+        self._record_batch_decision(batch, responses)
+        return responses
+
+    def _approve_each(self, batch: ApprovalBatch) -> List[ApprovalResponse]:
+        """Default batch callback: the approval callback, once per request."""
+        return [self._call_approval_callback(request) for request in batch.requests]
+
+    def submit_approval(self, request: ApprovalRequest) -> str:
+        """
+        Submit a request for approval without waiting for the decision.
+
+        The request is persisted to a snapshot in pending_dir so the
+        decision can be resumed after a process restart.
+
+        Args:
+            request: The approval request
+
+        Returns:
+            The pending request ID
+        """
+        with self._lock:
+            self._pending_requests[request.request_id] = request
+        self._write_snapshot(request)
+        return request.request_id
 
+    def resolve_approval(self, request_id: str, response: ApprovalResponse) -> None:
+        """
+        Record the decision for a submitted request.
+
+        Safe to call from any thread (CLI, webhook handler, etc.). Wakes
+        any coroutine blocked in wait_approval for this request.
+
+        Args:
+            request_id: ID returned by submit_approval
+            response: The reviewer's decision
+        """
+        request = self._pending_requests.get(request_id)
+        if request is None:
+            raise ValueError(f"No pending approval request: {request_id}")
+
+        self._record_decision(request, response)
+
+        with self._lock:
+            future = self._pending_futures.pop(request_id, None)
+            if future is None:
+                self._resolved[request_id] = response
+        if future is not None:
+            future.get_loop().call_soon_threadsafe(_set_future_result, future, response)
+
+    async def wait_approval(self, request_id: str) -> ApprovalResponse:
+        """
+        Await the decision for a submitted request.
+
+        Args:
+            request_id: ID returned by submit_approval
+
+        Returns:
+            ApprovalResponse passed to resolve_approval
+        """
+        with self._lock:
+            if request_id in self._resolved:
+                return self._resolved.pop(request_id)
+            future = self._pending_futures.get(request_id)
+            if future is None:
+                future = asyncio.get_running_loop().create_future()
+                self._pending_futures[request_id] = future
+        return await future
+
+    def restore_pending(self) -> List[ApprovalRequest]:
+        """
+        Reload pending requests from snapshots (e.g. after a restart).
+
+        Returns:
+            List of restored requests, also registered as pending
+        """
+        restored = []
+        if not self.pending_dir.exists():
+            return restored
+
+        for snapshot in sorted(self.pending_dir.glob("*.json")):
+            with open(snapshot, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            data["status"] = ApprovalStatus[data["status"].upper()]
+            request = ApprovalRequest(**data)
+            with self._lock:
+                self._pending_requests[request.request_id] = request
+            restored.append(request)
+
+        return restored
+
+    def _record_decision(self, request: ApprovalRequest, response: ApprovalResponse) -> None:
+        """Apply a decision to its request and log it."""
         # Update request status
         request.status = response.status
         request.reviewer_notes = response.notes
@@ -316,22 +831,162 @@ class ApprovalGate:
         else:
             action = AuditAction.APPROVAL_MODIFIED
 
-        self.audit.log(
+        self._log_decision(
             action=action,
             agent_id=request.agent_id,
             input_data={"request_id": request.request_id},
             output_data={
-                "status": response.status.value,
+                "status": response.status.label,
                 "notes": response.notes,
                 "modified": response.modified_proposal is not None
             },
             reasoning=response.notes
         )
 
+        # Remember human approvals of cacheable proposals
+        if (
+            request.decision_key
+            and response.status == ApprovalStatus.APPROVED
+            and not self.auto_approve
+        ):
+            self._cache_decision(request)
+
         # Remove from pending
-        self._pending_requests.pop(request.request_id, None)
+        with self._lock:
+            self._pending_requests.pop(request.request_id, None)
+        self._remove_snapshot(request.request_id)
 
-        return response
+    def _record_batch_decision(
+        self,
+        batch: ApprovalBatch,
+        responses: List[ApprovalResponse]
+    ) -> None:
+        """
+        Apply batch decisions and log one entry per outcome, recording
+        each request's own notes and any modified proposal.
+        """
+        outcomes: Dict[ApprovalStatus, List[dict]] = {}
+        for request, response in zip(batch.requests, responses):
+            request.status = response.status
+            request.reviewer_notes = response.notes
+            with self._lock:
+                self._pending_requests.pop(request.request_id, None)
+            self._remove_snapshot(request.request_id)
+            outcomes.setdefault(response.status, []).append({
+                "request_id": request.request_id,
+                "notes": response.notes,
+                "modified_proposal": response.modified_proposal
+            })
+
+        agent_id = ",".join(sorted({r.agent_id for r in batch.requests}))
+        actions = {
+            ApprovalStatus.APPROVED: AuditAction.APPROVAL_GRANTED,
+            ApprovalStatus.REJECTED: AuditAction.APPROVAL_DENIED,
+            ApprovalStatus.MODIFIED: AuditAction.APPROVAL_MODIFIED,
+        }
+        for status, decisions in outcomes.items():
+            notes = list(dict.fromkeys(d["notes"] for d in decisions if d["notes"]))
+            self._log_decision(
+                action=actions.get(status, AuditAction.APPROVAL_DENIED),
+                agent_id=agent_id,
+                input_data={
+                    "batch_id": batch.batch_id,
+                    "request_ids": [d["request_id"] for d in decisions]
+                },
+                output_data={
+                    "status": status.label,
+                    "count": len(decisions),
+                    "decisions": decisions
+                },
+                reasoning="; ".join(notes) or None
+            )
+
+    def _log_requested(self, **kwargs: Any) -> None:
+        """Log an APPROVAL_REQUESTED event, off-thread if audit_async is set."""
+        if self._audit_writer is not None:
+            self._audit_writer.log(**kwargs)
+        else:
+            self.audit.log(**kwargs)
+
+    def _log_decision(self, **kwargs: Any) -> None:
+        """Durably log a decision, after any queued request events."""
+        if self._audit_writer is not None:
+            self._audit_writer.flush()
+        self.audit.log(**kwargs)
+
+    def _is_cacheable(self, request: ApprovalRequest) -> bool:
+        """Whether a request's approval may be reused for identical repeats."""
+        if self.decision_cache_ttl <= 0:
+            return False
+        if request.action_type not in self.cacheable_actions or not request.reversible:
+            return False
+        # High-risk shell commands always need a fresh human decision
+        return not (request.action_type == "run_shell" and request.risk_level == "high")
+
+    def _cached_response(self, request: ApprovalRequest) -> Optional[ApprovalResponse]:
+        """Return an approval from the decision cache, if still valid."""
+        if not request.decision_key:
+            return None
+
+        with self._lock:
+            entry = self._decision_cache.get(request.decision_key)
+            if entry is None:
+                return None
+            prior_request_id, approved_at = entry
+            if time.monotonic() - approved_at > self.decision_cache_ttl:
+                del self._decision_cache[request.decision_key]
+                return None
+            self._decision_cache.move_to_end(request.decision_key)
+
+        return ApprovalResponse(
+            request_id=request.request_id,
+            status=ApprovalStatus.APPROVED,
+            notes=f"cache hit: {prior_request_id}"
+        )
+
+    def _cache_decision(self, request: ApprovalRequest) -> None:
+        """Record an approval in the LRU decision cache."""
+        with self._lock:
+            if request.decision_key in self._decision_cache:
+                return  # Keep the original approval's timestamp
+            self._decision_cache[request.decision_key] = (
+                request.request_id, time.monotonic()
+            )
+            while len(self._decision_cache) > self.decision_cache_size:
+                self._decision_cache.popitem(last=False)
+
+    def _snapshot_path(self, request_id: str) -> Path:
+        """Path of the snapshot file for a pending request."""
+        return self.pending_dir / f"{request_id}.json"
+
+    def _write_snapshot(self, request: ApprovalRequest) -> None:
+        """
+        Persist a pending request (write-then-rename for atomicity).
+
+        Snapshots hold the proposed content, so like audit logs they are
+        readable by the owner only.
+        """
+        self.pending_dir.mkdir(parents=True, exist_ok=True)
+        if callable(request.original_content):
+            request.get_original_content()
+        request.get_proposed_content()
+        data = asdict(request)
+        del data["_proposal_json"]
+        data["status"] = request.status.label
+
+        path = self._snapshot_path(request.request_id)
+        temp_path = path.with_suffix(".tmp")
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, LOG_FILE_MODE)
+        with open(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, indent=2, default=str)
+        os.replace(temp_path, path)
+
+    def _remove_snapshot(self, request_id: str) -> None:
+        """Delete a request's snapshot if one was written."""
+        try:
+            os.unlink(self._snapshot_path(request_id))
+        except FileNotFoundError:
+            pass
 
     def _cli_approval(self, request: ApprovalRequest) -> ApprovalResponse:
         """
@@ -339,40 +994,20 @@ class ApprovalGate:
 
         Presents the request to the user via terminal and waits for decision.
         """
-        print("\n" + "=" * 70)
-        print("APPROVAL REQUIRED")
-        print("=" * 70)
-        print(f"Request ID: {request.request_id}")
-        print(f"Agent: {request.agent_id}")
-        print(f"Action: {request.action_type}")
-        print(f"Risk Level: {request.risk_level.upper()}")
-        print(f"Reversible: {'Yes' if request.reversible else 'NO - IRREVERSIBLE'}")
-        print("-" * 70)
-        print(f"Description: {request.description}")
-
-        if request.context:
-            print(f"\nContext: {request.context}")
-
-        # Show diff for file edits
-        if request.original_content is not None and request.proposed_content is not None:
-            print("\n--- Proposed Changes ---")
-            self._display_diff(request.original_content, request.proposed_content)
-
-        # Show command for shell execution
-        if request.action_type == "run_shell":
-            print(f"\nCommand: {request.proposal.get('command', 'N/A')}")
+        sys.stdout.write(_BANNER)
+        sys.stdout.write(_TEMPLATE.format_map({
+            "request_id": request.request_id,
+            "agent_id": request.agent_id,
+            "action_type": request.action_type,
+            "risk_level": request.risk_level.upper(),
+            "reversible": "Yes" if request.reversible else "NO - IRREVERSIBLE",
+            "description": request.description,
+            "context": f"\nContext: {request.context}\n" if request.context else "",
+        }))
 
-        # Show generic proposal
-        if request.action_type not in ["edit_file", "run_shell"]:
-            print(f"\nProposal: {json.dumps(request.proposal, indent=2, default=str)}")
+        self._display_proposal(request)
 
-        print("\n" + "-" * 70)
-        print("Options:")
-        print("  [a] Approve - Execute as proposed")
-        print("  [r] Reject  - Do not execute")
-        print("  [m] Modify  - Edit the proposal before executing")
-        print("  [v] View    - Show more details")
-        print("-" * 70)
+        sys.stdout.write(_OPTIONS)
 
         while True:
             try:
@@ -417,29 +1052,120 @@ class ApprovalGate:
             else:
                 print("Invalid choice. Please enter 'a', 'r', 'm', or 'v'.")
 
-    def _display_diff(self, original: str, proposed: str) -> None:
-        """Display a unified diff between original and proposed content."""
-        original_lines = original.splitlines(keepends=True)
-        proposed_lines = proposed.splitlines(keepends=True)
-
-        diff = difflib.unified_diff(
-            original_lines,
-            proposed_lines,
-            fromfile="original",
-            tofile="proposed",
-            lineterm=""
-        )
+    def _cli_batch_approval(self, batch: ApprovalBatch) -> List[ApprovalResponse]:
+        """
+        Default CLI-based batch approval interface.
 
-        for line in diff:
-            if line.startswith("+") and not line.startswith("+++"):
-                print(f"\033[92m{line}\033[0m", end="")  # Green
-            elif line.startswith("-") and not line.startswith("---"):
-                print(f"\033[91m{line}\033[0m", end="")  # Red
-            elif line.startswith("@@"):
-                print(f"\033[96m{line}\033[0m", end="")  # Cyan
-            else:
-                print(line, end="")
-        print()
+        Lists every request on one screen; the reviewer approves a
+        selection of indices and the rest are rejected.
+        """
+        count = len(batch.requests)
+        sys.stdout.write(_BATCH_BANNER.format(count=count, batch_id=batch.batch_id))
+        sys.stdout.write("".join(
+            _BATCH_ITEM.format_map({
+                "index": i,
+                "agent_id": request.agent_id,
+                "action_type": request.action_type,
+                "risk_level": request.risk_level.upper(),
+                "irreversible": "" if request.reversible else " [IRREVERSIBLE]",
+                "description": request.description,
+            })
+            for i, request in enumerate(batch.requests, 1)
+        ))
+        sys.stdout.write(_BATCH_OPTIONS)
+
+        while True:
+            try:
+                choice = input("approve indices (e.g. 1,3-5,all): ").strip().lower()
+            except (EOFError, KeyboardInterrupt):
+                print("\nApproval cancelled.")
+                return [
+                    ApprovalResponse(
+                        request_id=request.request_id,
+                        status=ApprovalStatus.REJECTED,
+                        notes="Cancelled by user"
+                    )
+                    for request in batch.requests
+                ]
+
+            if choice == "d":
+                # Render diffs concurrently, then print them in order
+                workers = min(count, os.cpu_count() or 1)
+                with ThreadPoolExecutor(max_workers=workers) as executor:
+                    rendered = list(executor.map(self._render_proposal, batch.requests))
+                sys.stdout.write("".join(
+                    f"\n[{i}] {request.request_id}: {request.description}\n{text}"
+                    for i, (request, text) in enumerate(zip(batch.requests, rendered), 1)
+                ))
+                sys.stdout.flush()
+                continue
+
+            try:
+                selected = _parse_indices(choice, count)
+            except ValueError as e:
+                print(f"Invalid selection: {e}")
+                continue
+            break
+
+        notes = input("Notes (optional, press Enter to skip): ").strip() or None
+        return [
+            ApprovalResponse(
+                request_id=request.request_id,
+                status=ApprovalStatus.APPROVED if i in selected else ApprovalStatus.REJECTED,
+                notes=notes
+            )
+            for i, request in enumerate(batch.requests, 1)
+        ]
+
+    def _display_proposal(self, request: ApprovalRequest) -> None:
+        """Display the proposed change (diff, command, or raw proposal)."""
+        sys.stdout.write(self._render_proposal(request))
+        sys.stdout.flush()
+
+    def _render_proposal(self, request: ApprovalRequest) -> str:
+        """Render the proposed change (diff, command, or raw proposal)."""
+        parts = []
+
+        # Show diff for file edits
+        has_original = request.original_content is not None or request.content_path
+        if has_original and request.proposed_content is not None:
+            parts.append("\n--- Proposed Changes ---\n")
+            parts.append(self._render_file_diff(request))
+
+        # Show command for shell execution
+        if request.action_type == "run_shell":
+            parts.append(f"\nCommand: {request.proposal.get('command', 'N/A')}\n")
+
+        # Show generic proposal
+        if request.action_type not in ["edit_file", "run_shell"]:
+            parts.append(f"\nProposal: {request.proposal_json}\n")
+
+        return "".join(parts)
+
+    def _render_file_diff(self, request: ApprovalRequest) -> str:
+        """Render a file edit's diff, memory-mapping a large original."""
+        path = request.content_path
+        if request.original_content is None and path:
+            try:
+                large = os.path.getsize(path) > MMAP_THRESHOLD
+            except OSError:
+                large = False
+            if large:
+                with open(path, "rb") as f, \
+                        mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    return _render_diff(mapped, request.get_proposed_content())
+
+        return _render_diff(request.get_original_content(), request.get_proposed_content())
+
+    def _display_diff(
+        self,
+        original: str,
+        proposed: str,
+        max_diff_lines: int = MAX_DIFF_LINES
+    ) -> None:
+        """Display a unified diff between original and proposed content."""
+        sys.stdout.write(_render_diff(original, proposed, max_diff_lines))
+        sys.stdout.flush()
 
     def _display_full_details(self, request: ApprovalRequest) -> None:
         """Display full details of a request."""
@@ -452,12 +1178,14 @@ class ApprovalGate:
         print(f"Reversible: {request.reversible}")
         print(f"Description: {request.description}")
         print(f"Context: {request.context}")
-        print(f"Proposal: {json.dumps(request.proposal, indent=2, default=str)}")
-
-        if request.original_content:
-            print(f"\nOriginal Content Length: {len(request.original_content)} chars")
-        if request.proposed_content:
-            print(f"Proposed Content Length: {len(request.proposed_content)} chars")
+        print(f"Proposal: {request.proposal_json}")
+
+        original = request.get_original_content()
+        proposed = request.get_proposed_content()
+        if original:
+            print(f"\nOriginal Content Length: {len(original)} chars")
+        if proposed:
+            print(f"Proposed Content Length: {len(proposed)} chars")
         print()
 
     def _get_modification(self, request: ApprovalRequest) -> Any:
@@ -475,28 +1203,31 @@ class ApprovalGate:
             choice = input("Choice: ").strip().lower()
 
             if choice == "edit":
-                import tempfile
-                import subprocess
-                import os
-
-                # Write proposed content to temp file
-                with tempfile.NamedTemporaryFile(
-                    mode="w",
-                    suffix=".py",
-                    delete=False
-                ) as f:
-                    f.write(request.proposed_content or "")
-                    temp_path = f.name
+                # Reuse one scratch file per agent across modify cycles
+                if self._scratch_dir is None:
+                    self._scratch_dir = tempfile.TemporaryDirectory(prefix="approval_edit_")
+                suffix = Path(request.proposal.get("file_path") or "").suffix or ".py"
+                name = re.sub(r"[^\w.-]", "_", request.agent_id) + suffix
+                temp_path = os.path.join(self._scratch_dir.name, name)
+
+                # Write proposed content to the scratch file
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(request.get_proposed_content() or "")
+                before = os.stat(temp_path)
 
                 # Open in editor
                 editor = os.environ.get("EDITOR", "nano")
                 subprocess.call([editor, temp_path])
 
+                # Saved without changes: keep the proposal, skip the re-read
+                after = os.stat(temp_path)
+                if (after.st_mtime_ns, after.st_size) == (before.st_mtime_ns, before.st_size):
+                    return request.proposal
+
                 # Read modified content
-                with open(temp_path, "r") as f:
+                with open(temp_path, "r", encoding="utf-8") as f:
                     modified_content = f.read()
 
-                os.unlink(temp_path)
                 return {
                     "file_path": request.proposal.get("file_path"),
                     "content": modified_content
@@ -517,7 +1248,7 @@ class ApprovalGate:
 
         else:
             # Generic modification - ask for JSON
-            print(f"\nCurrent proposal: {json.dumps(request.proposal, indent=2)}")
+            print(f"\nCurrent proposal: {_pjson(request.proposal)}")
             print("Enter modified proposal as JSON (or 'skip' to keep original):")
             modified_json = input().strip()
 
@@ -532,18 +1263,247 @@ class ApprovalGate:
 
     def get_pending_requests(self) -> List[ApprovalRequest]:
         """Get all pending approval requests."""
+        # Writers hold _lock; list() over a dict view is atomic under the GIL
         return list(self._pending_requests.values())
 
     def cancel_request(self, request_id: str) -> bool:
         """Cancel a pending approval request."""
-        if request_id in self._pending_requests:
-            request = self._pending_requests.pop(request_id)
-            self.audit.log(
+        with self._lock:
+            request = self._pending_requests.pop(request_id, None)
+        if request is not None:
+            self._remove_snapshot(request_id)
+            self._log_decision(
                 action=AuditAction.APPROVAL_DENIED,
                 agent_id=request.agent_id,
                 input_data={"request_id": request_id},
                 output_data={"status": "cancelled"},
                 reasoning="Request cancelled"
             )
+
+            # Release anyone awaiting this request
+            with self._lock:
+                future = self._pending_futures.pop(request_id, None)
+            if future is not None:
+                response = ApprovalResponse(
+                    request_id=request_id,
+                    status=ApprovalStatus.REJECTED,
+                    notes="Request cancelled"
+                )
+                future.get_loop().call_soon_threadsafe(_set_future_result, future, response)
             return True
         return False
+
+
+def _read_text(path: str) -> str:
+    """Read a file for display, treating a missing file as empty."""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _pjson(obj: Any, indent: bool = True) -> str:
+    """
+    Serialize a proposal with sorted keys (orjson when installed).
+
+    Args:
+        obj: Object to serialize; unsupported types fall back to str()
+        indent: Pretty-print with 2 spaces, else emit compact JSON
+    """
+    if orjson is not None:
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        try:
+            return orjson.dumps(obj, option=option, default=str).decode("utf-8")
+        except TypeError:
+            pass  # e.g. integers beyond 64 bits; let json handle it
+
+    if indent:
+        return json.dumps(obj, indent=2, sort_keys=True, ensure_ascii=False, default=str)
+    return json.dumps(
+        obj, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str
+    )
+
+
+def _decision_key(request: ApprovalRequest) -> str:
+    """Hash (agent_id, action_type, canonical proposal) for the decision cache."""
+    canonical = _pjson(request.proposal, indent=False)
+    digest = hashlib.blake2b(digest_size=16)
+    for part in (request.agent_id, request.action_type, canonical):
+        digest.update(part.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+def _render_diff(
+    original: Union[str, bytes, mmap.mmap],
+    proposed: Union[str, bytes, mmap.mmap],
+    max_diff_lines: int = MAX_DIFF_LINES
+) -> str:
+    """Render a colorized unified diff into a single string."""
+    if _same_content(original, proposed):
+        return "(identical)\n"
+
+    buf = []
+    diff = _unified_diff(original, proposed)
+    for count, line in enumerate(diff):
+        if count >= max_diff_lines:
+            # Counting the rest would compute the whole diff; stop here
+            buf.append(f"... diff truncated at {max_diff_lines} lines\n")
+            break
+        if line.endswith("\n"):
+            line = line[:-1]
+        color = _DIFF_COLORS.get(line[:1])
+        # The first two lines are the ---/+++ file headers
+        if color is None or count < 2:
+            buf.append(line + "\n")
+        else:
+            buf.append(color + line + _RESET + "\n")
+    buf.append("\n")
+    return "".join(buf)
+
+
+def _same_content(
+    original: Union[str, bytes, mmap.mmap],
+    proposed: Union[str, bytes, mmap.mmap]
+) -> bool:
+    """Whether two contents are equal, comparing bytes when either side is."""
+    if isinstance(original, str) and isinstance(proposed, str):
+        return original == proposed
+    original, proposed = _as_bytes(original), _as_bytes(proposed)
+    if len(original) != len(proposed):
+        return False
+    # mmap has no content equality; compare buffers instead
+    with memoryview(original) as a, memoryview(proposed) as b:
+        return a == b
+
+
+def _unified_diff(
+    original: Union[str, bytes, mmap.mmap],
+    proposed: Union[str, bytes, mmap.mmap],
+    context: int = 3
+) -> Iterator[str]:
+    """
+    Yield unified diff lines (same format as difflib.unified_diff).
+
+    Lines are matched by hash so SequenceMatcher compares ints rather
+    than strings; line text is only sliced out for emitted hunks, so no
+    list of lines is ever built. Either side may be bytes (e.g. an mmap);
+    lines are then compared undecoded and only emitted lines are decoded.
+    """
+    if not (isinstance(original, str) and isinstance(proposed, str)):
+        original, proposed = _as_bytes(original), _as_bytes(proposed)
+        decode = _decode_line
+    else:
+        decode = str
+
+    a_hashes, a_offsets = _index_lines(original)
+    b_hashes, b_offsets = _index_lines(proposed)
+    matcher = difflib.SequenceMatcher(None, a_hashes, b_hashes)
+
+    def a(i1: int, i2: int) -> Iterator[str]:
+        for i in range(i1, i2):
+            yield decode(original[a_offsets[i]:a_offsets[i + 1]])
+
+    def b(j1: int, j2: int) -> Iterator[str]:
+        for j in range(j1, j2):
+            yield decode(proposed[b_offsets[j]:b_offsets[j + 1]])
+
+    started = False
+    for group in matcher.get_grouped_opcodes(context):
+        if not started:
+            started = True
+            yield "--- original\n"
+            yield "+++ proposed\n"
+
+        first, last = group[0], group[-1]
+        yield (
+            f"@@ -{_format_range(first[1], last[2])} "
+            f"+{_format_range(first[3], last[4])} @@\n"
+        )
+        for tag, i1, i2, j1, j2 in group:
+            if tag == "equal":
+                for line in a(i1, i2):
+                    yield " " + line
+                continue
+            if tag in ("replace", "delete"):
+                for line in a(i1, i2):
+                    yield "-" + line
+            if tag in ("replace", "insert"):
+                for line in b(j1, j2):
+                    yield "+" + line
+
+
+def _as_bytes(content: Union[str, bytes, mmap.mmap]) -> Union[bytes, mmap.mmap]:
+    """Encode str content so it can be diffed against bytes."""
+    return content.encode("utf-8") if isinstance(content, str) else content
+
+
+def _decode_line(line: bytes) -> str:
+    """Decode one diffed line for display."""
+    return line.decode("utf-8", errors="replace")
+
+
+def _index_lines(content: Union[str, bytes, mmap.mmap]) -> Tuple[List[int], array]:
+    """
+    Hash each line of content in one streaming pass.
+
+    Lines end at "\\n" (like iterating a file). Returns the per-line
+    hashes and the line boundaries: line i is
+    content[offsets[i]:offsets[i + 1]].
+    """
+    newline = "\n" if isinstance(content, str) else b"\n"
+    hashes = []
+    offsets = array("q", [0])
+    start, end = 0, len(content)
+    while start < end:
+        stop = content.find(newline, start)
+        stop = end if stop < 0 else stop + 1
+        hashes.append(hash(content[start:stop]))
+        offsets.append(stop)
+        start = stop
+    return hashes, offsets
+
+
+def _format_range(start: int, stop: int) -> str:
+    """Format a hunk range as 'start,length' per the unified diff spec."""
+    beginning = start + 1
+    length = stop - start
+    if length == 1:
+        return str(beginning)
+    if not length:
+        beginning -= 1
+    return f"{beginning},{length}"
+
+
+def _parse_indices(text: str, count: int) -> set:
+    """
+    Parse a 1-based selection such as "1,3-5", "all" or "none".
+
+    Raises:
+        ValueError: If the selection is malformed or out of range
+    """
+    if text == "all":
+        return set(range(1, count + 1))
+    if text in ("", "none"):
+        return set()
+
+    selected = set()
+    for part in text.replace(" ", "").split(","):
+        if not part:
+            continue
+        start, sep, end = part.partition("-")
+        first = int(start)
+        last = int(end) if sep else first
+        if first < 1 or last > count or first > last:
+            raise ValueError(f"'{part}' is outside 1-{count}")
+        selected.update(range(first, last + 1))
+    return selected
+
+
+def _set_future_result(future: asyncio.Future, response: ApprovalResponse) -> None:
+    """Complete a waiter's future unless it was already cancelled."""
+    if not future.done():
+        future.set_result(response)
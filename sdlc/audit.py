@@ -8,15 +8,32 @@ Provides tamper-evident audit trails with:
 - Verification functions to detect tampering
 """
 
+import atexit
 import hashlib
 import json
+import json.encoder
+import mmap
 import os
-from dataclasses import dataclass, field, asdict
-from datetime import datetime, timezone
+import queue
+import secrets
+import threading
+import time
+import weakref
+from array import array
+from bisect import bisect_left, bisect_right
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass, field, fields, asdict
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
-from typing import Any, Optional, List, Iterator
+from typing import Any, Callable, Optional, List, Dict, Iterator, Union
 from enum import Enum
 
+try:
+    import orjson
+except ImportError:  # Optional: faster log parsing
+    orjson = None
+
 
 class AuditAction(Enum):
     """Types of auditable actions."""
@@ -35,13 +52,15 @@ class AuditAction(Enum):
     SYSTEM_OUTPUT = "system_output"
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class AuditEntry:
     """
     Immutable audit log entry.
 
     The frozen=True ensures entries cannot be modified after creation,
     which is critical for compliance with legal audit requirements.
+    slots=True drops the per-instance __dict__, since the logger keeps
+    every entry of a log in memory for its query index.
     """
     # Core fields
     timestamp: str  # ISO 8601 format in UTC
@@ -75,22 +94,263 @@ class AuditEntry:
         return cls(**data)
 
 
-def compute_entry_hash(entry: AuditEntry) -> str:
+def _loads(line: Union[str, bytes]) -> Any:
     """
-    Compute SHA-256 hash of an audit entry.
+    Parse one log line, with orjson when installed.
 
-    The hash includes all fields EXCEPT entry_hash itself,
-    which allows verification after the hash is stored.
+    orjson rejects some JSON that json.dumps writes, such as escaped lone
+    surrogates ("\\udc80"), so those lines are parsed again with json.
+    """
+    if orjson is not None:
+        try:
+            return orjson.loads(line)
+        except orjson.JSONDecodeError:
+            pass
+    return json.loads(line)
+
+
+# Permissions for newly created log and state files (owner only)
+LOG_FILE_MODE = 0o600
+
+# Initial window when reading the last entry from the end of the log
+TAIL_READ_SIZE = 4096
+
+# Buffered bytes that force a write when batching, whatever the entry count
+BATCH_MAX_BYTES = 64 * 1024
+
+# "YYYY-MM-DDTHH:" for the current UTC hour, keyed by hours since the epoch
+_hour_prefix = (-1, "")
+
+# Batching loggers to flush and async writers to close at interpreter
+# exit; weak, so registering one does not keep it (and its descriptors,
+# buffers or thread) alive
+_batching_loggers: "weakref.WeakSet[AuditLogger]" = weakref.WeakSet()
+_async_writers: "weakref.WeakSet[AsyncAuditWriter]" = weakref.WeakSet()
+
+
+def _utc_timestamp() -> str:
+    """
+    Current UTC time in ISO 8601, e.g. 2024-01-01T12:34:56.789012+00:00.
+
+    Equivalent to datetime.now(timezone.utc).isoformat() (except that
+    microseconds are always present); the date/hour prefix is
+    reformatted only when the hour changes.
+    """
+    global _hour_prefix
+    seconds, nanos = divmod(time.time_ns(), 1_000_000_000)
+    hour, within_hour = divmod(seconds, 3600)
+
+    cached_hour, prefix = _hour_prefix
+    if hour != cached_hour:
+        t = time.gmtime(seconds)
+        prefix = "%04d-%02d-%02dT%02d:" % (t.tm_year, t.tm_mon, t.tm_mday, t.tm_hour)
+        _hour_prefix = (hour, prefix)
+
+    minute, second = divmod(within_hour, 60)
+    return "%s%02d:%02d.%06d+00:00" % (prefix, minute, second, nanos // 1000)
+
+
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICROSECOND = timedelta(microseconds=1)
+
+
+def _timestamp_ns(value: datetime) -> int:
+    """Nanoseconds since the epoch, exact to the microsecond (naive = UTC)."""
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return (value - _EPOCH) // _MICROSECOND * 1000
+
+
+# Field names of a well-formed log line, and those covered by its hash
+_ENTRY_FIELDS = frozenset(f.name for f in fields(AuditEntry))
+_HASHED_FIELDS = _ENTRY_FIELDS - {"entry_hash"}
+
+# The C string escaper json.dumps uses with ensure_ascii=True
+_encode_str = json.encoder.encode_basestring_ascii
+
+# Entries hashed per batch during chain verification
+VERIFY_BATCH_SIZE = 256
+
+# Larger batches when hashing in worker processes, to amortize IPC
+PARALLEL_VERIFY_BATCH_SIZE = 1024
+
+
+def _json_value(value: Any) -> str:
+    """Encode one field value exactly as canonical json.dumps would."""
+    if value.__class__ is str:
+        return _encode_str(value)
+    if value is None:
+        return "null"
+    if value is True:
+        return "true"
+    if value is False:
+        return "false"
+    if value.__class__ is int:
+        return int.__repr__(value)
+    return json.dumps(value, sort_keys=True, separators=(",", ":"))
+
+
+def _build_canonicalizer() -> Callable[[dict], bytes]:
     """
+    Generate a canonicalizer specialized to the AuditEntry schema.
+
+    The generated function concatenates pre-escaped keys and encoded
+    values in sorted-key order, producing the same bytes as
+    json.dumps(data, sort_keys=True, separators=(",", ":")) without
+    sorting or dispatching over the dict at run time.
+    """
+    terms = []
+    for i, name in enumerate(sorted(_HASHED_FIELDS)):
+        key = ("{" if i == 0 else ",") + json.dumps(name) + ":"
+        terms.append(f"{key!r} + _value(data[{name!r}])")
+    source = (
+        "def _canonical_entry(data, _value=_value):\n"
+        f"    return ({' + '.join(terms)} + '}}').encode('utf-8')\n"
+    )
+    namespace: Dict[str, Any] = {"_value": _json_value}
+    exec(source, namespace)
+    return namespace["_canonical_entry"]
+
+
+def _canonicalize(data: dict) -> bytes:
+    """Canonical JSON serialization (sorted keys, no extra whitespace)."""
+    if data.keys() == _HASHED_FIELDS:
+        return _canonical_entry(data)
+    return json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+
+
+_canonical_entry = _build_canonicalizer()
+
+
+def _canonical_payload(entry: Union[AuditEntry, dict]) -> bytes:
+    """Canonical JSON bytes of an entry (or its field dict), excluding entry_hash."""
     # Create dict without the hash field
-    data = entry.to_dict()
+    data = dict(entry) if isinstance(entry, dict) else entry.to_dict()
     data.pop("entry_hash", None)
+    return _canonicalize(data)
 
-    # Canonical JSON serialization (sorted keys, no extra whitespace)
-    canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
 
-    # SHA-256 hash
-    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+def _entry_line(canonical: bytes, entry_hash: str) -> bytes:
+    """
+    Log line for an entry: its canonical JSON with entry_hash appended.
+
+    Reuses the exact bytes that were hashed, so each entry is
+    serialized once on the write path.
+    """
+    return canonical[:-1] + b',"entry_hash":"' + entry_hash.encode("ascii") + b'"}\n'
+
+
+def compute_entry_hash(entry: Union[AuditEntry, dict]) -> str:
+    """
+    Compute SHA-256 hash of an audit entry.
+
+    The hash includes all fields EXCEPT entry_hash itself,
+    which allows verification after the hash is stored. Accepts the
+    entry or a dict of its fields.
+    """
+    return hashlib.sha256(_canonical_payload(entry)).hexdigest()
+
+
+def _hash_batch(payloads: List[bytes]) -> List[str]:
+    """SHA-256 hex digests of independent payloads, in order."""
+    sha256 = hashlib.sha256
+    return [sha256(payload).hexdigest() for payload in payloads]
+
+
+@dataclass(slots=True)
+class _SessionStats:
+    """Running totals for one session, kept current by the query index."""
+    action_counts: Dict[str, int] = field(default_factory=dict)
+    agent_counts: Dict[str, int] = field(default_factory=dict)
+    total_duration_ms: int = 0
+    failed_count: int = 0
+
+    def add(self, entry: AuditEntry) -> None:
+        """Count one indexed entry."""
+        self.action_counts[entry.action] = self.action_counts.get(entry.action, 0) + 1
+        self.agent_counts[entry.agent_id] = self.agent_counts.get(entry.agent_id, 0) + 1
+        if entry.duration_ms:
+            self.total_duration_ms += entry.duration_ms
+        if not entry.success:
+            self.failed_count += 1
+
+
+class _LogFiles:
+    """
+    The write side of an AuditLogger: its descriptors, running digest and
+    buffered lines.
+
+    Kept apart from the logger so the logger's finalizer can reference it:
+    a batching logger collected without close() still writes its buffered
+    entries. Descriptors are opened on first write and kept open.
+    """
+
+    def __init__(self, log_path: Path, state_path: Path, digest_path: Optional[Path]):
+        self.log_path = log_path
+        self.state_path = state_path
+        self.digest_path = digest_path  # None unless tracking the file digest
+        self.fd: Optional[int] = None  # Append-only log descriptor
+        self.state_fd: Optional[int] = None
+        self.digest_fd: Optional[int] = None
+        self.digest: Optional[Any] = None  # Running hashlib.sha256 of the file
+
+        # Serialized lines not yet written, and the chain position after them
+        self.buffer = bytearray()
+        self.buffered = 0
+        self.chain = (0, "")
+
+    def append(self, data: bytes, sequence_num: int, last_hash: str) -> None:
+        """Append bytes to the log, then record the chain position and digest."""
+        if self.fd is None:
+            self.fd = os.open(
+                self.log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, LOG_FILE_MODE
+            )
+
+        if self.digest_path is not None and self.digest is None:
+            # Seed the running digest with the file's existing contents
+            with open(self.log_path, "rb") as f:
+                self.digest = hashlib.file_digest(f, "sha256")
+
+        view = memoryview(data)
+        while view:
+            written = os.write(self.fd, view)
+            view = view[written:]
+
+        # State sidecar: "{seq}:{hash}:{log size}", fixed width, so each
+        # update is one in-place write of the same length
+        if self.state_fd is None:
+            self.state_fd = os.open(self.state_path, os.O_WRONLY | os.O_CREAT, LOG_FILE_MODE)
+        size = os.fstat(self.fd).st_size
+        record = f"{sequence_num:020d}:{last_hash}:{size:020d}\n"
+        _overwrite(self.state_fd, record.encode("ascii"))
+
+        # Optional whole-file digest sidecar, in sha256sum format
+        if self.digest_path is not None:
+            if self.digest_fd is None:
+                self.digest_fd = os.open(
+                    self.digest_path, os.O_WRONLY | os.O_CREAT, LOG_FILE_MODE
+                )
+            self.digest.update(data)
+            record = f"{self.digest.hexdigest()}  {self.log_path.name}\n"
+            _overwrite(self.digest_fd, record.encode("utf-8"))
+
+    def flush(self) -> None:
+        """Write any buffered lines."""
+        if self.buffer:
+            data = bytes(self.buffer)
+            self.buffer.clear()
+            self.buffered = 0
+            self.append(data, *self.chain)
+
+    def close(self) -> None:
+        """Write any buffered lines and close the descriptors."""
+        try:
+            self.flush()
+        finally:
+            for fd in (self.fd, self.state_fd, self.digest_fd):
+                if fd is not None:
+                    os.close(fd)
+            self.fd = self.state_fd = self.digest_fd = None
 
 
 class AuditLogger:
@@ -112,13 +372,19 @@ class AuditLogger:
 
         # Verify integrity
         is_valid, errors = logger.verify_chain()
+
+    The log file stays open for appending between calls; use the logger
+    as a context manager (or call close()) to release it promptly.
     """
 
     def __init__(
         self,
         log_path: str,
         session_id: Optional[str] = None,
-        auto_verify: bool = True
+        auto_verify: bool = True,
+        track_digest: bool = False,
+        batch_size: int = 1,
+        batch_flush_ms: Optional[float] = None
     ):
         """
         Initialize audit logger.
@@ -127,11 +393,52 @@ class AuditLogger:
             log_path: Path to JSON Lines audit file
             session_id: Unique session identifier (auto-generated if not provided)
             auto_verify: Verify chain integrity on startup
+            track_digest: Maintain a whole-file SHA-256 in a .sha256 sidecar
+                          for verify_audit_file_quick
+            batch_size: Entries buffered per write (1 = write each entry
+                        immediately); reads, close() and exit flush first
+            batch_flush_ms: Also write a partial batch once its oldest
+                            entry has waited this long
         """
         self.log_path = Path(log_path)
         self.session_id = session_id or self._generate_session_id()
         self._sequence_num = 0
         self._last_hash = ""
+        self._lock = threading.RLock()
+
+        # Chain-state sidecar: "{seq}:{hash}:{log size}", rewritten per append
+        self.state_path = self.log_path.with_name(self.log_path.name + ".state")
+
+        # Optional whole-file digest sidecar, in sha256sum format
+        self.track_digest = track_digest
+        self.digest_path = self.log_path.with_name(self.log_path.name + ".sha256")
+
+        # Descriptors and buffered lines; the finalizer writes what is still
+        # buffered and closes the descriptors on garbage collection (the OS
+        # closes them at exit, so the exit-time flush never writes to a
+        # closed descriptor)
+        self._files = _LogFiles(
+            self.log_path, self.state_path, self.digest_path if track_digest else None
+        )
+        self._finalizer = weakref.finalize(self, self._files.close)
+        self._finalizer.atexit = False
+
+        # Write coalescing: lines are buffered in _files until a batch fills
+        self.batch_size = batch_size
+        self.batch_flush_ms = batch_flush_ms
+        self._flush_timer: Optional[threading.Timer] = None
+        if batch_size > 1:
+            _batching_loggers.add(self)
+
+        # Query index, built on first query and caught up by file offset
+        self._entries: List[AuditEntry] = []
+        self._by_session: Dict[str, List[int]] = {}
+        self._by_agent: Dict[str, List[int]] = {}
+        self._by_action: Dict[str, List[int]] = {}
+        self._timestamps_ns = array("q")  # Parallel to _entries
+        self._timestamps_sorted = True  # Enables bisecting time ranges
+        self._session_stats: Dict[str, _SessionStats] = {}
+        self._indexed_offset = 0
 
         # Ensure log directory exists
         self.log_path.parent.mkdir(parents=True, exist_ok=True)
@@ -149,32 +456,96 @@ class AuditLogger:
     def _generate_session_id(self) -> str:
         """Generate unique session ID."""
         timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-        random_suffix = hashlib.sha256(
-            os.urandom(32)
-        ).hexdigest()[:8]
+        random_suffix = secrets.token_hex(4)
         return f"session_{timestamp}_{random_suffix}"
 
     def _load_chain_state(self) -> None:
         """Load last entry's hash and sequence number to continue chain."""
-        last_entry = None
-        for entry in self._read_entries():
-            last_entry = entry
+        state = self._read_state()
+        if state is not None:
+            self._sequence_num, self._last_hash = state
+            return
 
-        if last_entry:
-            self._sequence_num = last_entry.sequence_num
-            self._last_hash = last_entry.entry_hash
+        # No usable sidecar: parse only the last entry from the file's tail
+        line = self._read_last_line()
+        if line:
+            last_entry = _loads(line)
+            self._sequence_num = last_entry["sequence_num"]
+            self._last_hash = last_entry["entry_hash"]
 
-    def _read_entries(self) -> Iterator[AuditEntry]:
-        """Read all entries from log file."""
-        if not self.log_path.exists():
+    def _read_state(self) -> Optional[tuple[int, str]]:
+        """
+        Read (sequence_num, last_hash) from the state sidecar.
+
+        Returns None if the sidecar is missing, malformed, or was written
+        for a different log size (e.g. another process appended since).
+        """
+        try:
+            with open(self.state_path, "r", encoding="ascii") as f:
+                sequence, last_hash, size = f.read().strip().split(":")
+            if int(size) != os.path.getsize(self.log_path) or len(last_hash) != 64:
+                return None
+            return int(sequence), last_hash
+        except (OSError, ValueError):
+            return None
+
+    def _read_last_line(self) -> Optional[bytes]:
+        """
+        Return the last non-blank line of the log file, or None.
+
+        Reads a window from the end of the file, doubling it until the
+        window holds a complete line, so the cost does not grow with the
+        length of the log.
+        """
+        with open(self.log_path, "rb") as f:
+            end = f.seek(0, os.SEEK_END)
+            window = TAIL_READ_SIZE
+            while True:
+                start = max(0, end - window)
+                f.seek(start)
+                tail = f.read(end - start).rstrip()
+                newline = tail.rfind(b"\n")
+                if newline >= 0 or start == 0:
+                    return tail[newline + 1:].strip() or None
+                window *= 2
+
+    def _read_lines(self) -> Iterator[bytes]:
+        """
+        Yield the non-blank lines of the log file as bytes.
+
+        The file is memory-mapped and split on b"\\n" directly, avoiding
+        buffered line reads; JSON parsers ignore surrounding whitespace.
+        """
+        self.flush()
+        try:
+            f = open(self.log_path, "rb")
+        except FileNotFoundError:
             return
 
-        with open(self.log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                line = line.strip()
-                if line:
-                    data = json.loads(line)
-                    yield AuditEntry.from_dict(data)
+        with f:
+            if os.fstat(f.fileno()).st_size == 0:
+                return  # Empty files cannot be mapped
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                start, end = 0, len(mapped)
+                while start < end:
+                    stop = mapped.find(b"\n", start)
+                    if stop < 0:
+                        stop = end
+                    line = mapped[start:stop]
+                    if line and not line.isspace():
+                        yield line
+                    start = stop + 1
+
+    def _read_records(self) -> Iterator[dict]:
+        """Read all entries from log file as parsed dicts."""
+        for line in self._read_lines():
+            yield _loads(line)
+
+    def _read_entries(self) -> Iterator[AuditEntry]:
+        """Read all entries from log file."""
+        for line in self._read_lines():
+            data = _loads(line)
+            yield AuditEntry.from_dict(data)
 
     def log(
         self,
@@ -186,7 +557,8 @@ class AuditLogger:
         model_name: Optional[str] = None,
         duration_ms: Optional[int] = None,
         success: bool = True,
-        error_message: Optional[str] = None
+        error_message: Optional[str] = None,
+        timestamp: Optional[str] = None
     ) -> AuditEntry:
         """
         Log an auditable action.
@@ -201,10 +573,169 @@ class AuditLogger:
             duration_ms: Execution time in milliseconds
             success: Whether the action succeeded
             error_message: Error details if action failed
+            timestamp: When the action happened (ISO 8601 UTC, defaults to now)
 
         Returns:
             The created AuditEntry
         """
+        with self._lock:
+            final_entry, line = self._create_entry(
+                action=action,
+                agent_id=agent_id,
+                input_data=input_data,
+                output_data=output_data,
+                reasoning=reasoning,
+                model_name=model_name,
+                duration_ms=duration_ms,
+                success=success,
+                error_message=error_message,
+                timestamp=timestamp
+            )
+
+            # Append to log file
+            self._write(line, 1)
+
+        return final_entry
+
+    def log_many(self, events: List[dict]) -> List[AuditEntry]:
+        """
+        Log several actions with a single append to the log file.
+
+        Args:
+            events: Keyword arguments for log(), one dict per action
+
+        Returns:
+            The created AuditEntries, in order
+        """
+        with self._lock:
+            created = [self._create_entry(**event) for event in events]
+            self._write(b"".join(line for _, line in created), len(created))
+
+        return [entry for entry, _ in created]
+
+    def _refresh_index(self) -> None:
+        """Index entries appended to the log file since the last query."""
+        with self._lock:
+            self.flush()
+            try:
+                size = os.path.getsize(self.log_path)
+            except OSError:
+                size = 0
+            if size < self._indexed_offset:
+                # File was truncated or replaced: start over
+                self._entries = []
+                self._by_session, self._by_agent, self._by_action = {}, {}, {}
+                self._timestamps_ns = array("q")
+                self._timestamps_sorted = True
+                self._session_stats = {}
+                self._indexed_offset = 0
+            if size == self._indexed_offset:
+                return
+
+            with open(self.log_path, "rb") as f:
+                f.seek(self._indexed_offset)
+                data = f.read(size - self._indexed_offset)
+
+            # Leave a partially written last line for the next refresh
+            end = data.rfind(b"\n") + 1
+            timestamps = self._timestamps_ns
+            for line in data[:end].splitlines():
+                line = line.strip()
+                if not line:
+                    continue
+                entry = AuditEntry.from_dict(_loads(line))
+                position = len(self._entries)
+                self._entries.append(entry)
+                self._by_session.setdefault(entry.session_id, []).append(position)
+                self._by_agent.setdefault(entry.agent_id, []).append(position)
+                self._by_action.setdefault(entry.action, []).append(position)
+
+                stats = self._session_stats.get(entry.session_id)
+                if stats is None:
+                    stats = self._session_stats[entry.session_id] = _SessionStats()
+                stats.add(entry)
+
+                ts = _timestamp_ns(datetime.fromisoformat(entry.timestamp))
+                if timestamps and ts < timestamps[-1]:
+                    self._timestamps_sorted = False
+                timestamps.append(ts)
+            self._indexed_offset += end
+
+    def _time_window(
+        self,
+        positions: Optional[List[int]],
+        since_ns: int,
+        until_ns: int
+    ) -> Union[List[int], range]:
+        """Narrow entry positions (None = all) to since_ns <= t <= until_ns."""
+        timestamps = self._timestamps_ns
+        if not self._timestamps_sorted:
+            if positions is None:
+                positions = range(len(timestamps))
+            return [i for i in positions if since_ns <= timestamps[i] <= until_ns]
+
+        lo = bisect_left(timestamps, since_ns)
+        hi = bisect_right(timestamps, until_ns)
+        if positions is None:
+            return range(lo, hi)
+        return positions[bisect_left(positions, lo):bisect_left(positions, hi)]
+
+    def _write(self, data: bytes, count: int) -> None:
+        """Append count serialized entries, buffering them if batching."""
+        files = self._files
+        if self.batch_size <= 1:
+            files.append(data, self._sequence_num, self._last_hash)
+            return
+
+        if not files.buffer and self.batch_flush_ms is not None:
+            self._flush_timer = threading.Timer(self.batch_flush_ms / 1000, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+        files.buffer += data
+        files.buffered += count
+        files.chain = (self._sequence_num, self._last_hash)
+        if files.buffered >= self.batch_size or len(files.buffer) >= BATCH_MAX_BYTES:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write any buffered entries to the log."""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            self._files.flush()
+
+    def close(self) -> None:
+        """Close the log and sidecar descriptors (reopened by the next write)."""
+        with self._lock:
+            self.flush()
+            self._files.close()
+
+    def __enter__(self) -> "AuditLogger":
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def _create_entry(
+        self,
+        action: AuditAction,
+        agent_id: str,
+        input_data: Optional[Any] = None,
+        output_data: Optional[Any] = None,
+        reasoning: Optional[str] = None,
+        model_name: Optional[str] = None,
+        duration_ms: Optional[int] = None,
+        success: bool = True,
+        error_message: Optional[str] = None,
+        timestamp: Optional[str] = None
+    ) -> tuple[AuditEntry, bytes]:
+        """
+        Build the next hashed entry in the chain (caller holds the lock).
+
+        Returns:
+            The entry and its serialized log line
+        """
         self._sequence_num += 1
 
         # Serialize complex data types
@@ -213,58 +744,44 @@ class AuditLogger:
         if output_data is not None and not isinstance(output_data, str):
             output_data = json.dumps(output_data, default=str)
 
-        # Create entry without hash first
-        entry = AuditEntry(
-            timestamp=datetime.now(timezone.utc).isoformat(),
-            action=action.value,
-            agent_id=agent_id,
-            session_id=self.session_id,
-            input_data=input_data,
-            output_data=output_data,
-            reasoning=reasoning,
-            sequence_num=self._sequence_num,
-            previous_hash=self._last_hash,
-            entry_hash="",  # Placeholder
-            model_name=model_name,
-            duration_ms=duration_ms,
-            success=success,
-            error_message=error_message
-        )
+        # Collect fields without the hash first
+        data = {
+            "timestamp": timestamp or _utc_timestamp(),
+            "action": action.value,
+            "agent_id": agent_id,
+            "session_id": self.session_id,
+            "input_data": input_data,
+            "output_data": output_data,
+            "reasoning": reasoning,
+            "sequence_num": self._sequence_num,
+            "previous_hash": self._last_hash,
+            "model_name": model_name,
+            "duration_ms": duration_ms,
+            "success": success,
+            "error_message": error_message,
+        }
 
-        # Compute hash
-        entry_hash = compute_entry_hash(entry)
-
-        # Create final entry with hash (need new instance due to frozen)
-        final_entry = AuditEntry(
-            timestamp=entry.timestamp,
-            action=entry.action,
-            agent_id=entry.agent_id,
-            session_id=entry.session_id,
-            input_data=entry.input_data,
-            output_data=entry.output_data,
-            reasoning=entry.reasoning,
-            sequence_num=entry.sequence_num,
-            previous_hash=entry.previous_hash,
-            entry_hash=entry_hash,
-            model_name=entry.model_name,
-            duration_ms=entry.duration_ms,
-            success=entry.success,
-            error_message=entry.error_message
-        )
+        # Compute hash over the canonical bytes, then reuse them for the line
+        canonical = _canonicalize(data)
+        entry_hash = hashlib.sha256(canonical).hexdigest()
 
-        # Append to log file
-        with open(self.log_path, "a", encoding="utf-8") as f:
-            f.write(json.dumps(final_entry.to_dict()) + "\n")
+        # Construct the (frozen) entry once, hash included
+        data["entry_hash"] = entry_hash
+        final_entry = AuditEntry(**data)
 
         # Update chain state
         self._last_hash = entry_hash
 
-        return final_entry
+        return final_entry, _entry_line(canonical, entry_hash)
 
-    def verify_chain(self) -> tuple[bool, List[str]]:
+    def verify_chain(self, workers: int = 1) -> tuple[bool, List[str]]:
         """
         Verify the integrity of the audit log chain.
 
+        Args:
+            workers: Processes used to recompute entry hashes; values > 1
+                     only pay off for large logs (default: in-process)
+
         Returns:
             Tuple of (is_valid, list_of_errors)
         """
@@ -272,33 +789,68 @@ class AuditLogger:
         previous_hash = ""
         expected_sequence = 0
 
-        for entry in self._read_entries():
-            expected_sequence += 1
+        executor = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+        batch_size = PARALLEL_VERIFY_BATCH_SIZE if executor else VERIFY_BATCH_SIZE
+        in_flight: deque = deque()  # (batch, batch_errors, future), in file order
+
+        def check(batch: List[tuple], batch_errors: List[List[str]]) -> None:
+            if not batch:
+                return
+            if executor is None:
+                _verify_entry_hashes(batch, batch_errors, errors)
+                return
+            future = executor.submit(_hash_batch, [payload for _, _, payload in batch])
+            in_flight.append((batch, batch_errors, future))
+            # Bound memory: keep a couple of batches queued per worker
+            while len(in_flight) > 2 * workers:
+                done_batch, done_errors, done = in_flight.popleft()
+                _verify_entry_hashes(done_batch, done_errors, errors, done.result())
+
+        # Linkage is checked while reading; entry hashes are checked in
+        # batches, keeping each entry's errors together and in order.
+        # Lines are verified as parsed dicts, without building entries.
+        batch: List[tuple] = []
+        batch_errors: List[List[str]] = []
+
+        try:
+            for record in self._read_records():
+                if record.keys() != _ENTRY_FIELDS:
+                    # Fill defaults / reject unknown fields as AuditEntry would
+                    record = AuditEntry.from_dict(record).to_dict()
+                expected_sequence += 1
+                entry_errors = []
+                sequence_num = record["sequence_num"]
+                entry_hash = record.pop("entry_hash")
+
+                # Check sequence continuity
+                if sequence_num != expected_sequence:
+                    entry_errors.append(
+                        f"Sequence gap at {sequence_num}, expected {expected_sequence}"
+                    )
 
-            # Check sequence continuity
-            if entry.sequence_num != expected_sequence:
-                errors.append(
-                    f"Sequence gap at {entry.sequence_num}, expected {expected_sequence}"
-                )
+                # Check previous hash linkage
+                if record["previous_hash"] != previous_hash:
+                    entry_errors.append(
+                        f"Hash chain broken at sequence {sequence_num}: "
+                        f"expected previous_hash '{previous_hash[:16]}...', "
+                        f"got '{record['previous_hash'][:16]}...'"
+                    )
 
-            # Check previous hash linkage
-            if entry.previous_hash != previous_hash:
-                errors.append(
-                    f"Hash chain broken at sequence {entry.sequence_num}: "
-                    f"expected previous_hash '{previous_hash[:16]}...', "
-                    f"got '{entry.previous_hash[:16]}...'"
-                )
+                previous_hash = entry_hash
+                batch.append((sequence_num, entry_hash, _canonicalize(record)))
+                batch_errors.append(entry_errors)
 
-            # Verify entry's own hash
-            computed_hash = compute_entry_hash(entry)
-            if computed_hash != entry.entry_hash:
-                errors.append(
-                    f"Entry tampered at sequence {entry.sequence_num}: "
-                    f"computed hash '{computed_hash[:16]}...', "
-                    f"stored hash '{entry.entry_hash[:16]}...'"
-                )
+                if len(batch) >= batch_size:
+                    check(batch, batch_errors)
+                    batch, batch_errors = [], []
 
-            previous_hash = entry.entry_hash
+            check(batch, batch_errors)
+            while in_flight:
+                done_batch, done_errors, done = in_flight.popleft()
+                _verify_entry_hashes(done_batch, done_errors, errors, done.result())
+        finally:
+            if executor is not None:
+                executor.shutdown(cancel_futures=True)
 
         return (len(errors) == 0, errors)
 
@@ -323,28 +875,38 @@ class AuditLogger:
         Returns:
             List of matching entries
         """
-        results = []
-
-        for entry in self._read_entries():
-            # Apply filters
-            if session_id and entry.session_id != session_id:
-                continue
-            if agent_id and entry.agent_id != agent_id:
-                continue
-            if action and entry.action != action.value:
-                continue
-            if since:
-                entry_time = datetime.fromisoformat(entry.timestamp)
-                if entry_time < since:
-                    continue
-            if until:
-                entry_time = datetime.fromisoformat(entry.timestamp)
-                if entry_time > until:
-                    continue
-
-            results.append(entry)
+        with self._lock:
+            self._refresh_index()
+
+            # Each equality filter is a sorted posting list, so combining
+            # them is a C-level set intersection rather than a field
+            # comparison per entry
+            postings = []
+            if session_id:
+                postings.append(self._by_session.get(session_id, []))
+            if agent_id:
+                postings.append(self._by_agent.get(agent_id, []))
+            if action:
+                postings.append(self._by_action.get(action.value, []))
+            if len(postings) > 1:
+                postings.sort(key=len)
+                positions = sorted(set(postings[0]).intersection(*postings[1:]))
+            elif postings:
+                positions = postings[0]
+            else:
+                positions = None
+
+            # Time bounds compare against the indexed ns column
+            if since or until:
+                positions = self._time_window(
+                    positions,
+                    _timestamp_ns(since) if since else -2**63,
+                    _timestamp_ns(until) if until else 2**63 - 1
+                )
 
-        return results
+            if positions is None:
+                return list(self._entries)
+            return list(map(self._entries.__getitem__, positions))
 
     def export_session(
         self,
@@ -386,53 +948,232 @@ class AuditLogger:
         Returns:
             Summary dictionary with statistics
         """
-        entries = self.get_entries(session_id=session_id or self.session_id)
-
-        if not entries:
-            return {"total_entries": 0}
-
-        action_counts = {}
-        agent_counts = {}
-        total_duration = 0
-        failed_count = 0
-
-        for entry in entries:
-            # Count by action
-            action_counts[entry.action] = action_counts.get(entry.action, 0) + 1
-
-            # Count by agent
-            agent_counts[entry.agent_id] = agent_counts.get(entry.agent_id, 0) + 1
-
-            # Sum durations
-            if entry.duration_ms:
-                total_duration += entry.duration_ms
-
-            # Count failures
-            if not entry.success:
-                failed_count += 1
-
-        return {
-            "session_id": session_id or self.session_id,
-            "total_entries": len(entries),
-            "first_timestamp": entries[0].timestamp,
-            "last_timestamp": entries[-1].timestamp,
-            "action_counts": action_counts,
-            "agent_counts": agent_counts,
-            "total_duration_ms": total_duration,
-            "failed_count": failed_count,
-            "success_rate": (len(entries) - failed_count) / len(entries) * 100
-        }
+        session_id = session_id or self.session_id
 
+        # Totals are maintained as entries are indexed, so this is O(1)
+        # in the session's length
+        with self._lock:
+            self._refresh_index()
+            stats = self._session_stats.get(session_id)
+            if stats is None:
+                return {"total_entries": 0}
+            positions = self._by_session[session_id]
+            total = len(positions)
+
+            return {
+                "session_id": session_id,
+                "total_entries": total,
+                "first_timestamp": self._entries[positions[0]].timestamp,
+                "last_timestamp": self._entries[positions[-1]].timestamp,
+                "action_counts": dict(stats.action_counts),
+                "agent_counts": dict(stats.agent_counts),
+                "total_duration_ms": stats.total_duration_ms,
+                "failed_count": stats.failed_count,
+                "success_rate": (total - stats.failed_count) / total * 100
+            }
+
+
+def _overwrite(fd: int, data: bytes) -> None:
+    """Write data at the start of a fixed-width sidecar file."""
+    if hasattr(os, "pwrite"):
+        os.pwrite(fd, data, 0)
+    else:
+        os.lseek(fd, 0, os.SEEK_SET)
+        os.write(fd, data)
+
+
+def _verify_entry_hashes(
+    batch: List[tuple],
+    entry_errors: List[List[str]],
+    errors: List[str],
+    computed: Optional[List[str]] = None
+) -> None:
+    """
+    Verify a batch of entries' own hashes, extending errors in entry order.
 
-def verify_audit_file(log_path: str) -> tuple[bool, List[str]]:
+    Args:
+        batch: (sequence_num, stored entry_hash, canonical payload) per entry
+        entry_errors: Linkage errors already found, one list per entry
+        errors: Output list of all errors
+        computed: Digests already computed for the batch (e.g. by a worker)
+    """
+    if computed is None:
+        computed = _hash_batch([payload for _, _, payload in batch])
+
+    for (sequence_num, entry_hash, _), own_errors, computed_hash in zip(
+        batch, entry_errors, computed
+    ):
+        # Verify entry's own hash
+        if computed_hash != entry_hash:
+            own_errors.append(
+                f"Entry tampered at sequence {sequence_num}: "
+                f"computed hash '{computed_hash[:16]}...', "
+                f"stored hash '{entry_hash[:16]}...'"
+            )
+        errors.extend(own_errors)
+
+
+def _flush_at_exit() -> None:
+    """Write what async writers and batching loggers still hold at exit."""
+    # Writers first: they write into loggers that may batch
+    for writer in list(_async_writers):
+        writer.close()
+    for logger in list(_batching_loggers):
+        logger.flush()
+
+
+atexit.register(_flush_at_exit)
+
+
+class AsyncAuditWriter:
+    """
+    Background writer for non-critical audit events.
+
+    log() only enqueues the event (with its timestamp taken at enqueue
+    time); a daemon thread writes queued events in batches through
+    AuditLogger.log_many. Call flush() before logging anything that must
+    appear after the queued events, e.g. an approval decision.
+
+    Usage:
+        writer = AsyncAuditWriter(logger)
+        writer.log(action=AuditAction.APPROVAL_REQUESTED, agent_id="agent")
+        writer.flush()  # Everything queued so far is now on disk
+    """
+
+    def __init__(self, logger: AuditLogger, maxsize: int = 0):
+        """
+        Initialize the writer and start its thread.
+
+        Args:
+            logger: Audit logger that performs the writes
+            maxsize: Queue bound; log() blocks when full (0 = unbounded)
+        """
+        self.logger = logger
+        self._queue: queue.Queue = queue.Queue(maxsize)
+        self._errors: List[BaseException] = []  # First write error, if any
+        self._closed = False
+
+        # The thread holds only the queue, logger and error list, so an
+        # unreferenced writer is collected; its finalizer then stops the
+        # thread once the queued events are written
+        self._thread = threading.Thread(
+            target=_drain_audit_queue,
+            args=(self._queue, logger, self._errors),
+            name="audit-writer",
+            daemon=True
+        )
+        self._thread.start()
+        self._stop = weakref.finalize(self, self._queue.put, None)
+        self._stop.atexit = False
+        _async_writers.add(self)
+
+    def log(self, action: AuditAction, agent_id: str, **kwargs: Any) -> None:
+        """Queue an event; accepts the same arguments as AuditLogger.log."""
+        if self._closed:
+            self.logger.log(action=action, agent_id=agent_id, **kwargs)
+            return
+        kwargs.setdefault("timestamp", _utc_timestamp())
+        self._queue.put({"action": action, "agent_id": agent_id, **kwargs})
+
+    def flush(self) -> None:
+        """
+        Block until every event queued so far has been written.
+
+        Raises:
+            The first error the background thread hit while writing
+        """
+        if not self._closed:
+            done = threading.Event()
+            self._queue.put(done)
+            done.wait()
+
+        if self._errors:
+            raise self._errors.pop()
+
+    def close(self) -> None:
+        """Flush pending events and stop the background thread."""
+        if self._closed:
+            return
+        self.flush()
+        self._closed = True
+        # Not self._stop(): finalizers are disabled once exit handling starts
+        self._stop.detach()
+        self._queue.put(None)
+        self._thread.join()
+        _async_writers.discard(self)
+
+
+def _drain_audit_queue(
+    events: queue.Queue,
+    logger: AuditLogger,
+    errors: List[BaseException]
+) -> None:
+    """AsyncAuditWriter thread: write each batch with one log_many call."""
+    while True:
+        items = [events.get()]
+        while True:
+            try:
+                items.append(events.get_nowait())
+            except queue.Empty:
+                break
+
+        batch = [item for item in items if isinstance(item, dict)]
+        if batch:
+            try:
+                logger.log_many(batch)
+            except Exception as e:
+                if not errors:
+                    errors.append(e)
+
+        for item in items:
+            if isinstance(item, threading.Event):
+                item.set()
+        if None in items:
+            return
+
+
+def verify_audit_file(log_path: str, workers: int = 1) -> tuple[bool, List[str]]:
     """
     Standalone function to verify an audit log file.
 
     Args:
         log_path: Path to JSON Lines audit file
+        workers: Processes used to recompute entry hashes
 
     Returns:
         Tuple of (is_valid, list_of_errors)
     """
     logger = AuditLogger(log_path, auto_verify=False)
-    return logger.verify_chain()
+    return logger.verify_chain(workers=workers)
+
+
+def verify_audit_file_quick(log_path: str) -> tuple[bool, List[str]]:
+    """
+    Check an audit log against its .sha256 sidecar in one hashing pass.
+
+    Only available for logs written with track_digest=True. A mismatch
+    means the file changed outside its logger (or another process
+    appended to it); use verify_audit_file to locate the problem.
+
+    Args:
+        log_path: Path to JSON Lines audit file
+
+    Returns:
+        Tuple of (is_valid, list_of_errors)
+    """
+    path = Path(log_path)
+    sidecar = path.with_name(path.name + ".sha256")
+    try:
+        recorded = sidecar.read_text(encoding="utf-8").split()[0]
+    except (OSError, IndexError):
+        return (False, [f"No digest recorded in {sidecar}"])
+
+    with open(path, "rb") as f:
+        computed = hashlib.file_digest(f, "sha256").hexdigest()
+
+    if computed != recorded:
+        return (False, [
+            f"File digest mismatch: computed '{computed[:16]}...', "
+            f"recorded '{recorded[:16]}...'"
+        ])
+    return (True, [])
@@ -6,9 +6,11 @@ for compliance in regulated industries.
 """
 
 import os
+import re
+from functools import lru_cache
 from pathlib import Path
 from dataclasses import dataclass, field
-from typing import List, Optional
+from typing import List, Optional, Pattern, FrozenSet, Tuple
 
 
 @dataclass
@@ -87,6 +89,48 @@ class FrameworkConfig:
 
         return issues
 
+    def blocked_pattern(self, command: str) -> Optional[str]:
+        """
+        Find the first blocked pattern contained in a command.
+
+        All patterns are matched in one pass by a cached, precompiled regex.
+
+        Returns:
+            The matching pattern, or None if the command is not blocked
+        """
+        regex = compile_blocked_patterns(tuple(self.blocked_patterns))
+        match = regex.search(command) if regex else None
+        return match.group(0) if match else None
+
+    def is_blocked(self, command: str) -> bool:
+        """Whether a command contains any blocked pattern."""
+        return self.blocked_pattern(command) is not None
+
+    def is_allowed(self, command: str) -> bool:
+        """Whether a command's base command is in allowed_shell_commands."""
+        parts = command.split(maxsplit=1)
+        commands = allowed_command_set(tuple(self.allowed_shell_commands))
+        return bool(parts) and parts[0] in commands
+
+
+@lru_cache(maxsize=32)
+def compile_blocked_patterns(patterns: Tuple[str, ...]) -> Optional[Pattern[str]]:
+    """
+    Compile literal patterns into one alternation (longest first).
+
+    Cached by pattern tuple; also used by ToolRegistry's shell checks.
+    """
+    if not patterns:
+        return None
+    ordered = sorted(set(patterns), key=len, reverse=True)
+    return re.compile("|".join(re.escape(p) for p in ordered))
+
+
+@lru_cache(maxsize=32)
+def allowed_command_set(commands: Tuple[str, ...]) -> FrozenSet[str]:
+    """Frozen set of allowed command names (cached by command tuple)."""
+    return frozenset(commands)
+
 
 # Default configuration
 DEFAULT_CONFIG = FrameworkConfig()
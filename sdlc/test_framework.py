@@ -4,32 +4,120 @@ Test script for SDLC Framework.
 
 Tests:
 1. Audit logging with hash chain verification
-2. Human approval interface (auto-approve mode)
+2. Human approval interface (auto-approve mode, non-blocking resolve)
 3. Requirements Analyst agent
 4. Test Generator agent
 5. Documentation Generator agent
 6. Tool registry
 """
 
+import asyncio
+import contextlib
+import dataclasses
+import difflib
+import gc
+import hashlib
+import io
 import json
 import os
+import re
 import sys
 import tempfile
+import threading
+import time
+import weakref
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
 from pathlib import Path
+from unittest import mock
 
 # Add parent to path for imports
 sys.path.insert(0, str(Path(__file__).parent.parent))
 
-from sdlc.audit import AuditLogger, AuditAction, verify_audit_file
-from sdlc.approval import ApprovalGate, ApprovalStatus
+from sdlc.audit import (
+    AuditLogger, AuditAction, AuditEntry, AsyncAuditWriter, compute_entry_hash,
+    verify_audit_file, verify_audit_file_quick, TAIL_READ_SIZE, _canonicalize,
+    _utc_timestamp
+)
+from sdlc.approval import (
+    ApprovalGate, ApprovalStatus, ApprovalResponse, MMAP_THRESHOLD,
+    _pjson, _render_diff, _unified_diff
+)
 from sdlc.config import FrameworkConfig, get_config
-from sdlc.tools.registry import ToolRegistry
+from sdlc.tools.registry import (
+    MAX_SEARCH_RESULTS, MAX_SHELL_LINE_LENGTH, MAX_SHELL_OUTPUT_LINES, ToolRegistry,
+    _CMD_PATH_CACHE, _extract_literal, _glob_matcher, _preview, _resolve, _shell_target,
+    _walk_files
+)
 from sdlc.agents.base import AgentConfig
 from sdlc.agents.requirements import RequirementsAnalystAgent
 from sdlc.agents.test_generator import TestGeneratorAgent
 from sdlc.agents.documentation_generator import DocGeneratorAgent
 
 
+def _write_legacy_log(log_path, count, session_id="legacy_session"):
+    """Write a log the way AuditLogger did before hashing was reworked."""
+    previous_hash = ""
+    with open(log_path, "a", encoding="utf-8") as f:
+        for i in range(1, count + 1):
+            data = {
+                "timestamp": f"2024-01-01T00:00:{i:02d}.000000+00:00",
+                "action": AuditAction.TOOL_CALLED.value,
+                "agent_id": "legacy_agent",
+                "session_id": session_id,
+                "input_data": json.dumps({"step": i, "note": "café"}),
+                "output_data": None,
+                "reasoning": f"Step {i} ✓",
+                "sequence_num": i,
+                "previous_hash": previous_hash,
+                "model_name": None,
+                "duration_ms": i * 10,
+                "success": i % 2 == 1,
+                "error_message": None,
+            }
+            canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+            data["entry_hash"] = hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+            f.write(json.dumps(data) + "\n")
+            previous_hash = data["entry_hash"]
+
+
+def _write_tampered_log(tmpdir):
+    """Write a 600-entry log, edit entries 10 and 300 and relink entry 520."""
+    log_path = os.path.join(tmpdir, "tampered_audit.jsonl")
+    with AuditLogger(log_path) as logger:
+        logger.log_many([
+            {"action": AuditAction.TOOL_CALLED, "agent_id": "test_agent", "input_data": {"i": i}}
+            for i in range(600)
+        ])
+
+    lines = Path(log_path).read_text(encoding="utf-8").splitlines(keepends=True)
+    for index in (9, 299):
+        lines[index] = lines[index].replace('"agent_id":"test_agent"', '"agent_id":"intruder"')
+    record = json.loads(lines[519])
+    lines[519] = lines[519].replace(record["previous_hash"], "0" * 64)
+    Path(log_path).write_text("".join(lines), encoding="utf-8")
+    return log_path
+
+
+def _populate_query_log(log_path):
+    """Log 60 entries across two sessions, three agents and three actions."""
+    actions = [AuditAction.TOOL_CALLED, AuditAction.TOOL_RESULT, AuditAction.AGENT_FAILED]
+    for session_id in ("session_a", "session_b"):
+        with AuditLogger(log_path, session_id=session_id) as logger:
+            logger.log_many([
+                {
+                    "action": actions[i % 3],
+                    "agent_id": f"agent_{i % 4 % 3}",
+                    "timestamp": f"2024-03-01T{i % 24:02d}:{i:02d}:00.000000+00:00",
+                    "duration_ms": i,
+                    "success": i % 3 != 2,
+                }
+                for i in range(30)
+            ])
+    return AuditLogger(log_path, session_id="session_a")
+
+
 def test_audit_logging():
     """Test audit logging and hash chain verification."""
     print("\n" + "=" * 60)
@@ -85,6 +173,793 @@ def test_audit_logging():
         print("\n  [PASS] Audit logging works correctly")
 
 
+def test_audit_hash_compatibility():
+    """Test that entry hashes and lines match logs written before the rewrite."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Hash Compatibility")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "legacy_audit.jsonl")
+        _write_legacy_log(log_path, 5)
+
+        # Logs written with json.dumps(sort_keys) + hashlib.sha256 verify
+        is_valid, errors = verify_audit_file(log_path)
+        print(f"  Legacy log valid: {is_valid}")
+        assert is_valid and not errors
+
+        # ... and new entries extend their chain with the same hash scheme
+        logger = AuditLogger(log_path)
+        entry = logger.log(
+            action=AuditAction.TOOL_CALLED,
+            agent_id="test_agent",
+            input_data={"path": "naïve.py", "lines": [1, 2]},
+            reasoning="Ünïcode ✓",
+            duration_ms=12,
+            success=False
+        )
+        logger.close()
+        data = entry.to_dict()
+        del data["entry_hash"]
+        canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+        assert entry.entry_hash == hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+        assert compute_entry_hash(entry) == entry.entry_hash
+        assert compute_entry_hash(entry.to_dict()) == entry.entry_hash
+        assert entry.sequence_num == 6
+
+        last_line = Path(log_path).read_text(encoding="utf-8").splitlines()[-1]
+        assert json.loads(last_line) == entry.to_dict()
+        assert verify_audit_file(log_path)[0]
+
+        print("\n  [PASS] Audit hashes are compatible with existing logs")
+
+
+def test_audit_tamper_detection():
+    """Test that verification reports every tampered entry, in order."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Tamper Detection")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = _write_tampered_log(tmpdir)
+        is_valid, errors = verify_audit_file(log_path)
+        for error in errors:
+            print(f"  {error[:60]}...")
+
+        # Edits in different hash batches; linkage errors precede an
+        # entry's own hash error
+        assert not is_valid
+        assert [e.split(":")[0] for e in errors] == [
+            "Entry tampered at sequence 10",
+            "Entry tampered at sequence 300",
+            "Hash chain broken at sequence 520",
+            "Entry tampered at sequence 520",
+        ]
+
+        print("\n  [PASS] Tampering is detected")
+
+
+def test_audit_append_descriptor():
+    """Test that entries are appended through one persistent descriptor."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Append Descriptor")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "append_audit.jsonl")
+        logger = AuditLogger(log_path)
+        logger.log(action=AuditAction.AGENT_INVOKED, agent_id="test_agent")
+        fd = logger._files.fd
+
+        for _ in range(5):
+            logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent")
+        assert logger._files.fd == fd
+        print(f"  6 entries written through fd {fd}")
+
+        # close() releases the descriptor; the next write reopens it
+        logger.close()
+        assert logger._files.fd is None
+        logger.log(action=AuditAction.AGENT_COMPLETED, agent_id="test_agent")
+        logger.close()
+
+        lines = Path(log_path).read_text(encoding="utf-8").splitlines()
+        assert [json.loads(line)["sequence_num"] for line in lines] == list(range(1, 8))
+        assert verify_audit_file(log_path)[0]
+
+        print("\n  [PASS] Append descriptor works correctly")
+
+
+def test_audit_query_index():
+    """Test that queries pick up appends, partial lines and replaced files."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Query Index")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "index_audit.jsonl")
+        first = AuditLogger(log_path, session_id="first")
+        for _ in range(3):
+            first.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent")
+        assert len(first.get_entries()) == 3
+        first.close()
+
+        # Entries appended by another logger show up in the next query
+        second = AuditLogger(log_path, session_id="second")
+        second.log(action=AuditAction.AGENT_COMPLETED, agent_id="other_agent")
+        second.close()
+        entries = first.get_entries()
+        assert [e.sequence_num for e in entries] == [1, 2, 3, 4]
+        assert first.get_entries(session_id="second")[0].agent_id == "other_agent"
+
+        # A partially written line waits until it is complete
+        line = Path(log_path).read_bytes().splitlines(keepends=True)[-1]
+        with open(log_path, "ab") as f:
+            f.write(line[:20])
+        assert len(first.get_entries()) == 4
+        with open(log_path, "ab") as f:
+            f.write(line[20:])
+        assert len(first.get_entries()) == 5
+
+        # A replaced (shorter) file is re-indexed from scratch
+        os.unlink(log_path)
+        _write_legacy_log(log_path, 2)
+        entries = first.get_entries()
+        print(f"  After replacement: {[e.session_id for e in entries]}")
+        assert [e.session_id for e in entries] == ["legacy_session"] * 2
+
+        export_path = first.export_session("legacy_session", os.path.join(tmpdir, "export.jsonl"))
+        exported = [json.loads(l) for l in Path(export_path).read_text().splitlines()]
+        assert exported == [e.to_dict() for e in entries]
+
+        print("\n  [PASS] Query index works correctly")
+
+
+def test_audit_line_format():
+    """Test that each log line is the hashed canonical JSON plus its hash."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Line Format")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "format_audit.jsonl")
+        with AuditLogger(log_path) as logger:
+            entries = [logger.log(
+                action=AuditAction.TOOL_CALLED,
+                agent_id="test_agent",
+                input_data={"path": Path("src/naïve.py")},
+                reasoning="Ünïcode ✓ \"quoted\""
+            )]
+            entries += logger.log_many([
+                {"action": AuditAction.TOOL_CALLED, "agent_id": "test_agent", "duration_ms": 5},
+                {"action": AuditAction.TOOL_RESULT, "agent_id": "test_agent", "success": False},
+            ])
+
+        raw = Path(log_path).read_bytes()
+        assert raw.isascii()
+        for entry, line in zip(entries, raw.decode("ascii").splitlines()):
+            data = entry.to_dict()
+            entry_hash = data.pop("entry_hash")
+            canonical = json.dumps(data, sort_keys=True, separators=(",", ":"))
+            assert line == canonical[:-1] + f',"entry_hash":"{entry_hash}"}}'
+        assert json.loads(entries[0].input_data) == {"path": "src/naïve.py"}
+        print(f"  {len(entries)} lines match canonical JSON")
+
+        print("\n  [PASS] Audit line format is canonical")
+
+
+def test_audit_returned_entries():
+    """Test that log() returns the frozen entry exactly as stored."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Returned Entries")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "returned_audit.jsonl"))
+        first = logger.log(
+            action=AuditAction.LLM_REQUEST,
+            agent_id="test_agent",
+            input_data="prompt",
+            model_name="gemma2:2b",
+            timestamp="2024-05-01T12:00:00+00:00"
+        )
+        second = logger.log(action=AuditAction.LLM_RESPONSE, agent_id="test_agent")
+
+        assert logger.get_entries() == [first, second]
+        assert first.timestamp == "2024-05-01T12:00:00+00:00"
+        assert second.previous_hash == first.entry_hash
+        assert compute_entry_hash(second) == second.entry_hash
+        try:
+            first.reasoning = "rewritten"
+            raise AssertionError("audit entries must be immutable")
+        except dataclasses.FrozenInstanceError:
+            pass
+        print("  Returned entries match the log and are frozen")
+
+        print("\n  [PASS] Returned entries are correct")
+
+
+def test_audit_verify_records():
+    """Test verification of lines whose fields differ from the writer's."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Verify (Record Shapes)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "records_audit.jsonl")
+        with AuditLogger(log_path) as logger:
+            for _ in range(3):
+                logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent")
+        records = [json.loads(line) for line in Path(log_path).read_text().splitlines()]
+
+        def verify(*edited):
+            with open(log_path, "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(r, indent=None) + "\n" for r in edited)
+            return verify_audit_file(log_path)
+
+        # Key order and whitespace do not matter
+        assert verify(records[0], dict(reversed(list(records[1].items()))), records[2])[0]
+
+        # Missing fields take the entry defaults
+        trimmed = {k: v for k, v in records[2].items() if k != "error_message"}
+        assert verify(records[0], records[1], trimmed)[0]
+
+        # Unknown fields are rejected, as when building an AuditEntry
+        try:
+            verify(records[0], records[1], dict(records[2], extra=1))
+            raise AssertionError("unknown fields should be rejected")
+        except TypeError as e:
+            print(f"  Unknown field: {e}")
+
+        print("\n  [PASS] Record verification works correctly")
+
+
+def test_audit_state_sidecar():
+    """Test resuming the hash chain from the .state sidecar."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit State Sidecar")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "state_audit.jsonl")
+        with AuditLogger(log_path) as logger:
+            logger.log(action=AuditAction.AGENT_INVOKED, agent_id="test_agent")
+            last = logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent")
+
+        state_path = Path(log_path + ".state")
+        size = os.path.getsize(log_path)
+        print(f"  State: {state_path.read_text().strip()[:40]}...")
+        assert state_path.read_text() == f"{2:020d}:{last.entry_hash}:{size:020d}\n"
+        assert state_path.stat().st_mode & 0o777 == 0o600
+
+        # The sidecar, not the log, supplies the chain position
+        fake_hash = "f" * 64
+        state_path.write_text(f"{7:020d}:{fake_hash}:{size:020d}\n")
+        resumed = AuditLogger(log_path, auto_verify=False)
+        entry = resumed.log(action=AuditAction.AGENT_COMPLETED, agent_id="test_agent")
+        resumed.close()
+        assert (entry.sequence_num, entry.previous_hash) == (8, fake_hash)
+
+        # A sidecar for a different file size, or a corrupt one, is ignored
+        for stale in (f"{7:020d}:{fake_hash}:{1:020d}\n", "garbage"):
+            state_path.write_text(stale)
+            logger = AuditLogger(log_path, auto_verify=False)
+            assert logger._sequence_num == 8 and logger._last_hash == entry.entry_hash
+            logger.close()
+
+        print("\n  [PASS] State sidecar works correctly")
+
+
+def test_audit_parallel_verify():
+    """Test that verifying with worker processes matches in-process results."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Parallel Verify")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = _write_tampered_log(tmpdir)
+        expected = verify_audit_file(log_path)
+
+        # Small batches, so several are in flight across the workers
+        with mock.patch("sdlc.audit.PARALLEL_VERIFY_BATCH_SIZE", 64):
+            result = verify_audit_file(log_path, workers=2)
+        print(f"  workers=2: {len(result[1])} errors, same as in-process")
+        assert result == expected
+
+        valid_path = os.path.join(tmpdir, "valid_audit.jsonl")
+        _write_legacy_log(valid_path, 50)
+        with mock.patch("sdlc.audit.PARALLEL_VERIFY_BATCH_SIZE", 16):
+            assert verify_audit_file(valid_path, workers=2) == (True, [])
+
+        print("\n  [PASS] Parallel verify works correctly")
+
+
+def test_audit_read_lines():
+    """Test reading logs with blank lines, CRLF endings and no final newline."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Log Reading")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "read_audit.jsonl")
+
+        # An existing empty file is a valid, empty log
+        Path(log_path).touch()
+        with AuditLogger(log_path) as logger:
+            assert logger.verify_chain() == (True, [])
+            assert list(logger._read_entries()) == []
+
+        _write_legacy_log(os.path.join(tmpdir, "source.jsonl"), 3)
+        lines = Path(tmpdir, "source.jsonl").read_text(encoding="utf-8").splitlines()
+        Path(log_path).write_text(
+            "\n" + lines[0] + "\r\n  \n" + lines[1] + "\n\n" + lines[2],
+            encoding="utf-8"
+        )
+        is_valid, errors = verify_audit_file(log_path)
+        assert is_valid and not errors
+
+        logger = AuditLogger(log_path, auto_verify=False)
+        entries = list(logger._read_entries())
+        print(f"  Read {len(entries)} entries")
+        assert [e.sequence_num for e in entries] == [1, 2, 3]
+        assert entries[2].reasoning == "Step 3 ✓"
+        logger.close()
+
+        print("\n  [PASS] Log reading works correctly")
+
+
+def test_audit_timestamps():
+    """Test that cached-prefix timestamps match datetime.isoformat()."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Timestamps")
+    print("=" * 60)
+
+    # Straddle an hour (and day) boundary to exercise the prefix cache
+    moments = [
+        datetime(2024, 12, 31, 23, 59, 59, 999999, tzinfo=timezone.utc),
+        datetime(2025, 1, 1, 0, 0, 0, 0, tzinfo=timezone.utc),
+        datetime(2025, 1, 1, 0, 59, 7, 120, tzinfo=timezone.utc),
+        datetime(2025, 1, 1, 1, 0, 0, 5, tzinfo=timezone.utc),
+    ]
+    for moment in moments:
+        seconds = int(moment.replace(microsecond=0).timestamp())
+        ns = seconds * 1_000_000_000 + moment.microsecond * 1000
+        with mock.patch("time.time_ns", return_value=ns + 999):
+            stamp = _utc_timestamp()
+        assert stamp == moment.isoformat(timespec="microseconds"), stamp
+        assert datetime.fromisoformat(stamp) == moment
+    print(f"  e.g. {stamp}")
+
+    now = datetime.fromisoformat(_utc_timestamp())
+    assert abs((datetime.now(timezone.utc) - now).total_seconds()) < 5
+
+    print("\n  [PASS] Audit timestamps are correct")
+
+
+def test_audit_logger_lifetime():
+    """Test descriptor release on close/exit/collection and file permissions."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Logger Lifetime")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "lifetime_audit.jsonl")
+        with AuditLogger(log_path, track_digest=True) as logger:
+            logger.log(action=AuditAction.AGENT_INVOKED, agent_id="test_agent")
+            files = logger._files
+            assert None not in (files.fd, files.state_fd, files.digest_fd)
+        assert (files.fd, files.state_fd, files.digest_fd) == (None, None, None)
+
+        # Log and sidecars are created readable by the owner only
+        for path in (log_path, log_path + ".state", log_path + ".sha256"):
+            assert os.stat(path).st_mode & 0o777 == 0o600, path
+
+        # An unclosed logger's descriptors are released when it is collected
+        logger = AuditLogger(log_path)
+        logger.log(action=AuditAction.AGENT_COMPLETED, agent_id="test_agent")
+        fd = logger._files.fd
+        del logger
+        gc.collect()
+        try:
+            os.fstat(fd)
+            raise AssertionError("descriptor left open after collection")
+        except OSError:
+            pass
+        print("  Descriptors released on exit and collection")
+
+        assert verify_audit_file(log_path)[0]
+
+        print("\n  [PASS] Audit logger lifetime is correct")
+
+
+def test_audit_canonicalizer():
+    """Test the schema-specialized canonicalizer against json.dumps."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Canonicalizer")
+    print("=" * 60)
+
+    base = {
+        "timestamp": "2024-01-01T00:00:00+00:00",
+        "action": "tool_called",
+        "agent_id": "test_agent",
+        "session_id": "s",
+        "input_data": None,
+        "output_data": None,
+        "reasoning": None,
+        "sequence_num": 1,
+        "previous_hash": "",
+        "model_name": None,
+        "duration_ms": None,
+        "success": True,
+        "error_message": None,
+    }
+    variants = [
+        {},
+        {"reasoning": "tab\t quote\" slash\\ nul\x00 é ✓ 𝄞 \udc80"},
+        {"sequence_num": 2 ** 80, "duration_ms": 0, "success": False},
+        {"duration_ms": 12.5, "model_name": ["list", {"b": 1, "a": None}]},
+        {"success": 1, "input_data": "{\"k\": 1}"},
+    ]
+    for changes in variants:
+        data = dict(base, **changes)
+        expected = json.dumps(data, sort_keys=True, separators=(",", ":")).encode("utf-8")
+        assert _canonicalize(data) == expected, changes
+
+    # Other shapes fall back to json.dumps
+    partial = {"b": 1, "a": "é"}
+    assert _canonicalize(partial) == b'{"a":"\\u00e9","b":1}'
+    print(f"  {len(variants)} entry variants match json.dumps")
+
+    print("\n  [PASS] Audit canonicalizer matches json.dumps")
+
+
+def test_audit_digest_sidecar():
+    """Test the whole-file digest sidecar and quick verification."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Digest Sidecar")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "digest_audit.jsonl")
+
+        # Start from an existing log; the digest is seeded with its contents
+        _write_legacy_log(log_path, 3)
+        assert verify_audit_file_quick(log_path)[0] is False
+        with AuditLogger(log_path, track_digest=True) as logger:
+            logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent")
+            logger.log_many([{"action": AuditAction.TOOL_RESULT, "agent_id": "test_agent"}] * 2)
+
+        # Same format as sha256sum
+        digest = hashlib.sha256(Path(log_path).read_bytes()).hexdigest()
+        sidecar = Path(log_path + ".sha256").read_text()
+        print(f"  Sidecar: {sidecar.strip()[:40]}...")
+        assert sidecar == f"{digest}  digest_audit.jsonl\n"
+        assert verify_audit_file_quick(log_path) == (True, [])
+
+        # Any change to the file is caught
+        data = Path(log_path).read_bytes()
+        Path(log_path).write_bytes(data.replace(b"legacy_agent", b"legacy_agenT", 1))
+        is_valid, errors = verify_audit_file_quick(log_path)
+        assert not is_valid and errors[0].startswith("File digest mismatch")
+
+        print("\n  [PASS] Digest sidecar works correctly")
+
+
+def test_audit_entry_slots():
+    """Test that slotted entries keep the dict round-trip and field order."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Entry Slots")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with AuditLogger(os.path.join(tmpdir, "slots_audit.jsonl")) as logger:
+            entry = logger.log(
+                action=AuditAction.TOOL_CALLED,
+                agent_id="test_agent",
+                input_data={"tool": "read_file"},
+                duration_ms=3
+            )
+
+    assert not hasattr(entry, "__dict__")
+    data = entry.to_dict()
+    assert list(data) == [
+        "timestamp", "action", "agent_id", "session_id", "input_data", "output_data",
+        "reasoning", "sequence_num", "previous_hash", "entry_hash", "model_name",
+        "duration_ms", "success", "error_message",
+    ]
+    copy = AuditEntry.from_dict(data)
+    assert copy == entry and hash(copy) == hash(entry)
+    assert {entry, copy} == {entry}
+    print("  Entries round-trip and hash by value")
+
+    print("\n  [PASS] Audit entry slots work correctly")
+
+
+def test_audit_query_filters():
+    """Test combined get_entries filters against a linear scan."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Query Filters")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = _populate_query_log(os.path.join(tmpdir, "filters_audit.jsonl"))
+        everything = logger.get_entries()
+        assert len(everything) == 60
+
+        checked = 0
+        for session_id in (None, "session_a", "session_b", "missing"):
+            for agent_id in (None, "agent_0", "agent_2"):
+                for action in (None, AuditAction.TOOL_CALLED, AuditAction.AGENT_FAILED):
+                    expected = [
+                        e for e in everything
+                        if (session_id is None or e.session_id == session_id)
+                        and (agent_id is None or e.agent_id == agent_id)
+                        and (action is None or e.action == action.value)
+                    ]
+                    assert logger.get_entries(
+                        session_id=session_id, agent_id=agent_id, action=action
+                    ) == expected
+                    checked += 1
+        print(f"  {checked} filter combinations match a linear scan")
+        logger.close()
+
+        print("\n  [PASS] Query filters work correctly")
+
+
+def test_audit_time_range():
+    """Test since/until filters on sorted and out-of-order logs."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Time Range Queries")
+    print("=" * 60)
+
+    def expected(entries, since, until):
+        return [
+            e for e in entries
+            if (since is None or datetime.fromisoformat(e.timestamp) >= since)
+            and (until is None or datetime.fromisoformat(e.timestamp) <= until)
+        ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        # Out of order (timestamps wrap around midnight), then in order
+        unsorted = _populate_query_log(os.path.join(tmpdir, "unsorted_audit.jsonl"))
+        ordered = AuditLogger(os.path.join(tmpdir, "sorted_audit.jsonl"))
+        ordered.log_many([
+            {
+                "action": AuditAction.TOOL_CALLED,
+                "agent_id": "test_agent",
+                "timestamp": f"2024-03-01T10:{i:02d}:00.{i:06d}+00:00",
+            }
+            for i in range(40)
+        ])
+
+        ranges = [
+            (datetime(2024, 3, 1, 3, tzinfo=timezone.utc), None),
+            (None, datetime(2024, 3, 1, 10, 5, tzinfo=timezone.utc)),
+            # Bounds are inclusive, to the microsecond
+            (datetime(2024, 3, 1, 10, 5, 0, 5, tzinfo=timezone.utc),
+             datetime(2024, 3, 1, 10, 20, 0, 20, tzinfo=timezone.utc)),
+            # Naive datetimes are UTC; other offsets are converted
+            (datetime(2024, 3, 1, 4), datetime(2024, 3, 1, 12, 30)),
+            (datetime(2024, 3, 1, 12, tzinfo=timezone(timedelta(hours=2))), None),
+        ]
+        for logger in (unsorted, ordered):
+            entries = logger.get_entries()
+            for since, until in ranges:
+                aware = [
+                    b if b is None or b.tzinfo else b.replace(tzinfo=timezone.utc)
+                    for b in (since, until)
+                ]
+                got = logger.get_entries(since=since, until=until)
+                assert got == expected(entries, *aware), (since, until)
+            logger.close()
+        assert len(ordered.get_entries(since=ranges[2][0], until=ranges[2][1])) == 16
+
+        # Time bounds combine with equality filters
+        since = ranges[0][0]
+        in_session = [
+            e for e in expected(unsorted.get_entries(), since, None)
+            if e.session_id == "session_b"
+        ]
+        assert unsorted.get_entries(session_id="session_b", since=since) == in_session
+        print(f"  {len(ranges)} ranges match on sorted and unsorted logs")
+
+        print("\n  [PASS] Time range queries work correctly")
+
+
+def test_audit_summary():
+    """Test incrementally maintained session summaries."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Session Summary")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = _populate_query_log(os.path.join(tmpdir, "summary_audit.jsonl"))
+
+        def recount(session_id):
+            entries = logger.get_entries(session_id=session_id)
+            failed = sum(not e.success for e in entries)
+            return {
+                "session_id": session_id,
+                "total_entries": len(entries),
+                "first_timestamp": entries[0].timestamp,
+                "last_timestamp": entries[-1].timestamp,
+                "action_counts": dict(Counter(e.action for e in entries)),
+                "agent_counts": dict(Counter(e.agent_id for e in entries)),
+                "total_duration_ms": sum(e.duration_ms or 0 for e in entries),
+                "failed_count": failed,
+                "success_rate": (len(entries) - failed) / len(entries) * 100,
+            }
+
+        assert logger.generate_summary() == recount("session_a")
+        assert logger.generate_summary("session_b") == recount("session_b")
+        assert logger.generate_summary("missing") == {"total_entries": 0}
+
+        # Totals stay current as entries are appended
+        logger.log(action=AuditAction.AGENT_FAILED, agent_id="agent_9", success=False)
+        summary = logger.generate_summary()
+        print(f"  session_a: {summary['total_entries']} entries, "
+              f"{summary['success_rate']:.1f}% success")
+        assert summary == recount("session_a")
+        assert summary["agent_counts"]["agent_9"] == 1
+        logger.close()
+
+        print("\n  [PASS] Session summary works correctly")
+
+
+def test_audit_session_ids():
+    """Test generated session ID format and uniqueness."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Session IDs")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "session_audit.jsonl")
+        ids = {AuditLogger(log_path)._generate_session_id() for _ in range(200)}
+        sample = next(iter(ids))
+        print(f"  Session ID: {sample}")
+        assert len(ids) == 200
+        assert all(re.fullmatch(r"session_\d{8}_\d{6}_[0-9a-f]{8}", i) for i in ids)
+        assert AuditLogger(log_path, session_id="given").session_id == "given"
+
+        print("\n  [PASS] Session IDs work correctly")
+
+
+def test_audit_tail_resume():
+    """Test resuming the chain from the log's tail when there is no sidecar."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Tail Resume")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "tail_audit.jsonl")
+        with AuditLogger(log_path) as logger:
+            logger.log(action=AuditAction.AGENT_INVOKED, agent_id="test_agent")
+            # A last line several times longer than the initial tail window
+            last = logger.log(
+                action=AuditAction.TOOL_RESULT,
+                agent_id="test_agent",
+                output_data="x" * (5 * TAIL_READ_SIZE)
+            )
+        os.unlink(log_path + ".state")
+        with open(log_path, "a", encoding="utf-8") as f:
+            f.write("\n  \n")  # Trailing blank lines are skipped
+
+        with AuditLogger(log_path) as resumed:
+            entry = resumed.log(action=AuditAction.AGENT_COMPLETED, agent_id="test_agent")
+        print(f"  Resumed at sequence {entry.sequence_num}")
+        assert (entry.sequence_num, entry.previous_hash) == (3, last.entry_hash)
+        assert verify_audit_file(log_path)[0]
+
+        # A one-line log is read back entirely
+        single = os.path.join(tmpdir, "single_audit.jsonl")
+        _write_legacy_log(single, 1)
+        logger = AuditLogger(single)
+        assert logger._sequence_num == 1
+        logger.close()
+
+        print("\n  [PASS] Tail resume works correctly")
+
+
+def test_audit_lone_surrogates():
+    """Test that entries json.dumps accepts can always be read back."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Log With Lone Surrogates")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "surrogate_audit.jsonl")
+        logger = AuditLogger(log_path)
+        logger.log(
+            action=AuditAction.AGENT_INVOKED,
+            agent_id="test_agent",
+            reasoning="bad\udc80name"
+        )
+        logger.close()
+
+        is_valid, errors = verify_audit_file(log_path)
+        print(f"  verify_audit_file: {is_valid} {errors}")
+        assert is_valid and not errors
+
+        reopened = AuditLogger(log_path)
+        entries = reopened.get_entries()
+        assert entries[0].reasoning == "bad\udc80name"
+        reopened.log(action=AuditAction.AGENT_COMPLETED, agent_id="test_agent")
+        assert reopened.verify_chain()[0]
+        reopened.close()
+
+        print("\n  [PASS] Lone surrogates round-trip through the log")
+
+
+def test_audit_batching():
+    """Test coalesced audit writes."""
+    print("\n" + "=" * 60)
+    print("TEST: Audit Log Write Batching")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "batched_audit.jsonl")
+        logger = AuditLogger(log_path, batch_size=4)
+        for i in range(3):
+            logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent", reasoning=str(i))
+
+        # Entries wait in memory until the batch fills or a read flushes them
+        on_disk = os.path.getsize(log_path) if os.path.exists(log_path) else 0
+        print(f"  Bytes on disk before flush: {on_disk}")
+        assert on_disk == 0
+        assert len(logger.get_entries()) == 3
+        assert verify_audit_file(log_path) == (True, [])
+
+        # Registering for the exit-time flush does not keep the logger alive
+        ref = weakref.ref(logger)
+        del logger
+        gc.collect()
+        assert ref() is None
+
+        # A batching logger collected without close() still writes its entries
+        log_path = os.path.join(tmpdir, "collected_audit.jsonl")
+        logger = AuditLogger(log_path, batch_size=50, track_digest=True)
+        for i in range(5):
+            logger.log(action=AuditAction.TOOL_CALLED, agent_id="test_agent", reasoning=str(i))
+        assert not os.path.exists(log_path)
+        del logger
+        gc.collect()
+        entries = AuditLogger(log_path).get_entries()
+        print(f"  Entries written on collection: {len(entries)}")
+        assert [e.reasoning for e in entries] == [str(i) for i in range(5)]
+        assert verify_audit_file(log_path) == (True, [])
+        assert verify_audit_file_quick(log_path) == (True, [])
+
+        print("\n  [PASS] Audit write batching works correctly")
+
+
+def test_async_audit_writer():
+    """Test off-thread audit writes."""
+    print("\n" + "=" * 60)
+    print("TEST: Async Audit Writer")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "async_writer_audit.jsonl"))
+        writer = AsyncAuditWriter(logger)
+        for i in range(5):
+            writer.log(action=AuditAction.APPROVAL_REQUESTED, agent_id="test_agent", reasoning=str(i))
+        writer.flush()
+        assert [e.reasoning for e in logger.get_entries()] == ["0", "1", "2", "3", "4"]
+
+        # An unreferenced writer is collected and its thread stops after
+        # writing what was still queued
+        writer.log(action=AuditAction.APPROVAL_REQUESTED, agent_id="test_agent", reasoning="5")
+        thread, ref = writer._thread, weakref.ref(writer)
+        del writer
+        gc.collect()
+        thread.join(timeout=5)
+        print(f"  Writer collected: {ref() is None}, thread alive: {thread.is_alive()}")
+        assert ref() is None and not thread.is_alive()
+        assert len(logger.get_entries()) == 6
+        assert logger.verify_chain()[0]
+
+        print("\n  [PASS] Async audit writer works correctly")
+
+
 def test_approval_gate():
     """Test approval gate with auto-approve mode."""
     print("\n" + "=" * 60)
@@ -110,13 +985,989 @@ def test_approval_gate():
 
         # Get approval (auto-approved)
         response = gate.await_approval(request)
-        print(f"  Status: {response.status.value}")
+        print(f"  Status: {response.status.label}")
         print(f"  Notes: {response.notes}")
 
         assert response.status == ApprovalStatus.APPROVED
         print("\n  [PASS] Approval gate works correctly")
 
 
+def test_request_ids():
+    """Test request ID format and uniqueness."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Request IDs)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "ids_audit.jsonl")))
+
+        request_id = gate._generate_request_id()
+        print(f"  Request ID: {request_id}")
+        assert re.fullmatch(r"req_\d{8}_\d{6}_0001", request_id)
+        assert re.fullmatch(r"batch_\d{8}_\d{6}_0002", gate._generate_request_id("batch"))
+
+        # The timestamp is UTC, like the audit log's
+        issued = datetime.strptime(request_id[4:19], "%Y%m%d_%H%M%S")
+        skew = datetime.now(timezone.utc) - issued.replace(tzinfo=timezone.utc)
+        assert abs(skew.total_seconds()) < 60
+
+        # IDs stay unique when generated from many threads
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            ids = list(pool.map(lambda _: gate._generate_request_id(), range(2000)))
+        assert len(set(ids)) == 2000
+        assert sorted(int(i.rsplit("_", 1)[1]) for i in ids) == list(range(3, 2003))
+
+        print("\n  [PASS] Request IDs work correctly")
+
+
+def test_proposal_display():
+    """Test that proposals are serialized once and large content is elided."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Proposal Display)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "display_audit.jsonl")))
+
+        request = gate.request_generic(
+            agent_id="test_agent",
+            action_type="create_issue",
+            proposal={"title": "Flaky test", "labels": ["ci"]},
+            description="Open an issue"
+        )
+        text = request.proposal_json
+        assert request.proposal_json is text
+        assert json.loads(text) == {"labels": ["ci"], "title": "Flaky test"}
+        assert f"\nProposal: {text}\n" in gate._render_proposal(request)
+
+        content = "x = 1\n" * 10_000
+        request = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path=os.path.join(tmpdir, "big.py"),
+            original="",
+            proposed=content,
+            description="Write big.py"
+        )
+        digest = hashlib.sha256(content.encode("utf-8")).hexdigest()[:12]
+        shown = json.loads(request.proposal_json)["content"]
+        print(f"  Large content shown as: {shown}")
+        assert shown == f"[file content: {len(content)} chars, SHA-256 {digest}...]"
+        assert request.proposal["content"] is content
+
+        print("\n  [PASS] Proposal display works correctly")
+
+
+def test_lazy_original():
+    """Test that auto-approved edits never load the original content."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Lazy Original Content)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(
+            AuditLogger(os.path.join(tmpdir, "lazy_audit.jsonl")),
+            auto_approve=True
+        )
+        loads = []
+
+        def load_original():
+            loads.append(1)
+            return "old\n"
+
+        request = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path=os.path.join(tmpdir, "module.py"),
+            original=load_original,
+            proposed="new\n",
+            description="Update module"
+        )
+        assert gate.await_approval(request).status == ApprovalStatus.APPROVED
+        assert loads == []
+        print("  Auto-approval did not load the original")
+
+        # Displaying the diff loads it exactly once
+        assert "-old" in gate._render_proposal(request)
+        assert request.get_original_content() == "old\n"
+        assert loads == [1]
+
+        # original=None reads the file on display; a missing file is empty
+        request = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path=os.path.join(tmpdir, "new_module.py"),
+            original=None,
+            proposed="new\n",
+            description="Create module"
+        )
+        assert request.get_original_content() == ""
+        assert "+new" in gate._render_proposal(request)
+
+        print("\n  [PASS] Lazy original content works correctly")
+
+
+def test_pending_requests():
+    """Test the pending-request map under concurrent use."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Pending Requests)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "pending_audit.jsonl")))
+
+        def request(i):
+            return gate.request_shell_command(
+                agent_id="test_agent",
+                command=f"pytest -k case{i}",
+                description=f"Run case {i}"
+            )
+
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            requests = list(pool.map(request, range(200)))
+            cancelled = list(pool.map(
+                gate.cancel_request, [r.request_id for r in requests[::2]]
+            ))
+        assert all(cancelled)
+        assert not gate.cancel_request(requests[0].request_id)
+        pending = {r.request_id for r in gate.get_pending_requests()}
+        assert pending == {r.request_id for r in requests[1::2]}
+        print(f"  Pending after cancelling half: {len(pending)}")
+
+        # Requests and responses are slotted
+        assert not hasattr(requests[0], "__dict__")
+        response = ApprovalResponse(request_id="r", status=ApprovalStatus.APPROVED)
+        try:
+            response.extra = True
+            raise AssertionError("slotted dataclass accepted a new attribute")
+        except AttributeError:
+            pass
+
+        print("\n  [PASS] Pending requests work correctly")
+
+
+def test_status_labels():
+    """Test that integer statuses keep their string labels on disk."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Status Labels)")
+    print("=" * 60)
+
+    assert [s.label for s in ApprovalStatus] == ["pending", "approved", "rejected", "modified"]
+    assert ApprovalStatus.APPROVED == 1 and isinstance(ApprovalStatus.REJECTED, int)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "status_audit.jsonl"))
+        statuses = iter([ApprovalStatus.APPROVED, ApprovalStatus.REJECTED, ApprovalStatus.MODIFIED])
+        gate = ApprovalGate(
+            logger,
+            approval_callback=lambda r: ApprovalResponse(
+                request_id=r.request_id, status=next(statuses)
+            )
+        )
+        for i in range(3):
+            gate.await_approval(gate.request_shell_command(
+                agent_id="test_agent", command=f"make step{i}", description="Build"
+            ))
+        logged = [
+            json.loads(e.output_data)["status"]
+            for e in logger.get_entries()
+            if e.action != AuditAction.APPROVAL_REQUESTED.value
+        ]
+        print(f"  Logged statuses: {logged}")
+        assert logged == ["approved", "rejected", "modified"]
+
+        # Snapshots store the label and restore to the enum member
+        request = gate.request_shell_command(
+            agent_id="test_agent", command="make docs", description="Docs"
+        )
+        gate.submit_approval(request)
+        snapshot = json.loads(gate._snapshot_path(request.request_id).read_text())
+        assert snapshot["status"] == "pending"
+        restored = ApprovalGate(logger).restore_pending()
+        assert restored[0].status is ApprovalStatus.PENDING
+
+    print("\n  [PASS] Status labels work correctly")
+
+
+def test_async_approval():
+    """Test non-blocking submit/resolve/wait approval flow."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Non-Blocking)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        log_path = os.path.join(tmpdir, "async_audit.jsonl")
+        logger = AuditLogger(log_path)
+        gate = ApprovalGate(logger)
+
+        request = gate.request_shell_command(
+            agent_id="test_agent",
+            command="pytest -q",
+            description="Run tests"
+        )
+        request_id = gate.submit_approval(request)
+        snapshot = Path(tmpdir) / "pending" / f"{request_id}.json"
+        print(f"  Snapshot written: {snapshot.exists()}")
+        assert snapshot.exists()
+        assert snapshot.stat().st_mode & 0o777 == 0o600
+
+        # A fresh gate can resume the pending request
+        restored = ApprovalGate(logger).restore_pending()
+        assert [r.request_id for r in restored] == [request_id]
+
+        # ... and resolve it after a restart
+        restarted = ApprovalGate(logger)
+        restarted_request = gate.request_shell_command(
+            agent_id="test_agent",
+            command="pytest -q tests",
+            description="Run more tests"
+        )
+        restarted_id = gate.submit_approval(restarted_request)
+        restarted.restore_pending()
+        restarted.resolve_approval(restarted_id, ApprovalResponse(
+            request_id=restarted_id,
+            status=ApprovalStatus.REJECTED
+        ))
+        assert asyncio.run(restarted.wait_approval(restarted_id)).status == ApprovalStatus.REJECTED
+        assert not (Path(tmpdir) / "pending" / f"{restarted_id}.json").exists()
+
+        # Unknown IDs are rejected
+        try:
+            gate.resolve_approval("req_unknown", ApprovalResponse(
+                request_id="req_unknown",
+                status=ApprovalStatus.APPROVED
+            ))
+            raise AssertionError("unknown request should raise")
+        except ValueError as e:
+            print(f"  Unknown ID: {e}")
+
+        # The blocking flow never writes snapshots
+        blocking_dir = Path(tmpdir) / "blocking_pending"
+        blocking = ApprovalGate(
+            logger,
+            approval_callback=lambda r: ApprovalResponse(
+                request_id=r.request_id,
+                status=ApprovalStatus.APPROVED
+            ),
+            pending_dir=str(blocking_dir)
+        )
+        blocking_request = blocking.request_file_edit(
+            agent_id="test_agent",
+            file_path="secret.py",
+            original="old",
+            proposed="new",
+            description="Edit"
+        )
+        blocking.await_approval(blocking_request)
+        assert not blocking_dir.exists()
+
+        async def resolve_later():
+            loop = asyncio.get_running_loop()
+            loop.call_later(0.01, gate.resolve_approval, request_id, ApprovalResponse(
+                request_id=request_id,
+                status=ApprovalStatus.APPROVED
+            ))
+            return await gate.wait_approval(request_id)
+
+        response = asyncio.run(resolve_later())
+        print(f"  Status: {response.status.label}")
+
+        assert response.status == ApprovalStatus.APPROVED
+        assert not snapshot.exists()
+        assert logger.verify_chain()[0]
+        print("\n  [PASS] Non-blocking approval works correctly")
+
+
+def test_shell_reversibility():
+    """Test irreversible shell command detection."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Shell Reversibility)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "shell_audit.jsonl")))
+        cases = {
+            "pytest -q": True,
+            "git status": True,
+            "rm build.log": False,
+            "RM -f out.txt": False,
+            "psql -c 'DROP TABLE users'": False,
+            "git branch --delete old": False,
+            "truncate -s 0 app.log": False,
+            "black --format .": False,
+            "ls -l term.txt": True,  # "rm" not followed by a space
+        }
+        for command, reversible in cases.items():
+            request = gate.request_shell_command(
+                agent_id="test_agent",
+                command=command,
+                description=f"Run {command}"
+            )
+            assert request.reversible is reversible, command
+        print(f"  Classified {len(cases)} commands")
+
+        print("\n  [PASS] Shell reversibility works correctly")
+
+
+def test_concurrent_approval():
+    """Test bounded concurrency of async approval callbacks."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Bounded Concurrency)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "concurrent_audit.jsonl"))
+        in_flight = 0
+        peak = 0
+
+        async def callback(request):
+            nonlocal in_flight, peak
+            in_flight += 1
+            peak = max(peak, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return ApprovalResponse(
+                request_id=request.request_id,
+                status=ApprovalStatus.APPROVED
+            )
+
+        gate = ApprovalGate(logger, approval_callback=callback, max_concurrent=2)
+
+        def requests(skip_queue=False):
+            return [
+                gate.request_generic(
+                    agent_id="test_agent",
+                    action_type="lint",
+                    proposal={"file": f"mod{i}.py"},
+                    description=f"Lint mod{i}.py",
+                    skip_queue=skip_queue
+                )
+                for i in range(6)
+            ]
+
+        async def approve_all(batch):
+            return await asyncio.gather(*(gate.await_approval_async(r) for r in batch))
+
+        responses = asyncio.run(approve_all(requests()))
+        print(f"  Peak callbacks in flight: {peak} (limit 2)")
+        assert peak == 2
+        assert [r.status for r in responses] == [ApprovalStatus.APPROVED] * 6
+
+        # skip_queue requests bypass the pool limit
+        peak = 0
+        asyncio.run(approve_all(requests(skip_queue=True)))
+        print(f"  Peak with skip_queue: {peak}")
+        assert peak == 6
+
+        # The same gate keeps its limit across event loops
+        gate = ApprovalGate(logger, approval_callback=callback, max_concurrent=1)
+        for _ in range(2):
+            peak = 0
+            responses = asyncio.run(approve_all(requests()[:3]))
+            assert peak == 1
+            assert [r.status for r in responses] == [ApprovalStatus.APPROVED] * 3
+        print("  Limit held on two event loops in turn")
+
+        print("\n  [PASS] Concurrent approval works correctly")
+
+
+def test_cli_batch_prompt():
+    """Test the CLI batch prompt, including rendering every diff in order."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (CLI Batch Prompt)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "cli_batch_audit.jsonl")))
+        requests = [
+            gate.request_file_edit(
+                agent_id="test_agent",
+                file_path=os.path.join(tmpdir, f"mod{i}.py"),
+                original=f"x = {i}\n",
+                proposed=f"x = {i + 100}\n",
+                description=f"Bump mod{i}"
+            )
+            for i in range(1, 6)
+        ]
+        batch = gate.request_batch(requests)
+
+        out = io.StringIO()
+        with mock.patch("builtins.input", side_effect=["d", "9", "1,3-4", "reviewed"]), \
+                contextlib.redirect_stdout(out):
+            responses = gate.await_batch_approval(batch)
+        prompt = out.getvalue()
+
+        statuses = [r.status for r in responses]
+        assert statuses == [
+            ApprovalStatus.APPROVED, ApprovalStatus.REJECTED, ApprovalStatus.APPROVED,
+            ApprovalStatus.APPROVED, ApprovalStatus.REJECTED
+        ]
+        assert all(r.notes == "reviewed" for r in responses)
+        assert "BATCH APPROVAL REQUIRED (5 requests)" in prompt
+        assert "Invalid selection: '9' is outside 1-5" in prompt
+
+        # Diffs are rendered concurrently but printed in batch order
+        positions = [
+            prompt.index(f"\n[{i}] {r.request_id}: Bump mod{i}\n")
+            for i, r in enumerate(requests, 1)
+        ]
+        assert positions == sorted(positions)
+        for i, position in enumerate(positions, 1):
+            assert prompt.index(f"+x = {i + 100}", position) < (
+                positions[i] if i < len(positions) else len(prompt)
+            )
+        print(f"  Rendered {len(positions)} diffs in order")
+
+        print("\n  [PASS] CLI batch prompt works correctly")
+
+
+def test_decision_cache():
+    """Test that approvals of identical proposals are reused."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Decision Cache)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "cache_audit.jsonl"))
+        calls = []
+
+        def callback(request):
+            calls.append(request.request_id)
+            status = (
+                ApprovalStatus.REJECTED if "deploy" in request.proposal["command"]
+                else ApprovalStatus.APPROVED
+            )
+            return ApprovalResponse(request_id=request.request_id, status=status)
+
+        gate = ApprovalGate(
+            logger,
+            approval_callback=callback,
+            decision_cache_ttl=60,
+            decision_cache_size=2
+        )
+
+        def approve(command, risk_level="medium", agent_id="test_agent"):
+            request = gate.request_shell_command(
+                agent_id=agent_id,
+                command=command,
+                description=f"Run {command}",
+                risk_level=risk_level
+            )
+            return gate.await_approval(request)
+
+        first = approve("pytest -q")
+        repeat = approve("pytest -q")
+        print(f"  Repeat: {repeat.notes}")
+        assert len(calls) == 1
+        assert repeat.status == ApprovalStatus.APPROVED
+        assert repeat.notes == f"cache hit: {first.request_id}"
+
+        # Different agent, rejections and high-risk commands are never reused
+        approve("pytest -q", agent_id="other_agent")
+        approve("make deploy")
+        approve("make deploy")
+        approve("git push", risk_level="high")
+        approve("git push", risk_level="high")
+        assert len(calls) == 6
+
+        # LRU eviction at decision_cache_size
+        approve("ruff check")
+        approve("mypy .")
+        approve("pytest -q")
+        print(f"  Callback invocations: {len(calls)}")
+        assert len(calls) == 9
+
+        # Expired approvals need a fresh decision
+        gate.decision_cache_ttl = 1e-9
+        approve("mypy .")
+        assert len(calls) == 10
+
+        print("\n  [PASS] Decision cache works correctly")
+
+
+def test_proposal_serialization():
+    """Test canonical proposal JSON, with and without orjson."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Proposal Serialization)")
+    print("=" * 60)
+
+    proposal = {"z": [1, 2.5, None], "a": {"é": True, "b": "line\n"}, "m": 2 ** 70}
+    expected = json.dumps(proposal, indent=2, sort_keys=True, ensure_ascii=False)
+    compact = json.dumps(proposal, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    small = dict(proposal, m=7)
+
+    # orjson (when installed) and the json fallback must agree
+    for backend in (sys.modules["sdlc.approval"].orjson, None):
+        with mock.patch("sdlc.approval.orjson", backend):
+            assert _pjson(proposal) == expected
+            assert _pjson(proposal, indent=False) == compact
+            assert _pjson(small) == json.dumps(small, indent=2, sort_keys=True, ensure_ascii=False)
+            # Unserializable values fall back to str()
+            assert _pjson({"path": Path("a/b")}, indent=False) == '{"path":"a/b"}'
+        name = "orjson" if backend else "json"
+        print(f"  {name}: output matches json.dumps(sort_keys=True)")
+
+    # Key order does not change the decision-cache key
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(
+            AuditLogger(os.path.join(tmpdir, "pjson_audit.jsonl")),
+            decision_cache_ttl=60,
+            cacheable_actions=["deploy"]
+        )
+        keys = [
+            gate.request_generic(
+                agent_id="test_agent",
+                action_type="deploy",
+                proposal=p,
+                description="Deploy"
+            ).decision_key
+            for p in ({"env": "staging", "tag": "v1"}, {"tag": "v1", "env": "staging"})
+        ]
+        assert keys[0] is not None and keys[0] == keys[1]
+
+    print("\n  [PASS] Proposal serialization works correctly")
+
+
+def test_cli_prompt():
+    """Test the CLI approval prompt text and decisions."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (CLI Prompt)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "cli_audit.jsonl")))
+        request = gate.request_shell_command(
+            agent_id="test_agent",
+            command="rm -r build",
+            description="Clean build output",
+            context="Stale artifacts",
+            risk_level="high"
+        )
+
+        out = io.StringIO()
+        with mock.patch("builtins.input", side_effect=["x", "r", "not now"]), \
+                contextlib.redirect_stdout(out):
+            response = gate.await_approval(request)
+        prompt = out.getvalue()
+
+        assert response.status == ApprovalStatus.REJECTED
+        assert response.notes == "not now"
+        assert "APPROVAL REQUIRED" in prompt
+        assert f"Request ID: {request.request_id}\n" in prompt
+        assert "Risk Level: HIGH\n" in prompt
+        assert "Reversible: NO - IRREVERSIBLE\n" in prompt
+        assert "\nContext: Stale artifacts\n" in prompt
+        assert "\nCommand: rm -r build\n" in prompt
+        assert "Invalid choice" in prompt
+        print("  Prompt fields rendered")
+
+        # No context line when there is none; empty notes become None
+        request = gate.request_shell_command(
+            agent_id="test_agent",
+            command="pytest -q",
+            description="Run tests"
+        )
+        out = io.StringIO()
+        with mock.patch("builtins.input", side_effect=["a", ""]), \
+                contextlib.redirect_stdout(out):
+            response = gate.await_approval(request)
+        assert response.status == ApprovalStatus.APPROVED
+        assert response.notes is None
+        assert "Context:" not in out.getvalue()
+        assert "Reversible: Yes\n" in out.getvalue()
+
+        print("\n  [PASS] CLI prompt works correctly")
+
+
+def test_batched_approval():
+    """Test time-window batching of approval requests."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Batched Requests)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "batch_audit.jsonl"))
+
+        # A callback answering fewer requests than it was given fails every
+        # waiter instead of leaving some blocked forever
+        gate = ApprovalGate(
+            logger,
+            batch_window_ms=60_000,
+            batch_approval_callback=lambda batch: [ApprovalResponse(
+                request_id=batch.requests[0].request_id,
+                status=ApprovalStatus.APPROVED
+            )]
+        )
+        requests = [
+            gate.request_shell_command("test_agent", f"echo {i}", f"Echo {i}")
+            for i in range(2)
+        ]
+        try:
+            gate.flush_incoming()
+            raise AssertionError("short batch response should raise")
+        except ValueError as e:
+            print(f"  Raised: {e}")
+
+        for request in requests:
+            try:
+                gate.await_approval(request)
+                raise AssertionError("waiters should see the batch error")
+            except ValueError:
+                pass
+
+        # Each request's notes and modifications reach the audit log
+        def review(batch):
+            first, second = batch.requests
+            return [
+                ApprovalResponse(first.request_id, ApprovalStatus.APPROVED, notes="ok"),
+                ApprovalResponse(
+                    second.request_id,
+                    ApprovalStatus.MODIFIED,
+                    modified_proposal={"command": "echo safe"},
+                    notes="use echo"
+                )
+            ]
+
+        gate = ApprovalGate(logger, batch_approval_callback=review)
+        batch = gate.request_batch([
+            gate.request_shell_command("test_agent", f"echo {i}", f"Echo {i}")
+            for i in range(2)
+        ])
+        responses = gate.await_batch_approval(batch)
+        assert [r.status for r in responses] == [
+            ApprovalStatus.APPROVED, ApprovalStatus.MODIFIED
+        ]
+
+        granted = logger.get_entries(action=AuditAction.APPROVAL_GRANTED)[-1]
+        modified = logger.get_entries(action=AuditAction.APPROVAL_MODIFIED)[-1]
+        print(f"  Modified entry: {modified.output_data}")
+        assert granted.reasoning == "ok"
+        assert modified.reasoning == "use echo"
+        decision = json.loads(modified.output_data)["decisions"][0]
+        assert decision["modified_proposal"] == {"command": "echo safe"}
+
+        # Without a batch callback, a programmatic approval_callback reviews
+        # each request in turn; nothing falls back to an input() prompt
+        reviewed = []
+
+        def approve(request):
+            reviewed.append(request.request_id)
+            return ApprovalResponse(request.request_id, ApprovalStatus.APPROVED)
+
+        gate = ApprovalGate(logger, approval_callback=approve)
+        batch = gate.request_batch([
+            gate.request_shell_command("test_agent", f"echo {i}", f"Echo {i}")
+            for i in range(3)
+        ])
+        with mock.patch("builtins.input", side_effect=AssertionError("prompted")):
+            responses = gate.await_batch_approval(batch)
+        assert reviewed == [r.request_id for r in batch.requests]
+        assert [r.status for r in responses] == [ApprovalStatus.APPROVED] * 3
+        print(f"  approval_callback reviewed {len(reviewed)} batched requests")
+
+        # Filling the queue starts the review without blocking the request
+        # that filled it, or falling back to the CLI batch prompt
+        started = threading.Event()
+        release = threading.Event()
+
+        def slow_approve(request):
+            started.set()
+            assert release.wait(10)
+            return ApprovalResponse(request.request_id, ApprovalStatus.APPROVED)
+
+        gate = ApprovalGate(
+            logger, approval_callback=slow_approve, batch_window_ms=60_000, max_batch_size=3
+        )
+        with mock.patch("builtins.input", side_effect=AssertionError("prompted")):
+            requests = [
+                gate.request_shell_command("test_agent", f"echo {i}", f"Echo {i}")
+                for i in range(3)
+            ]
+            assert started.wait(10)
+            assert not any(r.status == ApprovalStatus.APPROVED for r in requests)
+            release.set()
+            responses = [gate.await_approval(r) for r in requests]
+        assert [r.status for r in responses] == [ApprovalStatus.APPROVED] * 3
+        print("  Full queue reviewed off the requesting thread")
+
+        print("\n  [PASS] Batched approval works correctly")
+
+
+def test_diff_rendering():
+    """Test proposal diffs for edits, including memory-mapped originals."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Diff Rendering")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "diff_audit.jsonl"))
+        gate = ApprovalGate(logger)
+
+        # Large originals are read through mmap; identical content is
+        # still reported as such
+        large_file = Path(tmpdir) / "large.py"
+        content = "".join(f"line {i}\n" for i in range(20_000))
+        large_file.write_text(content)
+        request = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path=str(large_file),
+            original=None,
+            proposed=content,
+            description="No-op edit"
+        )
+        assert gate._render_file_diff(request) == "(identical)\n"
+
+        # Long diffs are cut off without computing the rest
+        rendered = _render_diff(content, content.replace("line", "LINE"), 10)
+        print(f"  Truncated diff ends: {rendered.splitlines()[-2]!r}")
+        assert rendered.endswith("... diff truncated at 10 lines\n\n")
+        assert rendered.count("\n") == 12
+
+        print("\n  [PASS] Diff rendering works correctly")
+
+
+def test_diff_output():
+    """Test that displayed diffs match difflib's unified diff."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Diff Output")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "diff_audit.jsonl")))
+        original = "".join(f"line {i}\n" for i in range(40))
+        proposed = original.replace("line 5\n", "line five\n").replace("line 30\n", "")
+
+        out = io.StringIO()
+        with contextlib.redirect_stdout(out):
+            gate._display_diff(original, proposed)
+        rendered = out.getvalue()
+
+        # Removed/added lines are colorized; headers are not
+        assert "\033[91m-line 5\033[0m\n" in rendered
+        assert "\033[92m+line five\033[0m\n" in rendered
+        assert rendered.startswith("--- original\n+++ proposed\n")
+
+        expected = difflib.unified_diff(
+            original.splitlines(keepends=True),
+            proposed.splitlines(keepends=True),
+            fromfile="original",
+            tofile="proposed"
+        )
+        plain = re.sub(r"\033\[\d+m", "", rendered)
+        assert plain == "".join(expected) + "\n"
+        print(f"  {plain.count('@@') // 2} hunks match difflib")
+
+        print("\n  [PASS] Diff output works correctly")
+
+
+def test_mmap_diff():
+    """Test diffs of large on-disk originals read through mmap."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Diff (Memory-Mapped Original)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "mmap_audit.jsonl")))
+        path = Path(tmpdir) / "large.py"
+        original = "".join(f"value_{i} = {i}  # café\n" for i in range(5000))
+        path.write_text(original, encoding="utf-8")
+        assert path.stat().st_size > MMAP_THRESHOLD
+        proposed = original.replace("value_2500 = 2500", "value_2500 = None")
+
+        request = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path=str(path),
+            original=None,
+            proposed=proposed,
+            description="Null out one value"
+        )
+        # The request keeps the path, not a copy of the file
+        assert request.original_content is None
+        assert request.content_path == str(path)
+
+        rendered = gate._render_file_diff(request)
+        assert rendered == _render_diff(original, proposed)
+        assert "-value_2500 = 2500  # café" in rendered
+        print(f"  Diff of {path.stat().st_size} byte file: {rendered.count(chr(10))} lines")
+
+        # Pending snapshots store the path rather than the content
+        gate.submit_approval(request)
+        snapshot = json.loads(gate._snapshot_path(request.request_id).read_text())
+        assert snapshot["original_content"] is None
+        assert snapshot["content_path"] == str(path)
+
+        print("\n  [PASS] Memory-mapped diff works correctly")
+
+
+def test_streaming_diff():
+    """Test that the streaming diff matches difflib for str and bytes input."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Diff (Streaming Line Index)")
+    print("=" * 60)
+
+    lines = [f"line {i}\n" for i in range(30)]
+    cases = [
+        ("".join(lines), "".join(lines[:10] + ["inserted\n"] + lines[10:])),
+        ("".join(lines), "".join(lines[5:25])),
+        ("", "only\nnew\n"),
+        ("gone\n", ""),
+        ("no newline", "no newline at all"),
+        ("a\nb\nc", "a\nB\nc"),
+        ("dup\ndup\ndup\n", "dup\ndup\n"),
+    ]
+    for original, proposed in cases:
+        expected = list(difflib.unified_diff(
+            original.splitlines(keepends=True),
+            proposed.splitlines(keepends=True),
+            fromfile="original",
+            tofile="proposed"
+        ))
+        assert list(_unified_diff(original, proposed)) == expected, (original, proposed)
+        # bytes on either side are compared undecoded, then decoded for display
+        assert list(_unified_diff(original.encode(), proposed)) == expected
+        assert list(_unified_diff(original, proposed.encode())) == expected
+    print(f"  {len(cases)} cases match difflib")
+
+    print("\n  [PASS] Streaming diff works correctly")
+
+
+def test_editor_modification():
+    """Test the $EDITOR modification path and its reused scratch file."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Editor Modification)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "editor_audit.jsonl")))
+        editor = Path(tmpdir) / "editor.sh"
+        editor.write_text('#!/bin/sh\necho "$1" >> "$0.log"\necho "# reviewed" >> "$1"\n')
+        editor.chmod(0o755)
+
+        def modify(editor_cmd, proposed="x = 1\n"):
+            request = gate.request_file_edit(
+                agent_id="code/gen",
+                file_path=os.path.join(tmpdir, "module.py"),
+                original="",
+                proposed=proposed,
+                description="Add module"
+            )
+            with mock.patch.dict(os.environ, {"EDITOR": editor_cmd}), \
+                    mock.patch("builtins.input", return_value="edit"), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                return request, gate._get_modification(request)
+
+        _, modified = modify(str(editor))
+        assert modified["content"] == "x = 1\n# reviewed\n"
+        _, modified = modify(str(editor), proposed="y = 2\n")
+        assert modified["content"] == "y = 2\n# reviewed\n"
+
+        # One scratch file per agent, named with the target's suffix
+        scratch = Path(tmpdir, "editor.sh.log").read_text().split()
+        print(f"  Scratch file: {Path(scratch[0]).name}")
+        assert scratch[0] == scratch[1]
+        assert Path(scratch[0]).name == "code_gen.py"
+
+        # Closing the editor without saving keeps the proposal as is
+        request, modified = modify("true")
+        assert modified is request.proposal
+
+        print("\n  [PASS] Editor modification works correctly")
+
+
+def test_prompt_modification():
+    """Test the non-editor modification paths."""
+    print("\n" + "=" * 60)
+    print("TEST: Approval Gate (Prompt Modification)")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        gate = ApprovalGate(AuditLogger(os.path.join(tmpdir, "modify_audit.jsonl")))
+
+        def modify(request, *answers):
+            with mock.patch("builtins.input", side_effect=answers), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                return gate._get_modification(request)
+
+        shell = gate.request_shell_command(
+            agent_id="test_agent", command="pytest", description="Run tests"
+        )
+        assert modify(shell, "  pytest -x  ") == {"command": "pytest -x"}
+
+        generic = gate.request_generic(
+            agent_id="test_agent",
+            action_type="create_issue",
+            proposal={"title": "Bug"},
+            description="Open an issue"
+        )
+        assert modify(generic, '{"title": "Bug", "labels": ["p1"]}') == {
+            "title": "Bug", "labels": ["p1"]
+        }
+        assert modify(generic, "{not json") is generic.proposal
+        assert modify(generic, "skip") is generic.proposal
+
+        # Edits may be supplied from another file
+        replacement = Path(tmpdir) / "replacement.py"
+        replacement.write_text("z = 3\n")
+        edit = gate.request_file_edit(
+            agent_id="test_agent",
+            file_path="module.py",
+            original="",
+            proposed="x = 1\n",
+            description="Add module"
+        )
+        assert modify(edit, str(replacement)) == {"file_path": "module.py", "content": "z = 3\n"}
+        assert modify(edit, str(Path(tmpdir) / "missing.py")) is edit.proposal
+        print("  Shell, generic and file-path modifications applied")
+
+        print("\n  [PASS] Prompt modification works correctly")
+
+
+def test_config_command_checks():
+    """Test blocked-pattern and allowed-command checks in FrameworkConfig."""
+    print("\n" + "=" * 60)
+    print("TEST: Config Command Checks")
+    print("=" * 60)
+
+    config = FrameworkConfig(
+        allowed_shell_commands=["git", "pytest"],
+        blocked_patterns=["rm -rf", "rm -rf /", "sudo"]
+    )
+
+    # The longest blocked pattern found is reported
+    assert config.blocked_pattern("rm -rf / --no-preserve-root") == "rm -rf /"
+    assert config.blocked_pattern("rm -rf build") == "rm -rf"
+    assert config.blocked_pattern("git status") is None
+    assert config.is_blocked("echo hi && sudo ls")
+    assert not config.is_blocked("SUDO ls")  # Case-sensitive
+
+    assert config.is_allowed("git status")
+    assert config.is_allowed("pytest")
+    assert not config.is_allowed("gitk")
+    assert not config.is_allowed("   ")
+
+    # Lists edited after construction are picked up
+    config.blocked_patterns.append("mkfs")
+    assert config.is_blocked("mkfs.ext4 /dev/sda")
+    print("  blocked/allowed checks match")
+
+    print("\n  [PASS] Config command checks work correctly")
+
+
+def _make_tree(root):
+    """Create a small project tree, including excluded and hidden directories."""
+    files = {
+        "top.py": "import os\n",
+        "a/mod.py": "def helper():\n    return 1\n",
+        "a/b/deep.py": "HELPER = 'x'\n",
+        "a/b/notes.txt": "helper notes\n",
+        ".hidden/notes.txt": "hidden helper\n",
+        "node_modules/pkg/index.py": "helper = 1\n",
+        "a/build/gen.py": "helper = 2\n",
+        "a/__pycache__/mod.py": "helper = 3\n",
+    }
+    for name, content in files.items():
+        path = Path(root, name)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(content)
+
+
 def test_tool_registry():
     """Test tool registry."""
     print("\n" + "=" * 60)
@@ -173,6 +2024,664 @@ def test_tool_registry():
         print("\n  [PASS] Tool registry works correctly")
 
 
+def test_tool_search():
+    """Test search_files matches Python re semantics on either backend."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Search")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "search_audit.jsonl"))
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=tmpdir)
+        Path(tmpdir, "sample.py").write_text("foobar\nfoo baz\naa\n")
+
+        Path(tmpdir, "anchors.txt").write_text("x\ndef f():\nfoo\nbar foo\n")
+
+        def search(pattern, file_pattern="*.py"):
+            return [
+                (r["file"], r["line"])
+                for r in registry._search_files(pattern, file_pattern=file_pattern)
+            ]
+
+        # Lookaround and backreferences are outside ripgrep's regex syntax
+        print(f"  ripgrep: {registry._rg or 'not installed'}")
+        assert search("foo(?=bar)") == [("sample.py", 1)]
+        assert search(r"(a)\1") == [("sample.py", 3)]
+
+        # Anchors and lookarounds apply to each line, as if searched alone
+        assert search(r"\Adef", "*.txt") == [("anchors.txt", 2)]
+        assert search(r"foo\Z", "*.txt") == [("anchors.txt", 3), ("anchors.txt", 4)]
+        assert search(r"foo(?!\n)", "*.txt") == [("anchors.txt", 3), ("anchors.txt", 4)]
+
+        # Both backends take the first MAX_SEARCH_RESULTS matches in path
+        # order, and a missing directory has no matches
+        for i in range(150):
+            Path(tmpdir, f"pkg{i % 11}", f"sub{i % 3}").mkdir(parents=True, exist_ok=True)
+            Path(tmpdir, f"pkg{i % 11}", f"sub{i % 3}", f"m{i}.py").write_text("hit\n")
+            Path(tmpdir, f"pkg{i % 11}", f"top{i}.py").write_text("hit\n")
+        rg = registry._rg
+        found = []
+        for backend in ([rg, None] if rg else [None]):
+            registry._rg = backend
+            found.append(search("hit"))
+            assert registry._search_files("hit", path="missing") == []
+        registry._rg = rg
+        assert all(results == found[0] for results in found)
+        assert len(found[0]) == MAX_SEARCH_RESULTS
+        print(f"  {len(found)} backend(s) agree on the first {MAX_SEARCH_RESULTS} matches")
+
+        print("\n  [PASS] Tool registry search works correctly")
+
+
+def test_tool_list_files():
+    """Test list_files gives the same listing with or without ripgrep."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry List Files")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "list_audit.jsonl"))
+        root = Path(tmpdir, "project")
+        _make_tree(root)
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=str(root))
+        print(f"  ripgrep: {registry._rg or 'not installed'}")
+
+        expected = {
+            "*.py": ["a/b/deep.py", "a/mod.py", "top.py"],
+            "**/*.py": ["a/b/deep.py", "a/mod.py", "top.py"],
+            "*.txt": [".hidden/notes.txt", "a/b/notes.txt"],
+            "a/**/*.py": ["a/b/deep.py", "a/mod.py"],
+            "**/b/*.py": ["a/b/deep.py"],
+            "a/*.py": ["a/mod.py"],
+        }
+        backends = [registry._rg, None] if registry._rg else [None]
+        for rg in backends:
+            registry._rg = rg
+            for pattern, files in expected.items():
+                assert registry._list_files(pattern) == files, (rg, pattern)
+            # A starting directory lists paths relative to the project root
+            assert registry._list_files("*.py", "a/b") == ["a/b/deep.py"]
+        print(f"  Listings match on {len(backends)} backend(s)")
+
+        print("\n  [PASS] List files works correctly")
+
+
+def test_tool_glob_matcher():
+    """Test that glob patterns match per path component, as rglob does."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Glob Matcher")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir, "project")
+        _make_tree(root)
+        Path(root, "b").mkdir()
+        Path(root, "b", "side.py").write_text("")
+        walked = list(_walk_files(root))
+
+        patterns = [
+            "*.py", "**/*.py", "a/*.py", "a/**/*.py", "**/b/*.py", "b/*.py",
+            "a/b/*", "*/deep.py", "a/**/b/**/*.txt", "mod.py", "*.[tp][xy]*",
+        ]
+        for pattern in patterns:
+            matches = _glob_matcher(pattern)
+            found = sorted(rel for _, rel, name in walked if matches(rel, name))
+            expected = sorted(
+                str(p.relative_to(root)) for p in root.rglob(pattern) if p.is_file()
+            )
+            expected = [rel for rel in expected if rel in {r for _, r, _ in walked}]
+            assert found == expected, (pattern, found, expected)
+            print(f"  {pattern!r}: {found}")
+
+        # "*/" no longer collapses to a name match at any depth
+        assert not _glob_matcher("a/*.py")("a/b/deep.py", "deep.py")
+        assert _glob_matcher("a/**/*.py")("a/mod.py", "mod.py")
+        # A bare "**" lists every file, as `rg --files -g "**"` does
+        assert all(_glob_matcher("**")(rel, name) for _, rel, name in walked)
+
+        print("\n  [PASS] Glob matcher works correctly")
+
+
+def test_tool_walk():
+    """Test that the file walk prunes excluded directories by exact name."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry File Walk")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        root = Path(tmpdir, "project")
+        _make_tree(root)
+        for name in ("builds/keep.py", "a/venv_tools/keep.py", "a/b/build"):
+            Path(root, name).parent.mkdir(parents=True, exist_ok=True)
+            Path(root, name).write_text("")
+        # Symlinked directories are not followed
+        os.symlink(root / "a", root / "link")
+
+        walked = sorted(rel for _, rel, _ in _walk_files(root))
+        print(f"  Walked: {walked}")
+        assert walked == [
+            ".hidden/notes.txt", "a/b/build", "a/b/deep.py", "a/b/notes.txt",
+            "a/mod.py", "a/venv_tools/keep.py", "builds/keep.py", "top.py",
+        ]
+        assert all(
+            path == os.path.join(root, rel) and name == os.path.basename(rel)
+            for path, rel, name in _walk_files(root)
+        )
+
+        print("\n  [PASS] File walk works correctly")
+
+
+def test_tool_async_audit():
+    """Test off-thread tool audit logging keeps entries complete and ordered."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Async Audit")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "tool_async_audit.jsonl"))
+        registry = ToolRegistry(
+            logger, ["ls"], ["rm -rf"], project_root=tmpdir,
+            audit_async=True, audit_queue_size=4
+        )
+        Path(tmpdir, "data.txt").write_text("payload")
+
+        # More calls than the queue holds: execute() waits, never drops
+        for i in range(20):
+            result = registry.execute("read_file", {"path": "data.txt"}, agent_id=f"agent_{i}")
+            assert result["success"]
+        result = registry.execute("read_file", {"path": "missing.txt"}, agent_id="agent_x")
+        assert not result["success"]
+        registry.flush()
+
+        entries = logger.get_entries()
+        print(f"  {len(entries)} entries written after flush()")
+        assert len(entries) == 42
+        assert [e.agent_id for e in entries[:4]] == ["agent_0", "agent_0", "agent_1", "agent_1"]
+        assert entries[-1].success is False
+        assert "File not found" in entries[-1].error_message
+        assert logger.verify_chain()[0]
+
+        print("\n  [PASS] Async tool audit works correctly")
+
+
+def test_tool_search_prefilter():
+    """Test that the literal prefilter never skips a file that matches."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Search Prefilter")
+    print("=" * 60)
+
+    assert _extract_literal(r"def\s+helper_fn\(") == "helper_fn"
+    assert _extract_literal(r"colou?r_name") == "r_name"  # "u" is optional
+    assert _extract_literal(r"(helper)s") == "s"  # Groups are skipped
+    assert _extract_literal(r"foo|bar") is None
+    assert _extract_literal(r"[abc]xyz\x41qq") == "xyz"
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "prefilter_audit.jsonl"))
+        root = Path(tmpdir, "project")
+        _make_tree(root)
+        Path(root, "colors.py").write_text("color_name = 1\ncolour_name = 2\nCOLOR_NAME = 3\n")
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=str(root))
+        registry._rg = None
+
+        patterns = [
+            "helper", "HELPER", r"\bhelper\b", "helpe{0,1}r", "[h]elper", "help(er)",
+            "colou?r_name", "colo(u)?r_NAME", "helper|color", r"h\x65lper", "help.r",
+        ]
+        for pattern in patterns:
+            regex = re.compile(pattern, re.IGNORECASE)
+            expected = [
+                (rel, i)
+                for _, rel, name in sorted(_walk_files(root))
+                if name.endswith(".py")
+                for i, line in enumerate(Path(root, rel).read_text().splitlines(), 1)
+                if regex.search(line)
+            ]
+            found = sorted((r["file"], r["line"]) for r in registry._search_files(pattern))
+            assert found == sorted(expected), pattern
+        print(f"  {len(patterns)} patterns match a plain re scan")
+
+        print("\n  [PASS] Search prefilter works correctly")
+
+
+def test_tool_search_parallel():
+    """Test that the threaded search returns results in walk order."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Parallel Search")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "parallel_audit.jsonl"))
+        root = Path(tmpdir, "project")
+        target_line = {}
+        for i in range(60):
+            # Uneven file sizes, so scans finish out of order
+            rel = os.path.join(f"pkg{i % 5}", f"mod{i}.py")
+            target_line[rel] = i * 500 % 7919 + 1
+            Path(root, rel).parent.mkdir(parents=True, exist_ok=True)
+            Path(root, rel).write_text("pass\n" * (target_line[rel] - 1) + "TARGET = 1\n")
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=str(root))
+        registry._rg = None
+
+        expected = [(rel, target_line[rel]) for _, rel, _ in _walk_files(root)]
+        for _ in range(3):
+            found = [(r["file"], r["line"]) for r in registry._search_files("target")]
+            assert found == expected
+        print(f"  {len(found)} matches in walk order")
+
+        print("\n  [PASS] Parallel search works correctly")
+
+
+def test_tool_run_shell():
+    """Test run_shell output tails, stderr, exit codes and timeouts."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Run Shell")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "shell_audit.jsonl"))
+        registry = ToolRegistry(
+            logger, [sys.executable, "sleep"], ["rm -rf"], project_root=tmpdir
+        )
+        python = f"{sys.executable} -c"
+
+        # Only the last MAX_SHELL_OUTPUT_LINES lines of each stream are kept
+        output = registry._run_shell(
+            f"{python} \"import sys; [print(i) for i in range(1200)]; "
+            f"sys.stderr.write('warn\\n'); sys.exit(3)\""
+        )
+        lines = output.splitlines()
+        print(f"  First line: {lines[0]}")
+        assert lines[0] == f"... [{1200 - MAX_SHELL_OUTPUT_LINES} earlier lines omitted]"
+        assert lines[1] == str(1200 - MAX_SHELL_OUTPUT_LINES)
+        assert output.endswith("\n1199\n\nSTDERR: warn\n\nReturn code: 3")
+
+        # Lines are read in bounded pieces, so one huge line is cut too
+        output = registry._run_shell(f"{python} \"print('x' * 10000)\"")
+        assert output == "x" * 10000 + "\n"
+        limit = MAX_SHELL_OUTPUT_LINES * MAX_SHELL_LINE_LENGTH
+        output = registry._run_shell(f"{python} \"print('x' * {2 * limit})\"")
+        omitted, kept = output.split("\n", 1)
+        assert omitted.startswith("... [") and omitted.endswith(" earlier lines omitted]")
+        assert kept.rstrip("\n") == "x" * len(kept.rstrip("\n"))
+        assert len(kept) <= limit
+
+        # Commands are killed at the timeout
+        start = time.monotonic()
+        with mock.patch("sdlc.tools.registry.SHELL_TIMEOUT", 0.5):
+            result = registry.execute("run_shell", {"command": "sleep 30"})
+        elapsed = time.monotonic() - start
+        print(f"  Timeout: {result['error']}")
+        assert not result["success"] and "timed out" in result["error"]
+        assert elapsed < 10
+
+        print("\n  [PASS] Run shell works correctly")
+
+
+def test_tool_shell_target():
+    """Test that shell-free commands are exec'd directly, others via /bin/sh."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Shell Target")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "target_audit.jsonl"))
+        registry = ToolRegistry(
+            logger, ["echo", "no_such_program_x", "./run.sh"], ["rm -rf"], project_root=tmpdir
+        )
+
+        # Plain commands are split with shlex and their program looked up once
+        _CMD_PATH_CACHE.pop("echo", None)
+        target = _shell_target('echo "a  b" c')
+        print(f"  Direct: {target}")
+        assert target["args"] == ["echo", "a  b", "c"] and "shell" not in target
+        assert target["executable"] == _CMD_PATH_CACHE["echo"]
+        with mock.patch("sdlc.tools.registry.shutil.which") as which:
+            assert _shell_target("echo x")["executable"] == _CMD_PATH_CACHE["echo"]
+            which.assert_not_called()
+
+        # Shell syntax, paths, unknown programs and bad quoting use the shell
+        for command in ("echo $HOME", "echo a | wc", "echo *", "./run.sh",
+                        "no_such_program_x", "echo 'open"):
+            assert _shell_target(command) == {"args": command, "shell": True}, command
+
+        # Both paths run the command as /bin/sh would
+        assert registry._run_shell('echo "a  b"   c') == "a  b c\n"
+        assert registry._run_shell("echo $((1 + 2))") == "3\n"
+        output = registry._run_shell("no_such_program_x")
+        assert output.endswith("\nReturn code: 127") and "not found" in output
+        print("  Direct and shell runs give the same output")
+
+        print("\n  [PASS] Shell target works correctly")
+
+
+def test_tool_edit_file():
+    """Test edit_file replaces exactly one occurrence or explains why not."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Edit File")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "edit_audit.jsonl"))
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=tmpdir)
+        path = Path(tmpdir, "mod.py")
+
+        def edit(content, old_text, new_text="X"):
+            path.write_text(content, encoding="utf-8")
+            result = registry.execute(
+                "edit_file", {"path": "mod.py", "old_text": old_text, "new_text": new_text}
+            )
+            return result.get("error") or path.read_text(encoding="utf-8")
+
+        assert edit("def f():\n    return 1\n", "return 1", "2") == "def f():\n    2\n"
+        assert edit("aaa", "aa") == "Xa"  # Occurrences are counted without overlap
+        assert edit("café ✓", "✓") == "café X"
+        assert edit("x = 1\nx = 1\n", "x = 1") == (
+            "Found 2 occurrences of text. Please provide more context to make it unique."
+        )
+        assert edit("aaaa", "aa").startswith("Found 2 occurrences")
+        assert edit("abc", "zzz").startswith("Text not found in file: zzz")
+        assert path.read_text() == "abc"  # Failed edits leave the file alone
+        args = {"path": "nope.py", "old_text": "a", "new_text": "b"}
+        result = registry.execute("edit_file", args)
+        assert result["error"] == "File not found: nope.py"
+        print("  Unique, repeated and missing text handled")
+
+        print("\n  [PASS] Edit file works correctly")
+
+
+def test_tool_result_preview():
+    """Test that audit result previews equal str(result)[:200]."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Result Preview")
+    print("=" * 60)
+
+    results = [
+        "x" * 500,
+        "short",
+        [],
+        ["a.py"],
+        [f"pkg/module_{i}.py" for i in range(1000)],
+        [{"file": "a.py", "line": i, "content": "it's \"quoted\""} for i in range(50)],
+        ["x" * 300],
+        [1, None, 2.5],
+        {"key": list(range(100))},
+        42,
+    ]
+    for result in results:
+        for limit in (200, 1, 10):
+            assert _preview(result, limit) == str(result)[:limit], (result, limit)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "preview_audit.jsonl"))
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=tmpdir)
+        for i in range(300):
+            Path(tmpdir, f"m{i:03d}.py").write_text("")
+        listing = registry.execute("list_files", {"pattern": "*.py"})["result"]
+        logged = json.loads(logger.get_entries()[-1].output_data)["result_preview"]
+        print(f"  Preview: {logged[:50]}...")
+        assert logged == str(listing)[:200]
+
+    print("\n  [PASS] Result preview works correctly")
+
+
+def test_tool_resolve_path():
+    """Test cached path resolution stays per project root."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Path Resolution")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "resolve_audit.jsonl"))
+        first = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=os.path.join(tmpdir, "a"))
+        second = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=os.path.join(tmpdir, "b"))
+
+        hits = _resolve.cache_info().hits
+        assert first._resolve_path("src/x.py") == Path(tmpdir, "a", "src", "x.py")
+        assert first._resolve_path("src/x.py") == Path(tmpdir, "a", "src", "x.py")
+        assert _resolve.cache_info().hits == hits + 1
+        # Same relative path under another root is not served from the cache
+        assert second._resolve_path("src/x.py") == Path(tmpdir, "b", "src", "x.py")
+        assert first._resolve_path("/etc/hosts") == Path("/etc/hosts")
+
+        # Resolution is lexical, so files created later are still found
+        second.execute("write_file", {"path": "src/x.py", "content": "y = 1\n"})
+        assert second.execute("read_file", {"path": "src/x.py"})["result"] == "y = 1\n"
+        print("  Paths resolved per root")
+
+    print("\n  [PASS] Path resolution works correctly")
+
+
+def test_tool_search_bytes():
+    """Test the bytes fast path against a line-by-line str search."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Bytes Search")
+    print("=" * 60)
+
+    files = {
+        "ascii.py": b"foo = 1\nbar = foo\n  FOO_BAR = 2  \nend",
+        "crlf.py": b"foo\r\nbar\r\nfoobar\r\n",
+        "utf8.py": "café = 1\nCAFÉ = 2\nnaïve foo\n".encode("utf-8"),
+        "invalid.py": b"foo\xff\xfe bar\nbaz\n",
+        "breaks.py": "foo\x0cbar\nlast foo\n".encode("utf-8"),
+        "cr.py": b"foo\rbar\rfoo",
+    }
+    patterns = [
+        "foo", "FOO", "^foo$", r"\w+ar$", "caf.", "É", "é = 2", r"foo\s*$",
+        "^$", "bar|baz", r"\bfoo\b", "[^a-z ]+", "o b",
+    ]
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "bytes_audit.jsonl"))
+        root = Path(tmpdir, "project")
+        root.mkdir()
+        for name, data in files.items():
+            Path(root, name).write_bytes(data)
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=str(root))
+        registry._rg = None
+
+        for pattern in patterns:
+            regex = re.compile(pattern, re.IGNORECASE)
+            expected = sorted(
+                (name, i, line.strip()[:200])
+                for name in files
+                for i, line in enumerate(
+                    Path(root, name).read_text(encoding="utf-8", errors="ignore").splitlines(), 1
+                )
+                if regex.search(line)
+            )
+            found = sorted(
+                (r["file"], r["line"], r["content"]) for r in registry._search_files(pattern)
+            )
+            assert found == expected, pattern
+        print(f"  {len(patterns)} patterns x {len(files)} files match a per-line search")
+
+        print("\n  [PASS] Bytes search works correctly")
+
+
+def test_tool_search_limit():
+    """Test that search stops once MAX_SEARCH_RESULTS matches are found."""
+    print("\n" + "=" * 60)
+    print("TEST: Tool Registry Search Limit")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "limit_audit.jsonl"))
+        root = Path(tmpdir, "project")
+        for i in range(300):
+            Path(root, f"d{i % 7}").mkdir(parents=True, exist_ok=True)
+            Path(root, f"d{i % 7}", f"m{i}.py").write_text(f"x = 1\nneedle_{i} = 2\n")
+        registry = ToolRegistry(logger, ["ls"], ["rm -rf"], project_root=str(root))
+        registry._rg = None
+
+        # The first MAX_SEARCH_RESULTS matches in walk order, and no more
+        expected = [
+            (rel, 2, f"needle_{name[1:-3]} = 2") for _, rel, name in _walk_files(root)
+        ][:MAX_SEARCH_RESULTS]
+        with mock.patch.object(registry, "_scan_file", wraps=registry._scan_file) as scan:
+            results = registry._search_files("needle")
+        assert [(r["file"], r["line"], r["content"]) for r in results] == expected
+        print(f"  {len(results)} results after scanning {scan.call_count} of 300 files")
+        assert scan.call_count < 300
+
+        # One file alone stops at the cap too
+        Path(root, "d0", "many.py").write_text("needle\n" * 250)
+        results = registry._search_files("needle", path="d0", file_pattern="many.py")
+        assert len(results) == MAX_SEARCH_RESULTS
+        assert [r["line"] for r in results] == list(range(1, MAX_SEARCH_RESULTS + 1))
+
+        print("\n  [PASS] Search limit works correctly")
+
+
+def test_agent_tools():
+    """Test the standalone agent's tool executors (tools.py)."""
+    print("\n" + "=" * 60)
+    print("TEST: Agent Tools")
+    print("=" * 60)
+
+    try:
+        import tools
+    except ImportError as e:
+        print(f"  [SKIP] tools.py unavailable: {e}")
+        return
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        saved = tools.PROJECT_DIR, tools._PROJECT_ROOT
+        tools.PROJECT_DIR, tools._PROJECT_ROOT = tmpdir, Path(tmpdir).resolve()
+        try:
+            # Only regular files are read; a FIFO would block forever
+            os.mkfifo(os.path.join(tmpdir, "pipe"))
+            result = tools.read_file("pipe")
+            print(f"  read_file(FIFO): {result.error}")
+            assert not result.success and result.error.startswith("Not a file")
+            assert tools.read_file("missing.txt").error.startswith("File not found")
+            assert tools.read_file(tmpdir).error.startswith("Not a file")
+
+            # Only the shown prefix is read and decoded
+            limit = tools.MAX_READ_CHARS
+            Path(tmpdir, "exact.txt").write_text("é" * limit, encoding="utf-8")
+            assert tools.read_file("exact.txt").output == "é" * limit
+            Path(tmpdir, "large.txt").write_text("é" * limit + "tail", encoding="utf-8")
+            output = tools.read_file("large.txt").output
+            assert output == "é" * limit + "\n\n... [truncated, file too large]"
+            Path(tmpdir, "binary.dat").write_bytes(b"ok\xff\xfe")
+            assert tools.read_file("binary.dat").output == "ok\ufffd\ufffd"
+
+            # execute_tool dispatch: defaults, unused arguments, respond
+            result = tools.execute_tool("read_file", path="exact.txt", thinking="why")
+            assert result.output == "é" * limit
+            assert tools.execute_tool("read_file").error.startswith("Not a file")
+            assert "exact.txt" in tools.execute_tool("list_files").output.split("\n")
+            result = tools.execute_tool("edit_file", path="exact.txt", old_text="é" * limit)
+            assert result.success and Path(tmpdir, "exact.txt").read_text() == ""
+            assert tools.execute_tool("respond", response="done").output == "done"
+            assert tools.execute_tool("delete_all").error == "Unknown action: delete_all"
+
+            # list_files orders only the shown paths and counts the rest
+            os.mkdir(os.path.join(tmpdir, "many"))
+            names = [f"f{i:03}.txt" for i in range(tools.MAX_LIST_FILES + 5)]
+            for name in reversed(names):
+                Path(tmpdir, "many", name).touch()
+            lines = tools.list_files("many/*.txt").output.split("\n")
+            assert lines[:-2] == [f"many/{name}" for name in names[:tools.MAX_LIST_FILES]]
+            assert lines[-2:] == ["", "... and 5 more files"]
+            print(f"  list_files: {lines[-1]}")
+
+            # Output does not depend on whether ripgrep is installed
+            Path(tmpdir, "src", "sub").mkdir(parents=True)
+            for name in ("a.py", ".hid.py", "sub/b.py", ".cache/c.py"):
+                Path(tmpdir, "src", name).parent.mkdir(exist_ok=True)
+                Path(tmpdir, "src", name).write_text("")
+            rg_path = tools.RG_PATH
+            patterns = ["src/*.py", "src/*", "**/*.py", "src/**/*.py", "src/.hid.py", "*"]
+            listings = []
+            for backend in ([rg_path, None] if rg_path else [None]):
+                tools.RG_PATH = backend
+                listings.append([tools.list_files(p).output for p in patterns])
+            tools.RG_PATH = rg_path
+            assert all(listing == listings[0] for listing in listings)
+            assert listings[0][0] == "src/a.py"
+            assert listings[0][1] == "src/a.py\nsrc/sub"
+            assert "src" in listings[0][5].split("\n")
+
+            # A failed rg run falls back to glob instead of listing nothing
+            failed = mock.Mock(returncode=2, stdout="")
+            with mock.patch.object(tools, "RG_PATH", "rg"), \
+                    mock.patch.object(tools.subprocess, "run", return_value=failed):
+                assert tools.list_files("src/*.py").output == "src/a.py"
+            print(f"  list_files agrees on {len(listings)} backend(s)")
+
+            # Blocked patterns match case-insensitively; programs by basename
+            assert tools.is_command_safe("ls -la") == (True, "")
+            assert tools.is_command_safe("/usr/bin/git status") == (True, "")
+            assert tools.is_command_safe("SUDO ls") == (False, "Blocked pattern detected: sudo")
+            assert tools.is_command_safe("echo x > /dev/sda")[1].endswith("> /dev/")
+            assert tools.is_command_safe("   ") == (False, "Empty command")
+            safe, reason = tools.is_command_safe("/bin/bash -c ls")
+            assert not safe and reason.startswith("Command 'bash' not in allowed list")
+            print(f"  is_command_safe: {reason[:40]}...")
+
+            # Writes stay inside the project, compared by path component
+            assert tools.write_file("nested/dir/out.txt", "hi").success
+            assert Path(tmpdir, "nested", "dir", "out.txt").read_text() == "hi"
+            for path in ("../escape.txt", tmpdir + "_evil/out.txt", "nested/../../x.txt"):
+                result = tools.write_file(path, "no")
+                assert result.error.startswith("Cannot write outside project directory"), path
+            assert not os.path.exists(tmpdir + "_evil")
+            os.symlink(os.path.dirname(tmpdir), os.path.join(tmpdir, "up"))
+            assert not tools.write_file("up/escape.txt", "no").success
+            print("  write_file: rejected ../, sibling prefix and symlinked escapes")
+
+            # run_shell execs plain commands directly, others through /bin/sh
+            assert tools._shell_target("ls -a")["args"] == ["ls", "-a"]
+            assert tools._shell_target("ls | wc") == {"args": "ls | wc", "shell": True}
+            assert tools.run_shell('echo "a  b"').output == "a  b\n"
+            assert tools.run_shell("echo $((1 + 2))").output == "3\n"
+            assert tools.run_shell("cat missing.txt").error == "Command exited with code 1"
+        finally:
+            tools.PROJECT_DIR, tools._PROJECT_ROOT = saved
+
+        print("\n  [PASS] Agent tools work correctly")
+
+
+def test_test_generator_prompts():
+    """Test that prompt builders are memoized on their inputs."""
+    print("\n" + "=" * 60)
+    print("TEST: Test Generator Prompt Builders")
+    print("=" * 60)
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        logger = AuditLogger(os.path.join(tmpdir, "prompts_audit.jsonl"))
+        agent = TestGeneratorAgent(
+            config=AgentConfig(model_name="gemma2:2b"),
+            audit=logger,
+            approval=ApprovalGate(logger, auto_approve=True),
+            project_root=tmpdir
+        )
+
+        functions = [{"name": "add", "args": ["a", "b"], "returns": "int"}]
+        render = TestGeneratorAgent._render_signatures_prompt
+        hits = render.cache_info().hits
+        prompt = agent._build_signatures_prompt(functions)
+        # Equal (but distinct) inputs reuse the rendered prompt
+        assert agent._build_signatures_prompt([dict(functions[0])]) is prompt
+        assert render.cache_info().hits == hits + 1
+        assert "- add(a, b) -> int" in prompt
+
+        criteria = [{
+            "requirement_id": "REQ-1",
+            "requirement_title": "Login",
+            "criterion": "Rejects bad passwords"
+        }]
+        prompt = agent._build_requirements_prompt("Auth", criteria)
+        assert agent._build_requirements_prompt("Auth", list(criteria)) is prompt
+        assert "1. [REQ-1] Login" in prompt
+        assert "   Criterion: Rejects bad passwords" in prompt
+        print("  Prompts rendered once per distinct input")
+
+        print("\n  [PASS] Test generator prompt builders work correctly")
+
+
 def test_requirements_agent():
     """Test Requirements Analyst agent."""
     print("\n" + "=" * 60)
@@ -446,8 +2955,67 @@ def main():
     print("=" * 60)
 
     test_audit_logging()
+    test_audit_hash_compatibility()
+    test_audit_tamper_detection()
+    test_audit_parallel_verify()
+    test_audit_append_descriptor()
+    test_audit_query_index()
+    test_audit_line_format()
+    test_audit_returned_entries()
+    test_audit_verify_records()
+    test_audit_state_sidecar()
+    test_audit_read_lines()
+    test_audit_timestamps()
+    test_audit_logger_lifetime()
+    test_audit_canonicalizer()
+    test_audit_digest_sidecar()
+    test_audit_entry_slots()
+    test_audit_query_filters()
+    test_audit_time_range()
+    test_audit_summary()
+    test_audit_session_ids()
+    test_audit_tail_resume()
+    test_audit_lone_surrogates()
+    test_audit_batching()
+    test_async_audit_writer()
     test_approval_gate()
+    test_async_approval()
+    test_shell_reversibility()
+    test_request_ids()
+    test_proposal_display()
+    test_lazy_original()
+    test_pending_requests()
+    test_status_labels()
+    test_concurrent_approval()
+    test_decision_cache()
+    test_proposal_serialization()
+    test_cli_prompt()
+    test_cli_batch_prompt()
+    test_batched_approval()
+    test_diff_rendering()
+    test_diff_output()
+    test_mmap_diff()
+    test_streaming_diff()
+    test_editor_modification()
+    test_prompt_modification()
+    test_config_command_checks()
     test_tool_registry()
+    test_tool_search()
+    test_tool_list_files()
+    test_tool_glob_matcher()
+    test_tool_walk()
+    test_tool_async_audit()
+    test_tool_search_prefilter()
+    test_tool_search_parallel()
+    test_tool_search_bytes()
+    test_tool_search_limit()
+    test_tool_run_shell()
+    test_tool_shell_target()
+    test_tool_edit_file()
+    test_tool_result_preview()
+    test_tool_resolve_path()
+    test_agent_tools()
+    test_test_generator_prompts()
     test_requirements_agent()
     test_test_generator_agent()
     test_doc_generator_agent()
@@ -9,13 +9,63 @@ Provides shared tools that all agents can use:
 All tools integrate with audit logging for compliance.
 """
 
+import base64
+import fnmatch
+import json
 import os
+import re
+import shlex
+import shutil
+import signal
 import subprocess
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
+from functools import lru_cache
+from itertools import islice
 from pathlib import Path
-from typing import Any, Callable, Dict, List, Optional
+from typing import IO, Any, AnyStr, Callable, Dict, Iterator, List, Optional, Tuple
 
-from ..audit import AuditLogger, AuditAction
+from ..audit import AuditLogger, AuditAction, AsyncAuditWriter
+from ..config import allowed_command_set, compile_blocked_patterns
+
+# Directories skipped by list_files and search_files
+EXCLUDED_DIRS = frozenset({
+    "venv", "node_modules", ".git", "__pycache__",
+    ".pytest_cache", "dist", "build", ".egg-info"
+})
+
+# Maximum matches returned by search_files
+MAX_SEARCH_RESULTS = 100
+
+# run_shell limits: seconds before the command is killed, and how much of
+# each output stream is kept (the last lines; longer lines are split)
+SHELL_TIMEOUT = 60
+MAX_SHELL_OUTPUT_LINES = 500
+MAX_SHELL_LINE_LENGTH = 4096
+
+# Operators, expansions, globs and escapes only /bin/sh handles; commands
+# without them run directly, saving a shell start per call
+_SHELL_SYNTAX_RE = re.compile(r"[|&;<>()$`\\*?\[\]{}~!#\n]")
+
+# Program name -> resolved path, for commands run without a shell
+_CMD_PATH_CACHE: Dict[str, str] = {}
+
+# Inline flags that turn on verbose mode, e.g. "(?x)" or "(?ix)"
+_VERBOSE_FLAG_RE = re.compile(r"\(\?[aiLmsu-]*x")
+
+# Characters following the escape letter in \xhh, \uhhhh and \Uhhhhhhhh
+_ESCAPE_WIDTHS = {"x": 2, "u": 4, "U": 8}
+
+# Line boundaries str.splitlines() recognizes besides "\n" (as str, and
+# the ASCII ones as bytes)
+_LINE_BREAKS = re.compile("[\r\x0b\x0c\x1c-\x1e\x85\u2028\u2029]")
+_BYTE_LINE_BREAKS = re.compile(b"[\r\x0b\x0c\x1c-\x1e]")
+
+# Pattern syntax that depends on what lies outside a single line: string
+# anchors, lookarounds and inline flags that can remove MULTILINE
+_LINE_CONTEXT_RE = re.compile(r"\\[AZ]|\(\?<?[=!]|\(\?[a-zA-Z]*-")
 
 
 @dataclass
@@ -56,7 +106,9 @@ class ToolRegistry:
         audit: AuditLogger,
         allowed_commands: List[str],
         blocked_patterns: List[str],
-        project_root: Optional[str] = None
+        project_root: Optional[str] = None,
+        audit_async: bool = False,
+        audit_queue_size: int = 10_000
     ):
         """
         Initialize tool registry.
@@ -66,12 +118,23 @@ class ToolRegistry:
             allowed_commands: Shell commands that are allowed
             blocked_patterns: Patterns that block shell execution
             project_root: Root directory for file operations
+            audit_async: If True, write tool audit entries from a background
+                         thread so tool calls do not wait on log writes
+            audit_queue_size: Max queued audit entries; execute() blocks
+                              when the queue is full (entries are never
+                              dropped)
         """
         self.audit = audit
         self.allowed_commands = allowed_commands
         self.blocked_patterns = blocked_patterns
         self.project_root = Path(project_root) if project_root else Path.cwd()
         self._tools: Dict[str, Tool] = {}
+        self._audit_writer = (
+            AsyncAuditWriter(audit, maxsize=audit_queue_size) if audit_async else None
+        )
+
+        # ripgrep executable for list_files and search_files, if installed
+        self._rg = shutil.which("rg")
 
         # Register built-in tools
         self._register_builtin_tools()
@@ -216,7 +279,7 @@ class ToolRegistry:
             return {"success": False, "error": f"Unknown tool: {tool_name}"}
 
         # Log tool call
-        self.audit.log(
+        self._log(
             action=AuditAction.TOOL_CALLED,
             agent_id=agent_id,
             input_data={"tool": tool_name, "args": args},
@@ -227,11 +290,11 @@ class ToolRegistry:
             result = tool.executor(**args)
 
             # Log result
-            self.audit.log(
+            self._log(
                 action=AuditAction.TOOL_RESULT,
                 agent_id=agent_id,
                 input_data={"tool": tool_name},
-                output_data={"success": True, "result_preview": str(result)[:200]},
+                output_data={"success": True, "result_preview": _preview(result)},
                 reasoning=f"Tool {tool_name} completed successfully"
             )
 
@@ -239,7 +302,7 @@ class ToolRegistry:
 
         except Exception as e:
             # Log error
-            self.audit.log(
+            self._log(
                 action=AuditAction.TOOL_RESULT,
                 agent_id=agent_id,
                 input_data={"tool": tool_name},
@@ -251,6 +314,18 @@ class ToolRegistry:
 
             return {"success": False, "error": str(e)}
 
+    def flush(self) -> None:
+        """Block until queued audit entries are written (audit_async only)."""
+        if self._audit_writer is not None:
+            self._audit_writer.flush()
+
+    def _log(self, **kwargs: Any) -> None:
+        """Log a tool event, off-thread if audit_async is set."""
+        if self._audit_writer is not None:
+            self._audit_writer.log(**kwargs)
+        else:
+            self.audit.log(**kwargs)
+
     # Tool executors
 
     def _read_file(self, path: str) -> str:
@@ -275,17 +350,21 @@ class ToolRegistry:
 
         content = file_path.read_text(encoding="utf-8")
 
-        if old_text not in content:
+        # One scan finds the match and checks that it is unique
+        start = content.find(old_text)
+        if start < 0:
             raise ValueError(f"Text not found in file: {old_text[:50]}...")
 
-        count = content.count(old_text)
-        if count > 1:
-            raise ValueError(
-                f"Found {count} occurrences of text. "
-                "Please provide more context to make it unique."
-            )
+        end = start + len(old_text)
+        if content.find(old_text, end) >= 0:
+            count = content.count(old_text)  # Only counted for the error
+            if count > 1:
+                raise ValueError(
+                    f"Found {count} occurrences of text. "
+                    "Please provide more context to make it unique."
+                )
 
-        new_content = content.replace(old_text, new_text)
+        new_content = content[:start] + new_text + content[end:]
         file_path.write_text(new_content, encoding="utf-8")
 
         return f"Replaced text in {path}"
@@ -294,29 +373,51 @@ class ToolRegistry:
         """List files matching pattern."""
         search_path = self._resolve_path(path) if path else self.project_root
 
-        excluded = {
-            "venv", "node_modules", ".git", "__pycache__",
-            ".pytest_cache", "dist", "build", ".egg-info"
-        }
+        if self._rg:
+            return self._list_with_ripgrep(pattern, search_path)
 
-        results = []
-        for file_path in search_path.rglob(pattern.lstrip("*/")):
-            if any(ex in file_path.parts for ex in excluded):
-                continue
-            try:
-                rel_path = file_path.relative_to(self.project_root)
-                results.append(str(rel_path))
-            except ValueError:
-                results.append(str(file_path))
+        matches = _glob_matcher(pattern)
+        results = [
+            self._relative_path(Path(file_path))
+            for file_path, rel_path, name in _walk_files(search_path)
+            if matches(rel_path, name)
+        ]
 
         return sorted(results)
 
+    def _list_with_ripgrep(self, pattern: str, search_path: Path) -> List[str]:
+        """
+        List files with `rg --files`, which prunes excluded directories
+        while walking instead of filtering their files afterwards.
+        """
+        # Like rglob, match the pattern at any depth
+        if not pattern.startswith("**/"):
+            pattern = f"**/{pattern}"
+        args = [self._rg, "--files", "--hidden", "--no-ignore", "-g", pattern]
+        for excluded in EXCLUDED_DIRS:
+            args += ["-g", f"!{excluded}"]
+        args += ["--", str(search_path)]
+
+        result = subprocess.run(
+            args,
+            capture_output=True,
+            encoding="utf-8",
+            errors="surrogateescape",
+            timeout=30
+        )
+        # Sorted, as rg's parallel walk does not fix an order
+        return sorted(
+            self._relative_path(Path(line))
+            for line in result.stdout.splitlines()
+        )
+
     def _run_shell(self, command: str) -> str:
         """Run shell command with safety checks."""
-        # Check blocked patterns
-        for pattern in self.blocked_patterns:
-            if pattern in command:
-                raise ValueError(f"Command blocked: contains '{pattern}'")
+        # Check blocked patterns (one pass of a cached alternation)
+        blocked = compile_blocked_patterns(tuple(self.blocked_patterns))
+        match = blocked.search(command) if blocked else None
+        if match:
+            raise ValueError(f"Command blocked: contains '{match.group(0)}'")
 
         # Check if command starts with allowed command
         cmd_parts = command.split()
@@ -324,27 +425,53 @@ class ToolRegistry:
             raise ValueError("Empty command")
 
         base_cmd = cmd_parts[0]
-        if base_cmd not in self.allowed_commands:
+        if base_cmd not in allowed_command_set(tuple(self.allowed_commands)):
             raise ValueError(
                 f"Command not allowed: {base_cmd}. "
                 f"Allowed: {', '.join(self.allowed_commands)}"
             )
 
-        # Run command
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
+        # Run command, streaming its output so only the tail is held
+        timed_out = threading.Event()
+        with subprocess.Popen(
+            **_shell_target(command),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=60,
-            cwd=str(self.project_root)
-        )
-
-        output = result.stdout
-        if result.stderr:
-            output += f"\nSTDERR: {result.stderr}"
-        if result.returncode != 0:
-            output += f"\nReturn code: {result.returncode}"
+            cwd=str(self.project_root),
+            start_new_session=True
+        ) as proc:
+            def kill() -> None:
+                # Kill the whole process group, so children of the shell
+                # release the output pipes too
+                timed_out.set()
+                try:
+                    if hasattr(os, "killpg"):
+                        os.killpg(proc.pid, signal.SIGKILL)
+                    else:
+                        proc.kill()
+                except ProcessLookupError:
+                    pass  # Exited just as the timer fired
+
+            timer = threading.Timer(SHELL_TIMEOUT, kill)
+            timer.start()
+            try:
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    stderr = pool.submit(_read_tail, proc.stderr)
+                    stdout = _read_tail(proc.stdout)
+                    stderr = stderr.result()
+                returncode = proc.wait()
+            finally:
+                timer.cancel()
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, SHELL_TIMEOUT)
+
+        output = stdout
+        if stderr:
+            output += f"\nSTDERR: {stderr}"
+        if returncode != 0:
+            output += f"\nReturn code: {returncode}"
 
         return output
 
@@ -355,42 +482,456 @@ class ToolRegistry:
         file_pattern: str = "*.py"
     ) -> List[dict]:
         """Search for pattern in files."""
-        import re
-
         search_path = self._resolve_path(path) if path else self.project_root
-        regex = re.compile(pattern, re.IGNORECASE)
-
-        excluded = {
-            "venv", "node_modules", ".git", "__pycache__",
-            ".pytest_cache", "dist", "build", ".egg-info"
-        }
+        # Compiled even when ripgrep runs, so invalid patterns fail the same way.
+        # MULTILINE lets ^ and $ match at line ends in whole-file searches.
+        regex = re.compile(pattern, re.IGNORECASE | re.MULTILINE)
+        if not search_path.is_dir():
+            return []
+
+        if self._rg:
+            results = self._search_with_ripgrep(pattern, search_path, file_pattern)
+            if results is not None:
+                return results
+
+        # ASCII files are searched as bytes, which matches exactly as the
+        # str regex does when pattern and text are both ASCII
+        try:
+            byte_regex = re.compile(pattern.encode("ascii"), regex.flags & ~re.UNICODE)
+        except (UnicodeEncodeError, re.error):
+            byte_regex = None
+
+        matches = _glob_matcher(file_pattern)
+        literal = _extract_literal(pattern)
+        if literal:
+            literal = literal.lower()
+        file_paths = (
+            Path(file_path)
+            for file_path, rel_path, name in _walk_files(search_path)
+            if matches(rel_path, name)
+        )
 
+        # File reads release the GIL, so threads overlap I/O across files.
+        # Scans are submitted as the walk goes, a bounded window ahead of
+        # the results taken in walk order, so once MAX_SEARCH_RESULTS are
+        # in hand the walk stops and queued scans are cancelled.
         results = []
-        for file_path in search_path.rglob(file_pattern):
-            if any(ex in file_path.parts for ex in excluded):
-                continue
+        workers = min(32, (os.cpu_count() or 1) + 4)
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            pending = deque()
+            for file_path in file_paths:
+                pending.append(
+                    pool.submit(self._scan_file, file_path, regex, byte_regex, literal)
+                )
+                if len(pending) >= 2 * workers:
+                    results.extend(pending.popleft().result())
+                    if len(results) >= MAX_SEARCH_RESULTS:
+                        break
+            while pending and len(results) < MAX_SEARCH_RESULTS:
+                results.extend(pending.popleft().result())
+            for future in pending:
+                future.cancel()
+
+        return results[:MAX_SEARCH_RESULTS]  # Limit results
+
+    def _scan_file(
+        self,
+        file_path: Path,
+        regex: re.Pattern,
+        byte_regex: Optional[re.Pattern],
+        literal: Optional[str]
+    ) -> List[dict]:
+        """
+        Matches of regex in one file (literal is a lowercase prefilter).
 
-            try:
-                content = file_path.read_text(encoding="utf-8", errors="ignore")
-                for i, line in enumerate(content.splitlines(), 1):
-                    if regex.search(line):
-                        try:
-                            rel_path = str(file_path.relative_to(self.project_root))
-                        except ValueError:
-                            rel_path = str(file_path)
-                        results.append({
-                            "file": rel_path,
-                            "line": i,
-                            "content": line.strip()[:200]
-                        })
-            except Exception:
-                continue
+        Stops after MAX_SEARCH_RESULTS matches, as no more can be returned.
+        """
+        try:
+            data = file_path.read_bytes()
+        except Exception:
+            return []
+
+        if byte_regex is not None and data.isascii() and not _BYTE_LINE_BREAKS.search(data):
+            # Search the raw bytes and decode only the matching lines.
+            # Substring prefilter; only exact for ASCII under IGNORECASE.
+            if literal and literal.encode("ascii") not in data.lower():
+                return []
+            lines = (
+                (i, line.decode("ascii"))
+                for i, line in _matching_lines(byte_regex, data)
+            )
+        else:
+            content = data.decode("utf-8", errors="ignore")
+            if literal and content.isascii() and literal not in content.lower():
+                return []
+            if _LINE_BREAKS.search(content):
+                # Breaks other than "\n": keep exact splitlines() semantics
+                lines = (
+                    (i, line)
+                    for i, line in enumerate(content.splitlines(), 1)
+                    if regex.search(line)
+                )
+            else:
+                lines = _matching_lines(regex, content)
+
+        return [
+            {
+                "file": self._relative_path(file_path),
+                "line": i,
+                "content": line.strip()[:200]
+            }
+            for i, line in islice(lines, MAX_SEARCH_RESULTS)
+        ]
+
+    def _search_with_ripgrep(
+        self,
+        pattern: str,
+        search_path: Path,
+        file_pattern: str
+    ) -> Optional[List[dict]]:
+        """
+        Search with ripgrep, reading its JSON output as it is produced.
+
+        Hidden and git-ignored files are searched, like the Python walk;
+        ripgrep is stopped once MAX_SEARCH_RESULTS matches are read.
 
-        return results[:100]  # Limit results
+        Returns None when ripgrep's regex engine rejects a pattern that
+        Python's re accepts (lookaround, backreferences), so the caller
+        can search with re instead. Other ripgrep failures raise.
+        """
+        # Sorted by path, so the first MAX_SEARCH_RESULTS are the Python walk's
+        args = [
+            self._rg, "--json", "-n", "-i", "--hidden", "--no-ignore", "--sort", "path",
+            "-g", file_pattern
+        ]
+        for excluded in EXCLUDED_DIRS:
+            args += ["-g", f"!{excluded}"]
+        args += ["-e", pattern, "--", str(search_path)]
+
+        results = []
+        proc = subprocess.Popen(args, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with ThreadPoolExecutor(max_workers=1) as pool:
+            stderr = pool.submit(proc.stderr.read)
+            try:
+                for line in proc.stdout:
+                    record = json.loads(line)
+                    if record["type"] != "match":
+                        continue
+                    data = record["data"]
+                    results.append({
+                        "file": self._relative_path(Path(_rg_text(data["path"]))),
+                        "line": data["line_number"],
+                        "content": _rg_text(data["lines"]).strip()[:200]
+                    })
+                    if len(results) >= MAX_SEARCH_RESULTS:
+                        proc.kill()  # Enough results; stop the search
+                        break
+                returncode = proc.wait()
+            finally:
+                proc.kill()
+                proc.stdout.close()
+                proc.wait()
+            stderr = stderr.result().decode("utf-8", errors="replace")
+            proc.stderr.close()
+
+        # Exit status 2 is an error; with no results, nothing was searched.
+        # Unreadable files alongside results are skipped, as in the Python walk
+        if returncode == 2 and not results:
+            if "regex parse error" in stderr:
+                return None
+            raise RuntimeError(f"ripgrep failed: {stderr.strip()}")
+
+        return results
+
+    def _relative_path(self, file_path: Path) -> str:
+        """Path relative to the project root, or as given if outside it."""
+        try:
+            return str(file_path.relative_to(self.project_root))
+        except ValueError:
+            return str(file_path)
 
     def _resolve_path(self, path: str) -> Path:
         """Resolve path relative to project root."""
-        p = Path(path)
-        if p.is_absolute():
-            return p
-        return self.project_root / p
+        return _resolve(self.project_root, path)
+
+
+@lru_cache(maxsize=1024)
+def _resolve(root: Path, path: str) -> Path:
+    """Path relative to root unless absolute; cached, as agents revisit files."""
+    p = Path(path)
+    if p.is_absolute():
+        return p
+    return root / p
+
+
+def _preview(result: Any, limit: int = 200) -> str:
+    """
+    str(result)[:limit], without stringifying all of a long list.
+
+    List results (list_files, search_files) are rendered item by item
+    only until the preview is full.
+    """
+    if isinstance(result, str):
+        return result[:limit]
+    if not isinstance(result, list):
+        return str(result)[:limit]
+
+    parts = []
+    size = -1  # Length of "[" + ", ".join(parts)
+    for item in result:
+        if size >= limit:
+            break
+        parts.append(repr(item))
+        size += len(parts[-1]) + 2
+    return ("[" + ", ".join(parts) + "]")[:limit]
+
+
+def _walk_files(root: Path) -> Iterator[Tuple[str, str, str]]:
+    """
+    Yield (path, path relative to root, name) for each file under root.
+
+    Entries are visited in name order, entering each directory where it
+    sorts, which is the order `rg --sort path` lists them in. Directories
+    in EXCLUDED_DIRS are skipped without being entered, so nothing inside
+    them is ever listed or stat'ed.
+    """
+    def entries(path: str) -> Iterator[os.DirEntry]:
+        try:
+            with os.scandir(path) as scan:
+                return iter(sorted(scan, key=lambda entry: entry.name))
+        except OSError:
+            return iter(())
+
+    root = str(root)
+    prefix_len = len(os.path.join(root, ""))
+    stack = [entries(root)]
+    while stack:
+        entry = next(stack[-1], None)
+        if entry is None:
+            stack.pop()
+        elif entry.is_dir(follow_symlinks=False):
+            if entry.name not in EXCLUDED_DIRS:
+                stack.append(entries(entry.path))
+        elif entry.is_file():
+            yield entry.path, entry.path[prefix_len:], entry.name
+
+
+def _glob_matcher(pattern: str) -> Callable[[str, str], bool]:
+    """
+    Build a (relative path, name) predicate that matches a glob at any
+    depth, as rglob does.
+
+    Each component is compiled once with fnmatch.translate; a "**"
+    component matches any number of directories. Name-only patterns
+    (including a leading "**/") test just the file name with one regex.
+    """
+    parts = [part for part in pattern.split("/") if part]
+    while parts and parts[0] == "**":
+        parts.pop(0)
+    if not parts:
+        return lambda rel_path, name: True
+
+    segments = [
+        None if part == "**" else re.compile(fnmatch.translate(part)).match
+        for part in parts
+    ]
+    match_name = segments[-1]
+    if len(segments) == 1:
+        return lambda rel_path, name: match_name(name) is not None
+
+    # Anchor at any depth, as rglob prefixes the pattern with "**/"
+    segments.insert(0, None)
+
+    def matches(rel_path: str, name: str) -> bool:
+        if match_name is not None and match_name(name) is None:
+            return False
+        return _match_segments(segments, rel_path.split(os.sep))
+
+    return matches
+
+
+def _match_segments(segments: List[Optional[Callable]], parts: List[str]) -> bool:
+    """
+    Whether path parts match glob segments (None standing for "**"),
+    tracking every reachable segment position at once so "**" never
+    backtracks.
+    """
+    def advance(states):
+        # A "**" may also match no directories at all
+        closed = set(states)
+        for i in sorted(states):
+            while i < len(segments) and segments[i] is None:
+                i += 1
+                closed.add(i)
+        return closed
+
+    states = advance({0})
+    for part in parts:
+        following = set()
+        for i in states:
+            if i == len(segments):
+                continue
+            if segments[i] is None:
+                following.add(i)
+            elif segments[i](part):
+                following.add(i + 1)
+        if not following:
+            return False
+        states = advance(following)
+    return len(segments) in states
+
+
+def _extract_literal(pattern: str) -> Optional[str]:
+    """
+    Longest run of word characters that every match of pattern contains.
+
+    Conservative: returns None for alternations, comments and verbose
+    patterns, ignores anything inside groups or character classes, and
+    drops a character made optional by a following ?, * or {m,n}.
+    """
+    if "|" in pattern or "(?#" in pattern or _VERBOSE_FLAG_RE.search(pattern):
+        return None
+
+    best, run, depth, i = "", "", 0, 0
+    while i < len(pattern):
+        char = pattern[i]
+        if char in "?*{":
+            run = run[:-1]  # The quantifier may repeat the last char zero times
+        if depth == 0 and (char.isascii() and (char.isalnum() or char == "_")):
+            run += char
+            i += 1
+            continue
+
+        best = max(best, run, key=len)
+        run = ""
+        if char == "\\":
+            # Skip the escape, including \xhh, \uhhhh, \N{...} and \123
+            code = pattern[i + 1:i + 2]
+            i += 1 + _ESCAPE_WIDTHS.get(code, 0)
+            if code == "N":
+                i = pattern.find("}", i)
+            elif code.isdigit():
+                while pattern[i + 1:i + 2].isdigit():
+                    i += 1
+        elif char == "{":
+            i = pattern.find("}", i)  # Skip the repeat count
+        elif char == "[":
+            # Skip the class, allowing a leading "]" or "^]" and escapes
+            i += 1
+            if pattern[i:i + 1] == "^":
+                i += 1
+            if pattern[i:i + 1] == "]":
+                i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+        elif char == "(":
+            depth += 1
+        elif char == ")":
+            depth -= 1
+        if i < 0:
+            break  # Unterminated {...} or \N{...}
+        i += 1
+
+    return max(best, run, key=len) or None
+
+
+def _matching_lines(
+    regex: re.Pattern,
+    content: AnyStr
+) -> Iterator[Tuple[int, AnyStr]]:
+    """
+    Yield (line number, line) for each line of content that regex matches.
+
+    The whole buffer is searched for the next candidate match and only
+    that candidate's line is checked on its own, so lines without a
+    match are never split out or scanned one at a time. content (str or
+    bytes, matching regex) must contain no line breaks other than "\n".
+    """
+    nl = "\n" if isinstance(content, str) else b"\n"
+    if _sees_past_line(regex):
+        # The buffer search could miss lines this pattern matches alone
+        lines = content.split(nl)
+        if not lines[-1]:
+            lines.pop()  # Nothing after the final newline
+        for i, line in enumerate(lines, 1):
+            if regex.search(line):
+                yield i, line
+        return
+
+    lineno, counted, pos = 1, 0, 0
+    while pos < len(content):
+        match = regex.search(content, pos)
+        if match is None or match.start() == len(content) and content.endswith(nl):
+            return  # No match, or only one after the final newline
+
+        # pos is always at a line start; find the candidate's whole line
+        newline = content.rfind(nl, pos, match.start())
+        start = pos if newline < 0 else newline + 1
+        end = content.find(nl, match.start())
+        if end < 0:
+            end = len(content)
+
+        lineno += content.count(nl, counted, start)
+        counted = start
+
+        # A match spanning lines does not count for the line it starts on
+        line = content[start:end]
+        if regex.search(line):
+            yield lineno, line
+        pos = end + 1
+
+
+@lru_cache(maxsize=64)
+def _sees_past_line(regex: re.Pattern) -> bool:
+    """
+    Whether regex may match a line on its own but not in the whole buffer:
+    \A and \Z, lookarounds, or an inline flag that can turn MULTILINE off.
+    """
+    pattern = regex.pattern
+    if isinstance(pattern, bytes):
+        pattern = pattern.decode("latin-1")
+    return _LINE_CONTEXT_RE.search(pattern) is not None
+
+
+def _shell_target(command: str) -> Dict[str, Any]:
+    """
+    Popen arguments that run command, through /bin/sh only if needed.
+
+    Commands without shell syntax are split with shlex and exec'd
+    directly. Their program's PATH lookup is cached; a program that
+    cannot be found is left to the shell to report as before.
+    """
+    if not _SHELL_SYNTAX_RE.search(command):
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            argv = []  # Unbalanced quotes: let the shell report them
+        # Paths are left to the shell, which resolves them against cwd
+        if argv and "/" not in argv[0]:
+            program = _CMD_PATH_CACHE.get(argv[0]) or shutil.which(argv[0])
+            if program:
+                _CMD_PATH_CACHE[argv[0]] = program
+                return {"args": argv, "executable": program}
+    return {"args": command, "shell": True}
+
+
+def _read_tail(stream: IO[str]) -> str:
+    """Read a stream to EOF, keeping only its last MAX_SHELL_OUTPUT_LINES."""
+    tail: deque = deque(maxlen=MAX_SHELL_OUTPUT_LINES)
+    total = 0
+    for line in iter(lambda: stream.readline(MAX_SHELL_LINE_LENGTH), ""):
+        tail.append(line)
+        total += 1
+
+    omitted = total - len(tail)
+    if omitted:
+        # Not tail.appendleft(): on a full deque that drops the last line
+        return f"... [{omitted} earlier lines omitted]\n" + "".join(tail)
+    return "".join(tail)
+
+
+def _rg_text(value: dict) -> str:
+    """Text of a ripgrep JSON string field (non-UTF-8 data arrives base64)."""
+    if "text" in value:
+        return value["text"]
+    return base64.b64decode(value["bytes"]).decode("utf-8", errors="ignore")
@@ -1,8 +1,17 @@
 """Tool definitions and executors for the local agent."""
 
 import os
+import re
 import glob
+import heapq
+import shlex
+import shutil
+import signal
+import stat
 import subprocess
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from typing import Optional
 from pydantic import BaseModel, Field
 
@@ -66,6 +75,9 @@ class ToolResult(BaseModel):
     error: Optional[str] = None
 
 
+MAX_READ_CHARS = 50000  # Characters of a file read_file returns
+
+
 def read_file(path: str) -> ToolResult:
     """Read contents of a file."""
     try:
@@ -73,18 +85,24 @@ def read_file(path: str) -> ToolResult:
         if not os.path.isabs(path):
             path = os.path.join(PROJECT_DIR, path)
 
-        if not os.path.exists(path):
+        # One stat answers both checks; only regular files are opened, as a
+        # FIFO or device could block the read forever
+        try:
+            mode = os.stat(path).st_mode
+        except FileNotFoundError:
             return ToolResult(success=False, output="", error=f"File not found: {path}")
 
-        if not os.path.isfile(path):
+        if not stat.S_ISREG(mode):
             return ToolResult(success=False, output="", error=f"Not a file: {path}")
 
+        # Decode no more than can be shown: one character past the limit
+        # is enough to know the file is too large
         with open(path, 'r', encoding='utf-8', errors='replace') as f:
-            content = f.read()
+            content = f.read(MAX_READ_CHARS + 1)
 
         # Truncate very large files
-        if len(content) > 50000:
-            content = content[:50000] + "\n\n... [truncated, file too large]"
+        if len(content) > MAX_READ_CHARS:
+            content = content[:MAX_READ_CHARS] + "\n\n... [truncated, file too large]"
 
         return ToolResult(success=True, output=content)
 
@@ -104,23 +122,26 @@ def edit_file(path: str, old_text: str, new_text: str) -> ToolResult:
         with open(path, 'r', encoding='utf-8') as f:
             content = f.read()
 
-        if old_text not in content:
+        start = content.find(old_text)
+        if start < 0:
             return ToolResult(
                 success=False,
                 output="",
                 error=f"Text to replace not found in file. Make sure old_text matches exactly."
             )
 
-        # Check for multiple occurrences
-        count = content.count(old_text)
-        if count > 1:
-            return ToolResult(
-                success=False,
-                output="",
-                error=f"Found {count} occurrences of old_text. Please provide more context to make it unique."
-            )
+        # Check for multiple occurrences (counted only to report them)
+        end = start + len(old_text)
+        if content.find(old_text, end) >= 0:
+            count = content.count(old_text)
+            if count > 1:
+                return ToolResult(
+                    success=False,
+                    output="",
+                    error=f"Found {count} occurrences of old_text. Please provide more context to make it unique."
+                )
 
-        new_content = content.replace(old_text, new_text)
+        new_content = content[:start] + new_text + content[end:]
 
         with open(path, 'w', encoding='utf-8') as f:
             f.write(new_content)
@@ -131,14 +152,18 @@ def edit_file(path: str, old_text: str, new_text: str) -> ToolResult:
         return ToolResult(success=False, output="", error=str(e))
 
 
+_PROJECT_ROOT = Path(PROJECT_DIR).resolve()
+
+
 def write_file(path: str, content: str) -> ToolResult:
     """Write content to a file (creates or overwrites)."""
     try:
         if not os.path.isabs(path):
             path = os.path.join(PROJECT_DIR, path)
 
-        # Safety check: warn if outside project directory
-        if not path.startswith(PROJECT_DIR):
+        # Safety check: compare resolved path components, so neither a
+        # sibling like PROJECT_DIR + "_evil" nor "../" can escape
+        if not Path(path).resolve().is_relative_to(_PROJECT_ROOT):
             return ToolResult(
                 success=False,
                 output="",
@@ -159,12 +184,19 @@ def write_file(path: str, content: str) -> ToolResult:
         return ToolResult(success=False, output="", error=str(e))
 
 
+# All blocked patterns as one case-insensitive alternation, and the
+# allowed commands as a set, so a check is one scan and one lookup
+_BLOCKED_RE = re.compile(
+    "|".join(re.escape(p) for p in BLOCKED_PATTERNS), re.IGNORECASE
+) if BLOCKED_PATTERNS else None
+_ALLOWED_SET = frozenset(ALLOWED_SHELL_COMMANDS)
+
+
 def is_command_safe(command: str) -> tuple[bool, str]:
     """Check if a shell command is safe to execute."""
     # Check blocked patterns
-    for pattern in BLOCKED_PATTERNS:
-        if pattern in command.lower():
-            return False, f"Blocked pattern detected: {pattern}"
+    if _BLOCKED_RE and (match := _BLOCKED_RE.search(command)):
+        return False, f"Blocked pattern detected: {match.group(0).lower()}"
 
     # Check if command starts with an allowed program
     cmd_parts = command.strip().split()
@@ -175,12 +207,48 @@ def is_command_safe(command: str) -> tuple[bool, str]:
     # Handle paths like /usr/bin/python
     base_cmd = os.path.basename(base_cmd)
 
-    if base_cmd not in ALLOWED_SHELL_COMMANDS:
+    if base_cmd not in _ALLOWED_SET:
         return False, f"Command '{base_cmd}' not in allowed list. Allowed: {', '.join(ALLOWED_SHELL_COMMANDS)}"
 
     return True, ""
 
 
+SHELL_TIMEOUT = 60  # Seconds before run_shell kills the command
+MAX_SHELL_OUTPUT = 10000  # Characters of run_shell output shown
+
+# Operators, expansions, globs and escapes only /bin/sh handles; commands
+# without them run directly, saving a shell start per call
+_SHELL_SYNTAX_RE = re.compile(r"[|&;<>()$`\\*?\[\]{}~!#\n]")
+_CMD_PATH_CACHE = {}  # Program name -> resolved path
+
+
+def _shell_target(command: str) -> dict:
+    """Popen arguments that run command, through /bin/sh only if needed."""
+    if not _SHELL_SYNTAX_RE.search(command):
+        try:
+            argv = shlex.split(command)
+        except ValueError:
+            argv = []  # Unbalanced quotes: let the shell report them
+        # Paths are left to the shell, which resolves them against cwd
+        if argv and "/" not in argv[0]:
+            program = _CMD_PATH_CACHE.get(argv[0]) or shutil.which(argv[0])
+            if program:
+                _CMD_PATH_CACHE[argv[0]] = program
+                return {"args": argv, "executable": program}
+    return {"args": command, "shell": True}
+
+
+def _read_head(stream, limit: int) -> str:
+    """Read a stream to EOF, keeping only its first limit characters."""
+    kept = []
+    size = 0
+    for chunk in iter(lambda: stream.read(8192), ""):
+        if size < limit:
+            kept.append(chunk[:limit - size])
+            size += len(kept[-1])
+    return "".join(kept)
+
+
 def run_shell(command: str) -> ToolResult:
     """Execute a shell command with safety checks."""
     try:
@@ -188,62 +256,136 @@ def run_shell(command: str) -> ToolResult:
         if not is_safe:
             return ToolResult(success=False, output="", error=f"Command blocked: {reason}")
 
-        result = subprocess.run(
-            command,
-            shell=True,
-            capture_output=True,
+        # Stream output, keeping no more than can be shown
+        timed_out = threading.Event()
+        with subprocess.Popen(
+            **_shell_target(command),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
             text=True,
-            timeout=60,
-            cwd=PROJECT_DIR
-        )
-
-        output = result.stdout
-        if result.stderr:
-            output += f"\n[stderr]: {result.stderr}"
+            cwd=PROJECT_DIR,
+            start_new_session=True
+        ) as proc:
+            def kill():
+                # Kill the shell's whole process group so the pipes close
+                timed_out.set()
+                try:
+                    os.killpg(proc.pid, signal.SIGKILL)
+                except ProcessLookupError:
+                    pass
+
+            timer = threading.Timer(SHELL_TIMEOUT, kill)
+            timer.start()
+            try:
+                with ThreadPoolExecutor(max_workers=1) as pool:
+                    stderr = pool.submit(_read_head, proc.stderr, MAX_SHELL_OUTPUT + 1)
+                    stdout = _read_head(proc.stdout, MAX_SHELL_OUTPUT + 1)
+                    stderr = stderr.result()
+                returncode = proc.wait()
+            finally:
+                timer.cancel()
+
+        if timed_out.is_set():
+            raise subprocess.TimeoutExpired(command, SHELL_TIMEOUT)
+
+        output = stdout
+        if stderr:
+            output += f"\n[stderr]: {stderr}"
 
         # Truncate long output
-        if len(output) > 10000:
-            output = output[:10000] + "\n\n... [truncated]"
+        if len(output) > MAX_SHELL_OUTPUT:
+            output = output[:MAX_SHELL_OUTPUT] + "\n\n... [truncated]"
 
-        if result.returncode != 0:
+        if returncode != 0:
             return ToolResult(
                 success=False,
                 output=output,
-                error=f"Command exited with code {result.returncode}"
+                error=f"Command exited with code {returncode}"
             )
 
         return ToolResult(success=True, output=output or "(no output)")
 
     except subprocess.TimeoutExpired:
-        return ToolResult(success=False, output="", error="Command timed out after 60 seconds")
+        return ToolResult(success=False, output="", error=f"Command timed out after {SHELL_TIMEOUT} seconds")
     except Exception as e:
         return ToolResult(success=False, output="", error=str(e))
 
 
 EXCLUDED_DIRS = {'venv', 'node_modules', '.git', '__pycache__', '.pytest_cache', 'dist', 'build', '.egg-info'}
 
+# ripgrep executable, if installed; list_files falls back to glob without it
+RG_PATH = shutil.which("rg")
+MAX_LIST_FILES = 100  # Paths list_files shows before summarizing the rest
+
+# Last pattern components that name files by extension; directories
+# rarely have one, so `rg --files` (which lists no directories) can
+# answer these patterns the same way glob.glob does
+_FILE_COMPONENT_RE = re.compile(r"\.\w+$")
+
+
+def _rg_can_list(pattern: str) -> bool:
+    """Whether `rg --files` lists what glob.glob would for pattern."""
+    parts = pattern.split("/")
+    return (
+        not os.path.isabs(pattern)
+        and ".." not in parts
+        # Hidden components are only matched when the pattern names them
+        and not any(part.startswith(".") for part in parts)
+        and _FILE_COMPONENT_RE.search(parts[-1]) is not None
+    )
+
+
+def _rg_list_files(pattern: str) -> Optional[list[str]]:
+    """
+    List files matching a glob relative to PROJECT_DIR with `rg --files`.
+
+    Returns None if rg fails, so the caller can fall back to glob.
+    """
+    # A leading "/" anchors the glob at PROJECT_DIR, as glob.glob does
+    args = [RG_PATH, "--files", "--no-ignore", "--glob", "/" + pattern]
+    args += [f"--glob=!{excl}" for excl in EXCLUDED_DIRS]
+
+    result = subprocess.run(
+        args,
+        capture_output=True,
+        encoding="utf-8",
+        errors="surrogateescape",
+        timeout=30,
+        cwd=PROJECT_DIR
+    )
+    if result.returncode == 2:
+        return None
+    # A matching --glob lets hidden files through; glob's wildcards skip them
+    return [
+        f for f in result.stdout.splitlines()
+        if not any(part.startswith(".") for part in f.split("/"))
+    ]
+
 
 def list_files(pattern: str) -> ToolResult:
     """List files matching a glob pattern."""
     try:
-        # Handle relative patterns
-        if not os.path.isabs(pattern):
-            pattern = os.path.join(PROJECT_DIR, pattern)
+        # rg paths come back relative to PROJECT_DIR, excluded dirs pruned
+        files = _rg_list_files(pattern) if RG_PATH and _rg_can_list(pattern) else None
+        if files is None:
+            # Handle relative patterns
+            if not os.path.isabs(pattern):
+                pattern = os.path.join(PROJECT_DIR, pattern)
 
-        files = glob.glob(pattern, recursive=True)
+            files = glob.glob(pattern, recursive=True)
 
-        # Filter out excluded directories
-        files = [f for f in files if not any(excl in f.split(os.sep) for excl in EXCLUDED_DIRS)]
+            # Filter out excluded directories
+            files = [f for f in files if not any(excl in f.split(os.sep) for excl in EXCLUDED_DIRS)]
 
         if not files:
             return ToolResult(success=True, output="No files found matching pattern")
 
-        # Sort and format
-        files = sorted(files)
+        # Sort and format; only the shown paths need ordering
+        shown = heapq.nsmallest(MAX_LIST_FILES, files)
 
         # Show relative paths
         rel_files = []
-        for f in files:
+        for f in shown:
             if f.startswith(PROJECT_DIR):
                 rel_files.append(os.path.relpath(f, PROJECT_DIR))
             else:
@@ -251,8 +393,8 @@ def list_files(pattern: str) -> ToolResult:
 
         output = "\n".join(rel_files)
 
-        if len(rel_files) > 100:
-            output = "\n".join(rel_files[:100]) + f"\n\n... and {len(rel_files) - 100} more files"
+        if len(files) > MAX_LIST_FILES:
+            output += f"\n\n... and {len(files) - MAX_LIST_FILES} more files"
 
         return ToolResult(success=True, output=output)
 
@@ -260,28 +402,26 @@ def list_files(pattern: str) -> ToolResult:
         return ToolResult(success=False, output="", error=str(e))
 
 
+# Action -> (executor, its arguments as (name, default) in call order);
+# built once rather than as a dict of lambdas on every call
+_DISPATCH = {
+    "read_file": (read_file, (("path", ""),)),
+    "edit_file": (edit_file, (("path", ""), ("old_text", ""), ("new_text", ""))),
+    "write_file": (write_file, (("path", ""), ("content", ""))),
+    "run_shell": (run_shell, (("command", ""),)),
+    "list_files": (list_files, (("pattern", "*"),)),
+}
+
+
 def execute_tool(action: str, **kwargs) -> ToolResult:
     """Execute a tool based on the action name."""
-    tools = {
-        "read_file": lambda: read_file(kwargs.get("path", "")),
-        "edit_file": lambda: edit_file(
-            kwargs.get("path", ""),
-            kwargs.get("old_text", ""),
-            kwargs.get("new_text", "")
-        ),
-        "write_file": lambda: write_file(
-            kwargs.get("path", ""),
-            kwargs.get("content", "")
-        ),
-        "run_shell": lambda: run_shell(kwargs.get("command", "")),
-        "list_files": lambda: list_files(kwargs.get("pattern", "*")),
-    }
-
     if action == "respond":
         # Not a tool - this is the model's response to the user
         return ToolResult(success=True, output=kwargs.get("response", ""))
 
-    if action not in tools:
+    tool = _DISPATCH.get(action)
+    if tool is None:
         return ToolResult(success=False, output="", error=f"Unknown action: {action}")
 
-    return tools[action]()
+    executor, params = tool
+    return executor(*[kwargs.get(name, default) for name, default in params])